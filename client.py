@@ -6,6 +6,7 @@ import re
 import calendar
 from datetime import datetime, date, timedelta
 from utils.keyboards import get_client_menu_keyboard, get_start_keyboard, get_confirmation_keyboard
+from services.keyboard_cache import calendar_keyboards, shift_month
 
 logger = logging.getLogger(__name__)
 
@@ -327,6 +328,103 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
             bot.send_message(message.chat.id, "Произошла ошибка при выборе услуги. Попробуйте позже.")
             bot.delete_state(message.from_user.id, message.chat.id)
 
+    def build_date_calendar(year, month, service_duration, specialist_id, sheets_service):
+        """Клавиатура календаря записи с отметкой доступных для услуги дней."""
+        keyboard = types.InlineKeyboardMarkup(row_width=7)
+
+        # Кнопки навигации по месяцу
+        prev_month = month - 1 if month > 1 else 12
+        prev_year = year if month > 1 else year - 1
+        next_month = month + 1 if month < 12 else 1
+        next_year = year if month < 12 else year + 1
+
+        prev_btn = types.InlineKeyboardButton("<<", callback_data=f"prev_{year}_{month}_{service_duration}")
+        next_btn = types.InlineKeyboardButton(">>", callback_data=f"next_{year}_{month}_{service_duration}")
+
+        month_names = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь", 
+                       "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"]
+        month_label = f"{month_names[month-1]} {year}"
+        month_btn = types.InlineKeyboardButton(month_label, callback_data="ignore")
+
+        keyboard.row(prev_btn, month_btn, next_btn)
+
+        # Заголовок дней недели
+        days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+        header_buttons = [types.InlineKeyboardButton(day, callback_data="ignore") for day in days]
+        keyboard.row(*header_buttons)
+
+        # Проверяем доступные дни для выбранного специалиста
+        available_days = {}
+
+        # Получаем информацию о доступности дней за весь месяц одним запросом:
+        # для каждого дня – есть ли достаточно последовательных слотов
+        if specialist_id and sheets_service:
+            available_days = sheets_service.get_month_availability(specialist_id, year, month, service_duration)
+
+        # Получаем календарь на текущий месяц
+        cal = calendar.monthcalendar(year, month)
+
+        # Формируем календарь
+        today_date = date.today()
+        for week in cal:
+            row = []
+            for day_num in week:
+                if day_num == 0:
+                    # Пустая ячейка
+                    row.append(types.InlineKeyboardButton(" ", callback_data="ignore"))
+                else:
+                    # Проверяем, не прошедшая ли это дата
+                    current_date = date(year, month, day_num)
+                    date_str = current_date.strftime('%Y-%m-%d')
+
+                    if current_date < today_date:
+                        # Прошедшая дата - неактивная
+                        row.append(types.InlineKeyboardButton(str(day_num), callback_data="ignore"))
+                    else:
+                        # Определяем доступность слотов
+                        is_available = available_days.get(date_str, False)
+
+                        # Формируем текст кнопки с эмодзи
+                        btn_text = f"🟢{day_num}" if is_available else f"🔴{day_num}"
+
+                        # Для активных дней формируем callback_data
+                        if is_available:
+                            callback_data = f"bookdate_{year}_{month}_{day_num}"
+                            row.append(types.InlineKeyboardButton(btn_text, callback_data=callback_data))
+                        else:
+                            # Для недоступных дней указываем специальный callback
+                            row.append(types.InlineKeyboardButton(btn_text, callback_data="no_slots"))
+            keyboard.row(*row)
+
+        # Кнопка отмены
+        keyboard.add(types.InlineKeyboardButton("Отмена", callback_data="cancel"))
+
+        return keyboard
+
+    def date_calendar_markup(year, month, service_duration, specialist_id, sheets_service):
+        """
+        JSON клавиатуры календаря записи. Готовая клавиатура берется из кэша,
+        пока расписание специалиста не изменилось; соседние месяцы строятся
+        в фоне, чтобы листание календаря сразу находило их в кэше.
+        """
+        # Календарь зависит от месяца, услуги, расписания специалиста и текущей даты
+        today = date.today()
+        version = sheets_service.get_schedule_version(specialist_id) if specialist_id and sheets_service else None
+
+        def key(y, m):
+            return ('client', str(specialist_id), y, m, int(service_duration), today)
+
+        markup = calendar_keyboards.get_or_build(
+            key(year, month), version,
+            lambda: build_date_calendar(year, month, service_duration, specialist_id, sheets_service)
+        )
+        for y, m in (shift_month(year, month, -1), shift_month(year, month, 1)):
+            calendar_keyboards.prefetch(
+                key(y, m), version,
+                lambda y=y, m=m: build_date_calendar(y, m, service_duration, specialist_id, sheets_service)
+            )
+        return markup
+
     def create_date_calendar(bot_instance, chat_id, year, month, service_duration=30, specialist_id=None, sheets_service=None, scheduler_service=None):
         """
         Вспомогательная функция для создания календаря с визуальным отображением доступности дней.
@@ -338,92 +436,7 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
             specialist_id: ID специалиста для проверки доступности
         """
         try:
-            keyboard = types.InlineKeyboardMarkup(row_width=7)
-
-            # Кнопки навигации по месяцу
-            prev_month = month - 1 if month > 1 else 12
-            prev_year = year if month > 1 else year - 1
-            next_month = month + 1 if month < 12 else 1
-            next_year = year if month < 12 else year + 1
-
-            prev_btn = types.InlineKeyboardButton("<<", callback_data=f"prev_{year}_{month}_{service_duration}")
-            next_btn = types.InlineKeyboardButton(">>", callback_data=f"next_{year}_{month}_{service_duration}")
-
-            month_names = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь", 
-                           "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"]
-            month_label = f"{month_names[month-1]} {year}"
-            month_btn = types.InlineKeyboardButton(month_label, callback_data="ignore")
-
-            keyboard.row(prev_btn, month_btn, next_btn)
-
-            # Заголовок дней недели
-            days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
-            header_buttons = [types.InlineKeyboardButton(day, callback_data="ignore") for day in days]
-            keyboard.row(*header_buttons)
-
-            # Проверяем доступные дни для выбранного специалиста
-            available_days = {}
-
-            # Получаем информацию о доступности дней
-            if specialist_id and sheets_service:
-                # Начало и конец месяца
-                start_date = datetime(year, month, 1).date()
-                if month == 12:
-                    end_date = datetime(year + 1, 1, 1).date() - timedelta(days=1)
-                else:
-                    end_date = datetime(year, month + 1, 1).date() - timedelta(days=1)
-
-                # Для каждого дня в месяце проверяем наличие достаточных слотов
-                current_date = start_date
-                while current_date <= end_date:
-                    date_str = current_date.strftime('%Y-%m-%d')
-
-                    # Получаем все доступные слоты на эту дату
-                    available_slots = sheets_service.get_available_slots(specialist_id, date_str)
-
-                    # Проверяем, есть ли достаточно последовательных слотов
-                    has_enough_slots = check_consecutive_slots(available_slots, service_duration)
-                    available_days[date_str] = has_enough_slots
-
-                    current_date += timedelta(days=1)
-
-            # Получаем календарь на текущий месяц
-            cal = calendar.monthcalendar(year, month)
-
-            # Формируем календарь
-            today_date = date.today()
-            for week in cal:
-                row = []
-                for day_num in week:
-                    if day_num == 0:
-                        # Пустая ячейка
-                        row.append(types.InlineKeyboardButton(" ", callback_data="ignore"))
-                    else:
-                        # Проверяем, не прошедшая ли это дата
-                        current_date = date(year, month, day_num)
-                        date_str = current_date.strftime('%Y-%m-%d')
-
-                        if current_date < today_date:
-                            # Прошедшая дата - неактивная
-                            row.append(types.InlineKeyboardButton(str(day_num), callback_data="ignore"))
-                        else:
-                            # Определяем доступность слотов
-                            is_available = available_days.get(date_str, False)
-
-                            # Формируем текст кнопки с эмодзи
-                            btn_text = f"🟢{day_num}" if is_available else f"🔴{day_num}"
-
-                            # Для активных дней формируем callback_data
-                            if is_available:
-                                callback_data = f"bookdate_{year}_{month}_{day_num}"
-                                row.append(types.InlineKeyboardButton(btn_text, callback_data=callback_data))
-                            else:
-                                # Для недоступных дней указываем специальный callback
-                                row.append(types.InlineKeyboardButton(btn_text, callback_data="no_slots"))
-                keyboard.row(*row)
-
-            # Кнопка отмены
-            keyboard.add(types.InlineKeyboardButton("Отмена", callback_data="cancel"))
+            keyboard = date_calendar_markup(year, month, service_duration, specialist_id, sheets_service)
 
             bot_instance.send_message(
                 chat_id, 
@@ -442,222 +455,6 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
             return ""
         return date_str.strip()
 
-                def check_consecutive_slots(slots, service_duration):
-        """
-        Проверяет, есть ли достаточно последовательных свободных слотов
-        для услуги указанной продолжительности.
-
-        Args:
-            slots: список доступных слотов
-            service_duration: продолжительность услуги в минутах
-
-        Returns:
-            bool: True если есть достаточно слотов, иначе False
-        """
-        import logging
-        logger = logging.getLogger(__name__)
-
-        if not slots:
-            logger.debug(f"check_consecutive_slots: нет слотов")
-            return False
-
-        # Преобразуем список слотов в минуты от начала дня для проверки последовательности
-        slots_by_time = []
-        for slot in slots:
-            try:
-                time_str = slot.get('Время', '').strip()
-                if not time_str:
-                    continue
-
-                h, m = map(int, time_str.split(':'))
-                time_val = h*60 + m
-                slots_by_time.append((time_val, slot.get('id')))
-            except (ValueError, KeyError, AttributeError) as e:
-                logger.warning(f"Ошибка с форматом времени слота: {e}")
-                continue
-
-        # Необходимое количество последовательных слотов (30 мин каждый)
-        slot_count = max(1, (service_duration + 29) // 30)  # Округление вверх
-
-        logger.debug(f"check_consecutive_slots: требуется {slot_count} последовательных слотов для {service_duration} минут")
-
-        # Если не хватает слотов в принципе
-        if len(slots_by_time) < slot_count:
-            logger.debug(f"check_consecutive_slots: недостаточно слотов ({len(slots_by_time)} < {slot_count})")
-            return False
-
-        # Сортируем слоты по времени
-        slots_by_time.sort()
-
-        # Выводим первые несколько слотов для отладки
-        if len(slots_by_time) > 0:
-            debug_times = ", ".join([f"{t//60}:{t%60:02d}" for t, _ in slots_by_time[:5]])
-            logger.debug(f"check_consecutive_slots: первые слоты: {debug_times}")
-
-        # Ищем последовательные слоты достаточной длительности
-        for i in range(len(slots_by_time) - slot_count + 1):
-            contiguous = True
-
-            for j in range(1, slot_count):
-                prev_time = slots_by_time[i+j-1][0]
-                curr_time = slots_by_time[i+j][0]
-
-                # Проверяем, что слоты идут последовательно (с шагом 30 мин)
-                if curr_time - prev_time != 30:
-                    contiguous = False
-                    logger.debug(f"check_consecutive_slots: разрыв между {prev_time//60}:{prev_time%60:02d} и {curr_time//60}:{curr_time%60:02d}")
-                    break
-
-            if contiguous:
-                start_time = slots_by_time[i][0]
-                end_time = slots_by_time[i+slot_count-1][0] + 30
-                logger.debug(f"check_consecutive_slots: найдены последовательные слоты с {start_time//60}:{start_time%60:02d} до {end_time//60}:{end_time%60:02d}")
-                return True
-
-        logger.debug(f"check_consecutive_slots: не найдено {slot_count} последовательных слотов")
-        return False
-
-        Args:
-            slots: список доступных слотов
-            service_duration: продолжительность услуги в минутах
-
-        Returns:
-            bool: True если есть достаточно слотов, иначе False
-        """
-        import logging
-        logger = logging.getLogger(__name__)
-
-        if not slots:
-            logger.debug(f"check_consecutive_slots: нет слотов")
-            return False
-
-        # Преобразуем список слотов в минуты от начала дня для проверки последовательности
-        slots_by_time = []
-        for slot in slots:
-            try:
-                time_str = slot.get('Время', '').strip()
-                if not time_str:
-                    continue
-
-                h, m = map(int, time_str.split(':'))
-                time_val = h*60 + m
-                slots_by_time.append((time_val, slot.get('id')))
-            except (ValueError, KeyError, AttributeError) as e:
-                logger.warning(f"Ошибка с форматом времени слота: {e}")
-                continue
-
-        # Необходимое количество последовательных слотов (30 мин каждый)
-        slot_count = max(1, (service_duration + 29) // 30)  # Округление вверх
-
-        logger.debug(f"check_consecutive_slots: требуется {slot_count} последовательных слотов для {service_duration} минут")
-
-        # Если не хватает слотов в принципе
-        if len(slots_by_time) < slot_count:
-            logger.debug(f"check_consecutive_slots: недостаточно слотов ({len(slots_by_time)} < {slot_count})")
-            return False
-
-        # Сортируем слоты по времени
-        slots_by_time.sort()
-
-        # Выводим первые несколько слотов для отладки
-        if len(slots_by_time) > 0:
-            debug_times = ", ".join([f"{t//60}:{t%60:02d}" for t, _ in slots_by_time[:5]])
-            logger.debug(f"check_consecutive_slots: первые слоты: {debug_times}")
-
-        # Ищем последовательные слоты достаточной длительности
-        for i in range(len(slots_by_time) - slot_count + 1):
-            contiguous = True
-
-            for j in range(1, slot_count):
-                prev_time = slots_by_time[i+j-1][0]
-                curr_time = slots_by_time[i+j][0]
-
-                # Проверяем, что слоты идут последовательно (с шагом 30 мин)
-                if curr_time - prev_time != 30:
-                    contiguous = False
-                    logger.debug(f"check_consecutive_slots: разрыв между {prev_time//60}:{prev_time%60:02d} и {curr_time//60}:{curr_time%60:02d}")
-                    break
-
-            if contiguous:
-                start_time = slots_by_time[i][0]
-                end_time = slots_by_time[i+slot_count-1][0] + 30
-                logger.debug(f"check_consecutive_slots: найдены последовательные слоты с {start_time//60}:{start_time%60:02d} до {end_time//60}:{end_time%60:02d}")
-                return True
-
-        logger.debug(f"check_consecutive_slots: не найдено {slot_count} последовательных слотов")
-        return False
-
-
-        Args:
-            slots: список доступных слотов
-            service_duration: продолжительность услуги в минутах
-
-        Returns:
-            bool: True если есть достаточно слотов, иначе False
-        """
-        import logging
-        logger = logging.getLogger(__name__)
-
-        if not slots:
-            logger.debug(f"check_consecutive_slots: нет слотов")
-            return False
-
-        # Преобразуем список слотов в минуты от начала дня для проверки последовательности
-        slots_by_time = []
-        for slot in slots:
-            try:
-                time_str = slot.get('Время', '').strip()
-                if not time_str:
-                    continue
-
-                h, m = map(int, time_str.split(':'))
-                time_val = h*60 + m
-                slots_by_time.append((time_val, slot.get('id')))
-            except (ValueError, KeyError, AttributeError) as e:
-                logger.warning(f"Ошибка с форматом времени слота: {e}")
-                continue
-
-        # Необходимое количество последовательных слотов (30 мин каждый)
-        slot_count = max(1, (service_duration + 29) // 30)  # Округление вверх
-
-        logger.debug(f"check_consecutive_slots: требуется {slot_count} последовательных слотов для {service_duration} минут")
-
-        # Если не хватает слотов в принципе
-        if len(slots_by_time) < slot_count:
-            logger.debug(f"check_consecutive_slots: недостаточно слотов ({len(slots_by_time)} < {slot_count})")
-            return False
-
-        # Сортируем слоты по времени
-        slots_by_time.sort()
-
-        # Выводим первые несколько слотов для отладки
-        if len(slots_by_time) > 0:
-            debug_times = ", ".join([f"{t//60}:{t%60:02d}" for t, _ in slots_by_time[:5]])
-            logger.debug(f"check_consecutive_slots: первые слоты: {debug_times}")
-
-        # Ищем последовательные слоты достаточной длительности
-        for i in range(len(slots_by_time) - slot_count + 1):
-            contiguous = True
-
-            for j in range(1, slot_count):
-                prev_time = slots_by_time[i+j-1][0]
-                curr_time = slots_by_time[i+j][0]
-
-                # Проверяем, что слоты идут последовательно (с шагом 30 мин)
-                if curr_time - prev_time != 30:
-                    contiguous = False
-                    logger.debug(f"check_consecutive_slots: разрыв между {prev_time//60}:{prev_time%60:02d} и {curr_time//60}:{curr_time%60:02d}")
-                    break
-
-            if contiguous:
-                start_time = slots_by_time[i][0]
-                end_time = slots_by_time[i+slot_count-1][0] + 30
-                logger.debug(f"check_consecutive_slots: найдены последовательные слоты с {start_time//60}:{start_time%60:02d} до {end_time//60}:{end_time%60:02d}")
-                return True
-
-        logger.debug(f"check_consecutive_slots: не найдено {slot_count} последовательных слотов")
-        return False
-
     @bot.callback_query_handler(func=lambda call: call.data == "no_slots")
     def no_available_slots(call):
         """Обработчик нажатия на неактивные даты"""
@@ -677,35 +474,20 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
             if len(parts) > 3 and parts[3].isdigit():
                 service_duration = int(parts[3])
 
-            if direction == 'prev':
-                new_month = month - 1 if month > 1 else 12
-                new_year = year if month > 1 else year - 1
-            else:
-                new_month = month + 1 if month < 12 else 1
-                new_year = year if month < 12 else year + 1
+            new_year, new_month = shift_month(year, month, -1 if direction == 'prev' else 1)
 
             # Получаем данные для формирования календаря
             user_id = call.from_user.id
             chat_id = call.message.chat.id
-            state = bot.get_state(user_id, chat_id)
 
             # Получаем ID специалиста
             specialist_id = None
             with bot.retrieve_data(user_id, chat_id) as data:
                 specialist_id = data.get('specialist_id')
 
-            # Удаляем предыдущее сообщение с календарём
-            try:
-                bot.delete_message(chat_id, call.message.message_id)
-            except Exception as e_del:
-                logger.warning(f"Не удалось удалить сообщение календаря: {e_del}")
-
-            # Формируем новый календарь
-            if state == "ClientStates.selecting_date":
-                create_date_calendar(bot, chat_id, new_year, new_month, service_duration, specialist_id, sheets_service, scheduler_service)
-            else:
-                # Для переноса записи
-                create_date_calendar(bot, chat_id, new_year, new_month, service_duration, specialist_id, sheets_service, scheduler_service)
+            # Меняем клавиатуру у того же сообщения (соседние месяцы обычно уже в кэше)
+            keyboard = date_calendar_markup(new_year, new_month, service_duration, specialist_id, sheets_service)
+            bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=keyboard)
 
             bot.answer_callback_query(call.id)
         except Exception as e:
@@ -729,12 +511,9 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
             # Нормализуем дату для корректного сравнения
             date_str = normalize_date(date_str)
 
-            # Получаем свободные слоты на эту дату
-            available_slots = sheets_service.get_available_slots(specialist_id, date_str)
-
-            # Проверяем наличие последовательных слотов для услуги
-            has_slots = check_consecutive_slots(available_slots, service_duration)
-            if not has_slots:
+            # Варианты записи: серии последовательных свободных слотов для услуги
+            slot_options = sheets_service.get_booking_options(specialist_id, date_str, service_duration)
+            if not slot_options:
                 bot.answer_callback_query(call.id, text="Нет подходящих интервалов времени для выбранной услуги")
                 return
 
@@ -777,49 +556,13 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
 
             # Если SchedulerService не доступен, используем старую логику
             # Подбираем слоты с учетом длительности услуги
-            slot_count = max(1, (service_duration + 29) // 30)  # Округление вверх
-
-            # Составляем список слотов (в минутах от начала дня)
-            slots_by_time = []
-            for slot in available_slots:
-                try:
-                    h, m = map(int, slot['Время'].split(':'))
-                    time_val = h*60 + m
-                    slots_by_time.append((time_val, slot['id']))
-                except (ValueError, KeyError) as e:
-                    logger.warning(f"Ошибка с форматом времени слота: {e}")
-                    continue
-
-            slots_by_time.sort()
-
-            # Ищем последовательные слоты достаточной длительности
             options = []
-            for i in range(len(slots_by_time) - slot_count + 1):
-                seq = [slots_by_time[i]]
-                contiguous = True
-                for j in range(1, slot_count):
-                    if i+j >= len(slots_by_time):
-                        contiguous = False
-                        break
-                    prev_time = slots_by_time[i+j-1][0]
-                    curr_time = slots_by_time[i+j][0]
-                    diff = curr_time - prev_time
-                    if diff != 30:
-                        contiguous = False
-                        break
-
-                if contiguous:
-                    seq_ids = [slots_by_time[i+k][1] for k in range(slot_count)]
-                    start_minutes = slots_by_time[i][0]
-                    end_minutes = start_minutes + service_duration
-                    start_h = start_minutes // 60
-                    start_m = start_minutes % 60
-                    end_h = end_minutes // 60
-                    end_m = end_minutes % 60
-                    start_time_str = f"{start_h:02d}:{start_m:02d}"
-                    end_time_str = f"{end_h:02d}:{end_m:02d}"
-                    label = f"{start_time_str}" if slot_count == 1 else f"{start_time_str}-{end_time_str}"
-                    options.append((label, seq_ids))
+            for start_minutes, seq_ids in slot_options:
+                end_minutes = start_minutes + service_duration
+                start_time_str = f"{start_minutes // 60:02d}:{start_minutes % 60:02d}"
+                end_time_str = f"{end_minutes // 60:02d}:{end_minutes % 60:02d}"
+                label = start_time_str if len(seq_ids) == 1 else f"{start_time_str}-{end_time_str}"
+                options.append((label, seq_ids))
 
             if not options:
                 bot.answer_callback_query(call.id, text="Нет свободных времен для выбранной услуги")
@@ -896,7 +639,7 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
                 slot_ids = booking_options.get(time_data, [time_data])
 
                 # Определяем время начала
-                all_slots = sheets_service.schedule_sheet.get_all_records()
+                all_slots = sheets_service.get_all_slots()
                 start_time = None
                 for slot in all_slots:
                     if str(slot.get('id')) == str(slot_ids[0]):
@@ -951,22 +694,15 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
                 bot.answer_callback_query(call.id, "Данные для бронирования отсутствуют")
                 return
 
-            # Бронируем все слоты
-            success = True
-            booked = []
-            for sid in slot_ids:
-                res = sheets_service.book_appointment(sid, client_id)
-                if res:
-                    booked.append(sid)
-                else:
-                    success = False
-                    break
+            # Бронируем все слоты разом: либо все, либо ни одного
+            result = sheets_service.book_slots(slot_ids, client_id)
 
-            if not success:
-                # Откатываем, если частично получилось
-                for sid in booked:
-                    sheets_service.cancel_appointment(sid)
-                bot.edit_message_text("Произошла ошибка при бронировании. Попробуйте снова.", chat_id, call.message.message_id)
+            if not result.ok:
+                if result.conflicts:
+                    error_text = "К сожалению, это время уже заняли. Пожалуйста, выберите другое."
+                else:
+                    error_text = "Произошла ошибка при бронировании. Попробуйте снова."
+                bot.edit_message_text(error_text, chat_id, call.message.message_id)
                 bot.delete_state(user_id, chat_id)
             else:
                 # Успешное бронирование
@@ -1166,7 +902,7 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
                 return
 
             # Получаем информацию о записи перед отменой
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
             appointment_info = None
             specialist_id = None
 
@@ -1308,6 +1044,35 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
             bot.answer_callback_query(call.id, "Ошибка.")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith("reschedappt_"))
+    def appointment_slot_ids(first_slot, client_id):
+        """
+        ID слотов одной записи: выбранный слот и слоты того же клиента у того же
+        специалиста в тот же день, идущие за ним вплотную (каждый через 30 минут).
+        Время сравнивается в минутах, поэтому "9:00" и "10:00" упорядочены верно.
+        """
+        def minutes(slot):
+            try:
+                parsed = datetime.strptime(str(slot.get('Время', '')).strip(), '%H:%M')
+            except ValueError:
+                return None
+            return parsed.hour * 60 + parsed.minute
+
+        by_start = {}
+        for slot in sheets_service.get_all_slots():
+            if (slot.get('Дата') == first_slot.get('Дата') and
+                    str(slot.get('id_специалиста')) == str(first_slot.get('id_специалиста')) and
+                    str(slot.get('id_клиента')) == str(client_id)):
+                start = minutes(slot)
+                if start is not None:
+                    by_start.setdefault(start, slot['id'])
+
+        slot_ids = [first_slot['id']]
+        start = minutes(first_slot)
+        while start is not None and start + 30 in by_start:
+            start += 30
+            slot_ids.append(by_start[start])
+        return slot_ids
+
     def reschedule_appointment_request(call):
         """
         Выбор или отмена выбора конкретной даты
@@ -1368,36 +1133,14 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
                 f"Вы хотите перенести запись с {formatted_date} в {appt['Время']}. Выберите новую дату:"
             )
 
-            # Определяем длительность услуги для проверки доступности
-            service_duration = 30  # По умолчанию 30 минут
+            # Слоты этой записи (выбранный и идущие за ним вплотную) задают
+            # длительность услуги и освобождаются при переносе
+            old_slot_ids = appointment_slot_ids(appt, client['id'])
+            service_duration = 30 * len(old_slot_ids)
 
-            # Найдем все последовательные слоты для этой записи, чтобы определить длительность
-            appointment_slots = []
-            current_date = appt['Дата']
-            client_id = str(client['id'])
-            all_slots = sheets_service.schedule_sheet.get_all_records()
-
-            for slot in all_slots:
-                if (slot.get('Дата') == current_date and 
-                    str(slot.get('id_специалиста')) == str(appt['id_специалиста']) and
-                    str(slot.get('id_клиента')) == client_id):
-                    appointment_slots.append(slot)
-
-            # Сортируем слоты по времени
-            appointment_slots.sort(key=lambda s: s['Время'])
-
-            # Если нашли несколько слотов, вычисляем общую длительность
-            if len(appointment_slots) > 1:
-                try:
-                    first_time = datetime.strptime(appointment_slots[0]['Время'], '%H:%M')
-                    last_time = datetime.strptime(appointment_slots[-1]['Время'], '%H:%M')
-                    diff_minutes = (last_time - first_time).seconds // 60 + 30  # +30 для последнего слота
-                    service_duration = diff_minutes
-                except Exception as e_time:
-                    logger.warning(f"Ошибка при расчете длительности услуги: {e_time}")
-
-            # Сохраняем длительность услуги для использования при формировании календаря
+            # Сохраняем слоты записи и длительность услуги для календаря и переноса
             with bot.retrieve_data(user_id, chat_id) as data:
+                data['reschedule_slot_ids'] = old_slot_ids
                 data['service_duration'] = service_duration
 
             # Показываем календарь для выбора новой даты
@@ -1430,15 +1173,9 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
             # Нормализуем дату для корректного сравнения
             date_str = normalize_date(date_str)
 
-            # Получаем свободные слоты на эту дату
-            available_slots = sheets_service.get_available_slots(specialist_id, date_str)
-            if not available_slots:
-                bot.answer_callback_query(call.id, text="Нет доступных времен на эту дату")
-                return
-
-            # Проверяем наличие последовательных слотов для услуги
-            has_slots = check_consecutive_slots(available_slots, service_duration)
-            if not has_slots:
+            # Варианты записи: серии последовательных свободных слотов для услуги
+            slot_options = sheets_service.get_booking_options(specialist_id, date_str, service_duration)
+            if not slot_options:
                 bot.answer_callback_query(call.id, text="Нет подходящих интервалов времени для выбранной услуги")
                 return
 
@@ -1481,49 +1218,13 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
 
             # Используем стандартную логику, если нет scheduler_service
             # Подбираем слоты с учетом длительности услуги
-            slot_count = max(1, (service_duration + 29) // 30)  # Округление вверх
-
-            # Составляем список слотов (в минутах от начала дня)
-            slots_by_time = []
-            for slot in available_slots:
-                try:
-                    h, m = map(int, slot['Время'].split(':'))
-                    time_val = h*60 + m
-                    slots_by_time.append((time_val, slot['id']))
-                except (ValueError, KeyError) as e:
-                    logger.warning(f"Ошибка с форматом времени слота: {e}")
-                    continue
-
-            slots_by_time.sort()
-
-            # Ищем последовательные слоты достаточной длительности
             options = []
-            for i in range(len(slots_by_time) - slot_count + 1):
-                seq = [slots_by_time[i]]
-                contiguous = True
-                for j in range(1, slot_count):
-                    if i+j >= len(slots_by_time):
-                        contiguous = False
-                        break
-                    prev_time = slots_by_time[i+j-1][0]
-                    curr_time = slots_by_time[i+j][0]
-                    diff = curr_time - prev_time
-                    if diff != 30:
-                        contiguous = False
-                        break
-
-                if contiguous:
-                    seq_ids = [slots_by_time[i+k][1] for k in range(slot_count)]
-                    start_minutes = slots_by_time[i][0]
-                    end_minutes = start_minutes + service_duration
-                    start_h = start_minutes // 60
-                    start_m = start_minutes % 60
-                    end_h = end_minutes // 60
-                    end_m = end_minutes % 60
-                    start_time_str = f"{start_h:02d}:{start_m:02d}"
-                    end_time_str = f"{end_h:02d}:{end_m:02d}"
-                    label = f"{start_time_str}" if slot_count == 1 else f"{start_time_str}-{end_time_str}"
-                    options.append((label, seq_ids))
+            for start_minutes, seq_ids in slot_options:
+                end_minutes = start_minutes + service_duration
+                start_time_str = f"{start_minutes // 60:02d}:{start_minutes % 60:02d}"
+                end_time_str = f"{end_minutes // 60:02d}:{end_minutes % 60:02d}"
+                label = start_time_str if len(seq_ids) == 1 else f"{start_time_str}-{end_time_str}"
+                options.append((label, seq_ids))
 
             if not options:
                 bot.answer_callback_query(call.id, text="Нет подходящих интервалов времени для выбранной услуги")
@@ -1579,8 +1280,10 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
                 new_slot_id = slot_ids[0]  # Берем ID первого слота
             else:  # Выбран конкретный слот по ID
                 new_slot_id = time_data
+                with bot.retrieve_data(user_id, chat_id) as data:
+                    slot_ids = data.get('booking_options', {}).get(new_slot_id, [new_slot_id])
                 # Получаем информацию о слоте
-                all_slots = sheets_service.schedule_sheet.get_all_records()
+                all_slots = sheets_service.get_all_slots()
                 new_time = None
                 for slot in all_slots:
                     if str(slot.get('id')) == str(new_slot_id):
@@ -1591,6 +1294,10 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
                     bot.answer_callback_query(call.id, "Ошибка: время не найдено")
                     return
 
+            # Запоминаем все слоты новой записи для переноса
+            with bot.retrieve_data(user_id, chat_id) as data:
+                data['new_slot_ids'] = slot_ids
+
             # Формируем текст подтверждения
             confirm_text = (
                 f"Вы хотите перенести запись с {old_date} {old_time} на {new_date} {new_time}. "
@@ -1627,6 +1334,8 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
                 old_time = data.get('reschedule_time')
                 new_date = data.get('new_formatted_date')
                 appointments_message_id = data.get('appointments_message_id')
+                new_slot_ids = data.get('new_slot_ids') or [new_slot_id]
+                old_slot_ids = data.get('reschedule_slot_ids') or [old_slot_id]
 
             # Получаем информацию о клиенте
             client = sheets_service.get_client_by_telegram_id(user_id)
@@ -1637,7 +1346,7 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
             client_id = client['id']
 
             # Получаем информацию о новом времени
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
             new_time = None
             specialist_id = None
             for slot in all_slots:
@@ -1650,19 +1359,18 @@ def register_handlers(bot, sheets_service, logging_service, scheduler_service=No
                 bot.answer_callback_query(call.id, "Время не найдено.")
                 return
 
-            # Выполняем перенос записи
-            # 1. Бронируем новый слот
-            booking_success = sheets_service.book_appointment(new_slot_id, client_id)
-            if not booking_success:
-                bot.answer_callback_query(call.id, "Ошибка при бронировании нового времени.")
-                return
+            # Слоты старой записи определены при начале переноса (appointment_slot_ids)
+            if str(old_slot_ids[0]) != str(old_slot_id):
+                old_slot_ids = [old_slot_id]
 
-            # 2. Отменяем старый слот
-            cancel_success = sheets_service.cancel_appointment(old_slot_id)
-            if not cancel_success:
-                # Если не удалось отменить старую запись, отменяем и новую
-                sheets_service.cancel_appointment(new_slot_id)
-                bot.answer_callback_query(call.id, "Ошибка при отмене старой записи.")
+            # Выполняем перенос записи одной операцией: новые слоты бронируются,
+            # старые освобождаются, напоминание переносится
+            result = sheets_service.reschedule(old_slot_ids, new_slot_ids, client_id)
+            if not result.ok:
+                if result.conflicts:
+                    bot.answer_callback_query(call.id, "Это время уже занято, выберите другое.")
+                else:
+                    bot.answer_callback_query(call.id, "Ошибка при переносе записи.")
                 return
 
             # Перенос успешен
@@ -1,258 +1,994 @@
 # services/google_sheets.py
 import logging
-import gspread
-from google.oauth2.service_account import Credentials
-from settings import GOOGLE_SHEET_ID, GOOGLE_CREDENTIALS_JSON
+import re
+import threading
+import time
+from bisect import insort
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from gspread.exceptions import APIError
+from gspread.utils import numericise_all, rowcol_to_a1
+from settings import (GOOGLE_SHEET_ID, SHEETS_CACHE_TTL,
+                      LOG_BUFFER_SIZE, LOG_FLUSH_SIZE, LOG_FLUSH_INTERVAL, LOG_DROP_POLICY)
+from services.log_writer import BufferedLogWriter
+from services.request_scheduler import SingleFlight
+from services.sheets_client import get_connection
 from datetime import datetime, timedelta, date
 
 logger = logging.getLogger(__name__)
 
+# Результат бронирования: ok – все слоты забронированы; conflicts – id слотов,
+# которые не найдены или уже не свободны (при конфликте не бронируется ни один)
+BookingResult = namedtuple('BookingResult', ['ok', 'conflicts'])
+
+
+# Каноническая дата YYYY-MM-DD разбирается регулярным выражением, без strptime
+_ISO_DATE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+# Сколько разных строк дат помнит _parse_date
+DATE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_date(date_str):
+    """
+    Разбирает строку даты из таблицы: (дата YYYY-MM-DD, порядковый номер дня).
+    Если дату не удалось распознать, возвращается (очищенная строка, None).
+
+    В листе одни и те же даты повторяются во многих строках, поэтому
+    результат запоминается для последних DATE_CACHE_SIZE строк.
+    """
+    # Удаляем пробелы, символы переноса строки и апострофы
+    date_str = date_str.strip().strip("'").strip('"')
+
+    match = _ISO_DATE.fullmatch(date_str)
+    if match:
+        try:
+            return date_str, date(*map(int, match.groups())).toordinal()
+        except ValueError:
+            pass
+
+    try:
+        # Проверяем остальные форматы даты
+        for fmt in ['%d.%m.%Y', '%Y/%m/%d', '%d-%m-%Y']:
+            try:
+                date_obj = datetime.strptime(date_str, fmt).date()
+                return date_obj.strftime('%Y-%m-%d'), date_obj.toordinal()
+            except ValueError:
+                continue
+
+        # Если не удалось распознать формат, пробуем разбить строку
+        if '/' in date_str:
+            parts = date_str.split('/')
+        elif '-' in date_str:
+            parts = date_str.split('-')
+        elif '.' in date_str:
+            parts = date_str.split('.')
+        else:
+            parts = []
+
+        if len(parts) == 3:
+            # Пытаемся угадать формат по длине года
+            if len(parts[0]) == 4:  # Год-месяц-день
+                date_obj = date(int(parts[0]), int(parts[1]), int(parts[2]))
+                return date_obj.strftime('%Y-%m-%d'), date_obj.toordinal()
+            elif len(parts[2]) == 4:  # День-месяц-год
+                date_obj = date(int(parts[2]), int(parts[1]), int(parts[0]))
+                return date_obj.strftime('%Y-%m-%d'), date_obj.toordinal()
+
+        logger.warning(f"Не удалось нормализовать дату: {date_str}")
+        return date_str, None
+    except Exception as e:
+        logger.warning(f"Ошибка при нормализации даты '{date_str}': {e}")
+        return date_str, None
+
+
+def normalize_date(date_str):
+    """
+    Приводит строку даты к формату YYYY-MM-DD (разбор кэшируется, см. _parse_date).
+    Нераспознанная дата возвращается очищенной от пробелов и кавычек.
+    """
+    if not date_str:
+        return ""
+    return _parse_date(str(date_str))[0]
+
+
+def _date_ordinal(date_str):
+    """Порядковый номер дня (date.toordinal()) для строки даты или None."""
+    if not date_str:
+        return None
+    return _parse_date(str(date_str))[1]
+
+
+def _cell_value(value):
+    """Приводит значение к виду, в котором его вернет get_all_records()."""
+    if value is None:
+        return ''
+    return numericise_all([str(value)])[0]
+
+
+def _time_minutes(time_str):
+    """Переводит время "HH:MM" в минуты от начала дня (некорректное время – в конец дня)."""
+    try:
+        h, m = str(time_str).strip().split(':')
+        return int(h) * 60 + int(m)
+    except (ValueError, AttributeError):
+        return 24 * 60
+
+
+def _slot_count(service_duration):
+    """Сколько 30-минутных слотов занимает услуга (с округлением вверх)."""
+    return max(1, (int(service_duration) + 29) // 30)
+
+
+# Битовые маски дня: бит i – слот, начинающийся в минуту i от полуночи.
+# Слоты идут подряд, если следующий начинается ровно через SLOT_MINUTES минут
+SLOT_MINUTES = 30
+DAY_MINUTES = 24 * 60
+
+
+def _run_starts(mask, length, step=SLOT_MINUTES):
+    """
+    Биты mask, с которых начинаются length единичных битов подряд с шагом step
+    (бит i, i + step, ..., i + (length - 1) * step).
+    Считается сдвигами и AND за O(log length) операций над целым.
+    """
+    span = 1
+    while span < length:
+        count = min(span, length - span)
+        mask &= mask >> (count * step)
+        span += count
+    return mask
+
+
+def _bits(mask):
+    """Номера единичных битов mask по возрастанию."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _month_run_days(day_masks, slot_count):
+    """
+    Для масок дней [_DayMasks] возвращает флаги "в этот день есть slot_count
+    свободных слотов подряд".
+    
+    Маски всех дней упаковываются в одно целое с нулевым промежутком в
+    SLOT_MINUTES бит между днями (чтобы серия не переходила через полночь),
+    и серии ищутся одними и теми же сдвигами и AND сразу для всего месяца.
+    """
+    stride = DAY_MINUTES + SLOT_MINUTES
+    packed = 0
+    for i, masks in enumerate(day_masks):
+        packed |= masks.free << (i * stride)
+    starts = _run_starts(packed, slot_count)
+    day_mask = (1 << stride) - 1
+    return [bool(starts >> (i * stride) & day_mask) for i in range(len(day_masks))]
+
+
+class _DayMasks:
+    """
+    Слоты одного дня в виде битовых масок по минутам начала: свободные,
+    занятые клиентами и закрытые (в том числе занятые без клиента).
+
+    Вопросы о сериях свободных слотов ("можно ли начать услугу из N слотов
+    в это время", "все варианты начала") решаются сдвигами и AND над масками,
+    без перебора слотов. Время слотов может быть любым (например, с
+    перерывами 10:00, 10:45, 11:30): в серию попадают только слоты, каждый
+    из которых начинается ровно через SLOT_MINUTES минут после предыдущего.
+    """
+
+    def __init__(self, slots):
+        """slots – записи слотов одного дня."""
+        self.free = self.busy = self.closed = 0
+        self._ids = {}          # минута начала свободного слота -> id слота
+        self._statuses = set()  # статусы всех слотов дня (для status())
+        for slot in slots:
+            status = slot.get('Статус')
+            if status == 'Свободно':
+                kind = 'free'
+            elif status == 'Занято' and slot.get('id_клиента'):
+                kind = 'busy'
+            elif status in ('Занято', 'Закрыто'):
+                kind = 'closed'
+            else:
+                continue
+            self._statuses.add(kind)
+            minutes = _time_minutes(slot.get('Время', ''))
+            if minutes >= DAY_MINUTES:
+                # Слот с некорректным временем учитывается только в статусе дня
+                continue
+            bit = 1 << minutes
+            if kind == 'free':
+                self.free |= bit
+                self._ids.setdefault(minutes, slot.get('id'))
+            elif kind == 'busy':
+                self.busy |= bit
+            else:
+                self.closed |= bit
+
+    def fits(self, minutes, slot_count):
+        """Помещается ли услуга из slot_count слотов, начиная со слота minutes."""
+        return 0 <= minutes < DAY_MINUTES and bool(_run_starts(self.free, slot_count) >> minutes & 1)
+
+    def options(self, slot_count):
+        """Все варианты начала услуги из slot_count слотов: [(минуты начала, [id слотов])]."""
+        return [(start, [self._ids[start + i * SLOT_MINUTES] for i in range(slot_count)])
+                for start in _bits(_run_starts(self.free, slot_count))]
+
+    def status(self):
+        """Статус дня для календаря специалиста: busy, free, mixed, closed или None (слотов нет)."""
+        if 'busy' in self._statuses:
+            return 'mixed' if len(self._statuses) > 1 else 'busy'
+        if 'free' in self._statuses:
+            return 'free'
+        if 'closed' in self._statuses:
+            return 'closed'
+        return None
+
+
+def _row_ranges(row_indices):
+    """
+    Группирует номера строк в непрерывные диапазоны [(первая, последняя), ...],
+    отсортированные по возрастанию.
+    """
+    ranges = []
+    for row_idx in sorted(set(row_indices)):
+        if ranges and row_idx == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], row_idx)
+        else:
+            ranges.append((row_idx, row_idx))
+    return ranges
+
+
+class _SheetSchema:
+    """
+    Заголовки листа и номера их столбцов.
+
+    Строка заголовков читается один раз – при первом обращении или вместе
+    с листом целиком (refresh()), – дальше номер столбца берется из словаря
+    без запросов к API. Схема меняется только при полном перечитывании
+    листа и когда ensure() дописывает недостающие заголовки.
+    """
+
+    def __init__(self, worksheet, headers=None):
+        self.worksheet = worksheet
+        self._headers = None
+        self._columns = {}
+        self._lock = threading.RLock()
+        if headers is not None:
+            self.refresh(headers)
+
+    def refresh(self, headers):
+        """Запоминает строку заголовков, прочитанную вместе с листом."""
+        with self._lock:
+            self._headers = list(headers)
+            self._columns = {}
+            for col_idx, header in enumerate(self._headers, start=1):
+                self._columns.setdefault(header, col_idx)
+
+    @property
+    def headers(self):
+        with self._lock:
+            if self._headers is None:
+                self.refresh(self.worksheet.row_values(1))
+            return self._headers
+
+    def col(self, header):
+        """Номер столбца (с 1) по заголовку. KeyError, если такого столбца нет."""
+        with self._lock:
+            self.headers
+            return self._columns[header]
+
+    def ensure(self, required):
+        """
+        Дописывает в конец строки заголовков отсутствующие из required одним запросом.
+        Возвращает список добавленных заголовков.
+        """
+        with self._lock:
+            headers = self.headers
+            missing = self.missing(required)
+            if missing:
+                self.worksheet.update([missing], rowcol_to_a1(1, len(headers) + 1), value_input_option='RAW')
+                logger.info(f"Добавлены отсутствующие заголовки {missing} в лист {self.worksheet.title}")
+                self.refresh(headers + missing)
+            return missing
+
+    def missing(self, required):
+        """Заголовки из required, которых нет в листе."""
+        with self._lock:
+            self.headers
+            return [header for header in required if header not in self._columns]
+
+    def row(self, data):
+        """Строка листа из словаря {заголовок: значение} в порядке столбцов."""
+        return [data.get(header, '') for header in self.headers]
+
+
+class _SheetTable:
+    """
+    Копия листа Google Sheets в памяти.
+
+    Записи хранятся в том же виде, что возвращает get_all_records():
+    i-я запись соответствует строке i + 2 листа (первая строка – заголовки).
+    Изменения, сделанные через сервис, сразу применяются к копии, а правки,
+    сделанные вручную в таблице, подхватываются после истечения ttl секунд.
+
+    Лист читается без блокировки кэша, а одновременные чтения устаревшего
+    листа объединяются (SingleFlight): запрос уходит один, все ждавшие
+    получают один и тот же разобранный снимок.
+
+    Для столбцов из index_headers поддерживаются хэш-индексы
+    "строковое значение -> номер строки листа" (первое вхождение).
+    Номера столбцов берутся из схемы листа (_SheetSchema).
+    """
+
+    def __init__(self, worksheet, ttl, index_headers=(), schema=None):
+        self.worksheet = worksheet
+        self.ttl = ttl
+        self.schema = schema or _SheetSchema(worksheet)
+        self.index_headers = tuple(index_headers)
+        self._records = []
+        self._indexes = {header: {} for header in self.index_headers}
+        self._max_id = 0
+        self._loaded_at = None
+        self._lock = threading.RLock()
+        self._flight = SingleFlight()
+        # Счетчик изменений кэша: по нему видно, что кэш менялся, пока лист читался
+        self._changes = 0
+        # Сколько пачек записи изменили кэш, но еще не отправили изменения в таблицу
+        self._unsent = 0
+
+    @property
+    def headers(self):
+        return self.schema.headers
+
+    def _is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def _to_record(self, row, headers=None):
+        headers = self.headers if headers is None else headers
+        width = len(headers)
+        row = ['' if v is None else str(v) for v in row[:width]]
+        row += [''] * (width - len(row))
+        return dict(zip(headers, numericise_all(row)))
+
+    def _track_max_id(self, record):
+        try:
+            self._max_id = max(self._max_id, int(record.get('id', 0) or 0))
+        except (TypeError, ValueError):
+            pass
+
+    def _index_record(self, header, row_idx, record):
+        key = str(record.get(header, ''))
+        if key:
+            self._indexes[header].setdefault(key, row_idx)
+
+    def _rebuild_indexes(self, headers=None):
+        for header in headers or self.index_headers:
+            self._indexes[header] = {}
+            for row_idx, record in enumerate(self._records, start=2):
+                self._index_record(header, row_idx, record)
+
+    def load(self):
+        """
+        Перечитывает лист целиком одним запросом и возвращает записи.
+        Одновременные вызовы разделяют один запрос и один результат.
+        """
+        return self._flight.do(self.worksheet.title, self._load)
+
+    def _load(self):
+        with self._lock:
+            changes = self._changes
+        values = self.worksheet.get_all_values()
+        headers = list(values[0]) if values else []
+        records = [self._to_record(row, headers) for row in values[1:]]
+        with self._lock:
+            self.schema.refresh(headers)
+            self._records = records
+            self._rebuild_indexes()
+            self._max_id = 0
+            for record in self._records:
+                self._track_max_id(record)
+            # Если кэш менялся, пока лист читался, или в таблицу еще не ушли изменения
+            # пачки записи, снимок мог их не застать: ждавшие получат его,
+            # а следующее обращение перечитает лист
+            fresh = self._changes == changes and not self._unsent
+            self._loaded_at = time.monotonic() if fresh else None
+            logger.debug(f"Кэш листа '{self.worksheet.title}' обновлен: {len(self._records)} строк")
+            return records
+
+    def records(self):
+        """
+        Возвращает закэшированные записи листа, при необходимости перечитывая его.
+        Записи нельзя изменять снаружи – для отдачи наружу нужно копировать.
+        Не вызывать под self._lock: чтение листа ждет других потоков.
+        """
+        with self._lock:
+            if not self._is_stale():
+                return self._records
+        return self.load()
+
+    def find(self, header, value):
+        """
+        Ищет строку по индексированному столбцу.
+        Возвращает (номер строки листа, запись) или (None, None).
+        """
+        self.records()
+        with self._lock:
+            row_idx = self._indexes[header].get(str(value))
+            if row_idx is None:
+                return None, None
+            return row_idx, self._records[row_idx - 2]
+
+    def max_id(self):
+        """Наибольший числовой id среди строк листа (0, если строк нет)."""
+        self.records()
+        with self._lock:
+            return self._max_id
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+            self._changes += 1
+
+    def begin_write(self):
+        """Пачка записи начала менять кэш раньше, чем таблицу (см. _WriteBatch)."""
+        with self._lock:
+            self._unsent += 1
+            self._changes += 1
+
+    def end_write(self):
+        """Пачка записи отправила (или отбросила) свои изменения."""
+        with self._lock:
+            self._unsent -= 1
+            self._changes += 1
+
+    def append(self, row):
+        """Отражает в кэше строку, добавленную через append_row."""
+        with self._lock:
+            self._changes += 1
+            if self._loaded_at is not None:
+                record = self._to_record(list(row))
+                self._records.append(record)
+                self._track_max_id(record)
+                for header in self.index_headers:
+                    self._index_record(header, len(self._records) + 1, record)
+
+    def update(self, row_idx, changes):
+        """Отражает в кэше изменение ячеек строки row_idx ({заголовок: значение})."""
+        with self._lock:
+            self._changes += 1
+            pos = row_idx - 2
+            if self._loaded_at is not None and 0 <= pos < len(self._records):
+                record = self._records[pos]
+                for header, value in changes.items():
+                    record[header] = _cell_value(value)
+                changed_indexes = [h for h in self.index_headers if h in changes]
+                if changed_indexes:
+                    self._rebuild_indexes(changed_indexes)
+
+    def delete_rows(self, row_indices):
+        """Отражает в кэше удаление строк листа с указанными номерами."""
+        with self._lock:
+            self._changes += 1
+            if self._loaded_at is None:
+                return
+            positions = {row_idx - 2 for row_idx in row_indices}
+            self._records = [r for pos, r in enumerate(self._records) if pos not in positions]
+            # Номера строк ниже удаленных сдвинулись
+            self._rebuild_indexes()
+
+    def ensure_headers(self, required):
+        """Добавляет в лист отсутствующие столбцы (см. _SheetSchema.ensure) и отражает их в кэше."""
+        with self._lock:
+            added = self.schema.ensure(required)
+            if added:
+                self._changes += 1
+            if self._loaded_at is not None:
+                for record in self._records:
+                    for header in added:
+                        record[header] = ''
+
+
+class _ScheduleTable(_SheetTable):
+    """
+    Кэш листа "Расписание" с индексом по дням:
+    (id_специалиста, день) -> {статус: [номера строк, отсортированные по времени]}.
+    День – порядковый номер даты (date.toordinal()): дата каждой строки
+    разбирается один раз при загрузке, дальше сравниваются целые числа.
+    Нераспознанные даты индексируются по самой строке.
+
+    Запросы доступности читают только слоты одного дня, а не весь лист.
+    Битовые маски слотов дня (_DayMasks) строятся при первом запросе и
+    пересчитываются только для того дня, слоты которого изменились.
+    """
+
+    DAY_HEADERS = ('id_специалиста', 'Дата', 'Время')
+
+    def __init__(self, worksheet, ttl, index_headers=('id',), schema=None):
+        super().__init__(worksheet, ttl, index_headers, schema)
+        self._days = {}
+        self._day_masks = {}
+        # Версии данных для инвалидации производных кэшей:
+        # _generation меняется при полной перестройке, _specialist_versions – при правке слотов специалиста
+        self._generation = 0
+        self._specialist_versions = {}
+
+    def _touch(self, record):
+        specialist_id = str(record.get('id_специалиста', ''))
+        self._specialist_versions[specialist_id] = self._specialist_versions.get(specialist_id, 0) + 1
+
+    @staticmethod
+    def _day(date_str):
+        norm_date, ordinal = _parse_date(str(date_str)) if date_str else ('', None)
+        return norm_date if ordinal is None else ordinal
+
+    def _day_key(self, record):
+        return (str(record.get('id_специалиста', '')), self._day(record.get('Дата', '')))
+
+    def _time_key(self, row_idx):
+        return (_time_minutes(self._records[row_idx - 2].get('Время', '')), row_idx)
+
+    def _add_to_day(self, row_idx, record):
+        key = self._day_key(record)
+        buckets = self._days.setdefault(key, {})
+        insort(buckets.setdefault(str(record.get('Статус', '')), []), row_idx, key=self._time_key)
+        self._day_masks.pop(key, None)
+
+    def _rebuild_days(self):
+        self._days = {}
+        self._day_masks = {}
+        for row_idx, record in enumerate(self._records, start=2):
+            self._add_to_day(row_idx, record)
+        self._generation += 1
+
+    def _rebuild_indexes(self, headers=None):
+        super()._rebuild_indexes(headers)
+        if headers is None:
+            self._rebuild_days()
+
+    def append(self, row):
+        with self._lock:
+            super().append(row)
+            if self._loaded_at is not None:
+                self._add_to_day(len(self._records) + 1, self._records[-1])
+                self._touch(self._records[-1])
+
+    def update(self, row_idx, changes):
+        with self._lock:
+            self._changes += 1
+            pos = row_idx - 2
+            if self._loaded_at is None or not 0 <= pos < len(self._records):
+                return
+            record = self._records[pos]
+            old_status = str(record.get('Статус', ''))
+            super().update(row_idx, changes)
+            if any(header in changes for header in self.DAY_HEADERS):
+                self._rebuild_days()
+            elif 'Статус' in changes:
+                # День слота не изменился – переносим строку в корзину нового статуса
+                self._days[self._day_key(record)][old_status].remove(row_idx)
+                self._add_to_day(row_idx, record)
+            self._touch(record)
+
+    def version(self, specialist_id):
+        """Версия слотов специалиста: меняется при любом изменении его расписания в кэше."""
+        self.records()
+        with self._lock:
+            return (self._generation, self._specialist_versions.get(str(specialist_id), 0))
+
+    def day_rows(self, specialist_id, norm_date, status=None):
+        """
+        Слоты специалиста на одну дату в виде [(номер строки, запись)],
+        отсортированные по времени. Если задан status – только слоты с этим статусом.
+        """
+        self.records()
+        with self._lock:
+            buckets = self._days.get((str(specialist_id), self._day(norm_date)), {})
+            if status is not None:
+                rows = list(buckets.get(status, []))
+            else:
+                rows = sorted((r for bucket in buckets.values() for r in bucket), key=self._time_key)
+            return [(row_idx, self._records[row_idx - 2]) for row_idx in rows]
+
+    def range_rows(self, specialist_id, first_day, last_day):
+        """
+        Номера строк слотов специалиста с датами от first_day до last_day
+        включительно (порядковые номера дат), в порядке листа.
+        """
+        self.records()
+        with self._lock:
+            specialist_id = str(specialist_id)
+            return sorted(
+                row_idx
+                for (spec, day), buckets in self._days.items()
+                if spec == specialist_id and isinstance(day, int) and first_day <= day <= last_day
+                for bucket in buckets.values() for row_idx in bucket
+            )
+
+    def day_masks(self, specialist_id, norm_date):
+        """Битовые маски слотов специалиста на дату (_DayMasks)."""
+        self.records()
+        with self._lock:
+            key = (str(specialist_id), self._day(norm_date))
+            masks = self._day_masks.get(key)
+            if masks is None:
+                buckets = self._days.get(key, {})
+                rows = sorted((r for bucket in buckets.values() for r in bucket), key=self._time_key)
+                masks = _DayMasks(self._records[row_idx - 2] for row_idx in rows)
+                if buckets:
+                    self._day_masks[key] = masks
+            return masks
+
+
+class _IdAllocator:
+    """
+    Выдает новые id для строк листов без повторного чтения таблицы.
+
+    Начальное значение берется из кэша листа (max(id) + 1) при первом обращении,
+    дальше id выдаются из счетчика под блокировкой, поэтому одновременные
+    вставки не получают одинаковых id. Если в таблицу вручную добавили строку
+    с большим id, счетчик догонит его после обновления кэша.
+    """
+
+    def __init__(self):
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def allocate(self, table, count=1):
+        """Резервирует count последовательных id для листа и возвращает первый из них."""
+        with self._lock:
+            title = table.worksheet.title
+            first = max(self._next.get(title, 1), table.max_id() + 1)
+            self._next[title] = first + count
+            return first
+
+
+class _WriteBatch:
+    """
+    Накопитель изменений ячеек для одного запроса values:batchUpdate.
+
+    Изменения сразу применяются к кэшу листа, а в таблицу уходят одним
+    запросом при flush(). Повторная запись в ту же ячейку заменяет
+    предыдущее значение. Если запрос не прошел, кэши затронутых листов
+    сбрасываются, чтобы не расходиться с таблицей.
+
+    Пока изменения не отправлены, перечитанный лист не считается свежим:
+    снимок таблицы еще не содержит их и не должен держаться в кэше весь TTL.
+    Пачку нужно завершить через flush() или abort().
+    """
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+        self._cells = {}
+        self._tables = set()
+
+    def update(self, table, row_idx, changes):
+        """Ставит в очередь изменения {заголовок: значение} для строки row_idx листа."""
+        if table not in self._tables:
+            self._tables.add(table)
+            table.begin_write()
+        for header, value in changes.items():
+            col_idx = table.schema.col(header)
+            self._cells[(table, row_idx, col_idx)] = value
+        table.update(row_idx, changes)
+
+    def cells(self):
+        """Ячейки в очереди: множество (лист, номер строки, номер столбца)."""
+        return set(self._cells)
+
+    def discard(self, cells):
+        """Убирает из очереди ячейки, уже записанные в таблицу другой пачкой."""
+        for cell in cells:
+            self._cells.pop(cell, None)
+
+    def pending(self, table, row_idx):
+        """Еще не отправленные изменения строки row_idx листа: {заголовок: значение}."""
+        return {table.headers[col_idx - 1]: value
+                for (t, r, col_idx), value in self._cells.items() if t is table and r == row_idx}
+
+    def flush(self):
+        """Отправляет накопленные изменения одним запросом."""
+        cells, self._cells = self._cells, {}
+        tables, self._tables = self._tables, set()
+        try:
+            if cells:
+                data = [
+                    {'range': f"'{table.worksheet.title}'!{rowcol_to_a1(row_idx, col_idx)}", 'values': [[value]]}
+                    for (table, row_idx, col_idx), value in cells.items()
+                ]
+                self.spreadsheet.values_batch_update({'valueInputOption': 'USER_ENTERED', 'data': data})
+        except Exception:
+            for table in tables:
+                table.invalidate()
+            raise
+        finally:
+            for table in tables:
+                table.end_write()
+
+    def abort(self):
+        """Отбрасывает неотправленные изменения; кэши затронутых листов сбрасываются."""
+        self._cells = {}
+        tables, self._tables = self._tables, set()
+        for table in tables:
+            table.invalidate()
+            table.end_write()
+
+
+# Листы таблицы: название -> (атрибут сервиса, заголовки, проверять ли заголовки существующего листа).
+# Заголовки создаются в новом листе, а при проверке недостающие дописываются в конец строки заголовков
+SHEETS = {
+    'Специалисты': ('specialists_sheet',
+                    ['id', 'Имя', 'Специализация', 'Часовой пояс', 'Реферальная', 'Telegram_ID'], True),
+    'Клиенты': ('clients_sheet', ['id', 'Имя', 'Телефон', 'id_специалиста', 'Telegram_ID'], True),
+    # Подтверждено, Запрос_оценки и Продолжительность нужны для уведомлений
+    'Расписание': ('schedule_sheet',
+                   ['id', 'Дата', 'Время', 'id_специалиста', 'Статус', 'id_клиента',
+                    'Подтверждено', 'Запрос_оценки', 'Продолжительность'], True),
+    'Услуги': ('services_sheet', ['id_специалиста', 'Название', 'Продолжительность', 'Стоимость'], False),
+    'Отзывы': ('reviews_sheet', ['id_клиента', 'id_специалиста', 'Дата', 'Оценка', 'Комментарий'], False),
+    'Логи': ('logs_worksheet', ['Время', 'ID пользователя', 'Имя пользователя', 'Сообщение', 'Тип'], False),
+    'Напоминания': ('reminders_sheet',
+                    ['id', 'id_записи', 'id_клиента', 'id_специалиста', 'Дата', 'Время', 'Статус', 'Услуга'], True),
+}
+
+
 class GoogleSheetsService:
     """Сервис для работы с Google Sheets API"""
 
     def __init__(self):
         try:
-            scopes = [
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive'
-            ]
-            credentials = Credentials.from_service_account_info(
-                GOOGLE_CREDENTIALS_JSON, 
-                scopes=scopes
+            started = time.monotonic()
+            timings = {}
+            
+            # Авторизованная HTTP-сессия и таблица общие для всего процесса (см. SheetsConnection)
+            self.connection = get_connection()
+            self.client = self.connection.client
+            self.spreadsheet = self.connection.open(GOOGLE_SHEET_ID)
+            timings['auth'] = time.monotonic() - started
+            
+            # Все листы вместе со строками заголовков одним запросом, недостающие создаем
+            step = time.monotonic()
+            worksheets, header_rows = self._load_worksheets()
+            created = set()
+            for title, (attr, headers, _) in SHEETS.items():
+                if title not in worksheets:
+                    logger.info(f"Создаем лист '{title}'")
+                    worksheets[title] = self.spreadsheet.add_worksheet(title=title, rows=1000, cols=len(headers))
+                    worksheets[title].append_row(headers)
+                    created.add(title)
+                setattr(self, attr, worksheets[title])
+            timings['metadata'] = time.monotonic() - step
+            
+            # Схемы листов: заголовки и номера столбцов, общие для кэша и записи
+            step = time.monotonic()
+            schemas = self._bootstrap_schemas(worksheets, header_rows, created)
+            timings['headers'] = time.monotonic() - step
+            
+            # Общий генератор id для новых строк
+            self._ids = _IdAllocator()
+            
+            # Текущая пачка изменений ячеек (своя у каждого потока)
+            self._local = threading.local()
+            
+            # Блокировки расписания по специалистам для бронирования
+            self._specialist_locks = {}
+            self._specialist_locks_guard = threading.Lock()
+            
+            # Запомненная доступность по месяцам: (специалист, год, месяц, длительность) -> (версия, результат)
+            self._month_availability = {}
+            self._month_availability_lock = threading.Lock()
+            
+            # Логи пишутся в лист "Логи" пачками в фоновом потоке
+            self._log_writer = BufferedLogWriter(
+                self.batch_write_logs,
+                capacity=LOG_BUFFER_SIZE,
+                flush_size=LOG_FLUSH_SIZE,
+                flush_interval=LOG_FLUSH_INTERVAL,
+                drop_policy=LOG_DROP_POLICY,
             )
-            self.client = gspread.authorize(credentials)
-            self.spreadsheet = self.client.open_by_key(GOOGLE_SHEET_ID)
-            
-            # Проверяем и создаем листы, если они не существуют
-            worksheets = {ws.title: ws for ws in self.spreadsheet.worksheets()}
             
-            # Лист "Специалисты"
-            if 'Специалисты' not in worksheets:
-                logger.info("Создаем лист 'Специалисты'")
-                self.specialists_sheet = self.spreadsheet.add_worksheet(title='Специалисты', rows=1000, cols=6)
-                self.specialists_sheet.append_row(['id', 'Имя', 'Специализация', 'Часовой пояс', 'Реферальная', 'Telegram_ID'])
-            else:
-                self.specialists_sheet = worksheets['Специалисты']
-                # Проверяем заголовки
-                headers = self.specialists_sheet.row_values(1)
-                required_headers = ['id', 'Имя', 'Специализация', 'Часовой пояс', 'Реферальная', 'Telegram_ID']
-                for header in required_headers:
-                    if header not in headers:
-                        logger.info(f"Добавляем отсутствующий заголовок '{header}' в лист Специалисты")
-                        col_idx = len(headers) + 1
-                        self.specialists_sheet.update_cell(1, col_idx, header)
-                        headers.append(header)
-            
-            # Лист "Клиенты"
-            if 'Клиенты' not in worksheets:
-                logger.info("Создаем лист 'Клиенты'")
-                self.clients_sheet = self.spreadsheet.add_worksheet(title='Клиенты', rows=1000, cols=5)
-                self.clients_sheet.append_row(['id', 'Имя', 'Телефон', 'id_специалиста', 'Telegram_ID'])
-            else:
-                self.clients_sheet = worksheets['Клиенты']
-                # Проверяем заголовки
-                headers = self.clients_sheet.row_values(1)
-                required_headers = ['id', 'Имя', 'Телефон', 'id_специалиста', 'Telegram_ID']
-                for header in required_headers:
-                    if header not in headers:
-                        logger.info(f"Добавляем отсутствующий заголовок '{header}' в лист Клиенты")
-                        col_idx = len(headers) + 1
-                        self.clients_sheet.update_cell(1, col_idx, header)
-                        headers.append(header)
-            
-            # Лист "Расписание"
-            if 'Расписание' not in worksheets:
-                logger.info("Создаем лист 'Расписание'")
-                self.schedule_sheet = self.spreadsheet.add_worksheet(title='Расписание', rows=1000, cols=6)
-                self.schedule_sheet.append_row(['id', 'Дата', 'Время', 'id_специалиста', 'Статус', 'id_клиента'])
-            else:
-                self.schedule_sheet = worksheets['Расписание']
-                # Проверяем заголовки
-                headers = self.schedule_sheet.row_values(1)
-                required_headers = ['id', 'Дата', 'Время', 'id_специалиста', 'Статус', 'id_клиента']
-                for header in required_headers:
-                    if header not in headers:
-                        logger.info(f"Добавляем отсутствующий заголовок '{header}' в лист Расписание")
-                        col_idx = len(headers) + 1
-                        self.schedule_sheet.update_cell(1, col_idx, header)
-                        headers.append(header)
-                
-                # Проверяем наличие дополнительных столбцов для функциональности уведомлений
-                additional_headers = ['Подтверждено', 'Запрос_оценки', 'Продолжительность']
-                for header in additional_headers:
-                    if header not in headers:
-                        logger.info(f"Добавляем отсутствующий заголовок '{header}' в лист Расписание")
-                        col_idx = len(headers) + 1
-                        self.schedule_sheet.update_cell(1, col_idx, header)
-                        headers.append(header)
-            
-            # Лист "Услуги"
-            if 'Услуги' not in worksheets:
-                logger.info("Создаем лист 'Услуги'")
-                self.services_sheet = self.spreadsheet.add_worksheet(title='Услуги', rows=1000, cols=4)
-                self.services_sheet.append_row(['id_специалиста', 'Название', 'Продолжительность', 'Стоимость'])
-            else:
-                self.services_sheet = worksheets['Услуги']
-            
-            # Лист "Отзывы"
-            if 'Отзывы' not in worksheets:
-                logger.info("Создаем лист 'Отзывы'")
-                self.reviews_sheet = self.spreadsheet.add_worksheet(title='Отзывы', rows=1000, cols=5)
-                self.reviews_sheet.append_row(['id_клиента', 'id_специалиста', 'Дата', 'Оценка', 'Комментарий'])
-            else:
-                self.reviews_sheet = worksheets['Отзывы']
+            # Кэш листов в памяти (лист логов только пишется, его не кэшируем)
+            self._tables = {
+                'Специалисты': _SheetTable(self.specialists_sheet, SHEETS_CACHE_TTL,
+                                           index_headers=('id', 'Telegram_ID', 'Реферальная'),
+                                           schema=schemas['Специалисты']),
+                'Клиенты': _SheetTable(self.clients_sheet, SHEETS_CACHE_TTL,
+                                       index_headers=('id', 'Telegram_ID', 'Телефон'),
+                                       schema=schemas['Клиенты']),
+                'Расписание': _ScheduleTable(self.schedule_sheet, SHEETS_CACHE_TTL, schema=schemas['Расписание']),
+                'Услуги': _SheetTable(self.services_sheet, SHEETS_CACHE_TTL, schema=schemas['Услуги']),
+                'Отзывы': _SheetTable(self.reviews_sheet, SHEETS_CACHE_TTL, schema=schemas['Отзывы']),
+                'Напоминания': _SheetTable(self.reminders_sheet, SHEETS_CACHE_TTL, index_headers=('id', 'id_записи'),
+                                           schema=schemas['Напоминания']),
+            }
             
-            # Попытка получить или создать лист для логов
-            try:
-                self.logs_worksheet = self.spreadsheet.worksheet('Логи')
-                logger.info("Лист логов найден")
-            except gspread.exceptions.WorksheetNotFound:
-                self.logs_worksheet = self.spreadsheet.add_worksheet(title='Логи', rows=1000, cols=5)
-                self.logs_worksheet.append_row(['Время', 'ID пользователя', 'Имя пользователя', 'Сообщение', 'Тип'])
-                logger.info("Создан новый лист логов")
-            
-            # Лист "Напоминания" для отслеживания отправленных напоминаний
-            if 'Напоминания' not in worksheets:
-                logger.info("Создаем лист 'Напоминания'")
-                self.reminders_sheet = self.spreadsheet.add_worksheet(title='Напоминания', rows=1000, cols=8)
-                self.reminders_sheet.append_row(['id', 'id_записи', 'id_клиента', 'id_специалиста', 'Дата', 'Время', 'Статус', 'Услуга'])
-            else:
-                self.reminders_sheet = worksheets['Напоминания']
-                # Проверяем заголовки
-                headers = self.reminders_sheet.row_values(1)
-                required_headers = ['id', 'id_записи', 'id_клиента', 'id_специалиста', 'Дата', 'Время', 'Статус', 'Услуга']
-                for header in required_headers:
-                    if header not in headers:
-                        logger.info(f"Добавляем отсутствующий заголовок '{header}' в лист Напоминания")
-                        col_idx = len(headers) + 1
-                        self.reminders_sheet.update_cell(1, col_idx, header)
-                        headers.append(header)
-            
-            logger.info("Соединение с Google Sheets успешно установлено")
+            timings['total'] = time.monotonic() - started
+            self.startup_timings = timings
+            logger.info(
+                "Соединение с Google Sheets успешно установлено за {total:.2f} с "
+                "(авторизация {auth:.2f} с, листы {metadata:.2f} с, заголовки {headers:.2f} с)".format(**timings)
+            )
         except Exception as e:
             logger.error(f"Ошибка инициализации Google Sheets: {e}", exc_info=True)
             self.logs_worksheet = None
             raise
 
-                def _normalize_date(self, date_str):
+    def _load_worksheets(self):
         """
-        Нормализует строку даты, удаляя лишние пробелы, символы переноса строки и апострофы.
-        Возвращает строку в формате YYYY-MM-DD.
+        Листы таблицы и строки их заголовков при старте.
+
+        Обычно это один запрос spreadsheets.get с сеткой, ограниченной первой
+        строкой каждого листа. Если какого-то листа еще нет (первый запуск),
+        API отклоняет такой запрос – тогда листы читаются запросом метаданных,
+        а заголовки существующих листов – одним values_batch_get.
+        Возвращает ({название: лист}, {название: заголовки}).
+        """
+        try:
+            return self.connection.worksheets_with_headers(GOOGLE_SHEET_ID, list(SHEETS))
+        except APIError as e:
+            logger.info(f"Не удалось прочитать листы с заголовками одним запросом, читаем по отдельности: {e}")
+        
+        worksheets = self.connection.worksheets(GOOGLE_SHEET_ID)
+        existing = [title for title in SHEETS if title in worksheets]
+        header_rows = {}
+        if existing:
+            response = self.spreadsheet.values_batch_get([f"'{title}'!1:1" for title in existing])
+            for title, value_range in zip(existing, response.get('valueRanges', [])):
+                values = value_range.get('values') or [[]]
+                header_rows[title] = values[0]
+        return worksheets, header_rows
+
+    def _bootstrap_schemas(self, worksheets, header_rows, created):
         """
-        if not date_str:
-            return ""
+        Схемы кэшируемых листов при старте по прочитанным строкам заголовков
+        (см. _load_worksheets); недостающие заголовки дописываются одним
+        values_batch_update. У только что созданных листов заголовки известны.
+        """
+        titles = [title for title in SHEETS if title != 'Логи']
+        schemas, fixes = {}, []
+        for title in titles:
+            _, headers, check = SHEETS[title]
+            schema = _SheetSchema(worksheets[title], headers if title in created else header_rows.get(title, []))
+            missing = schema.missing(headers) if check and title not in created else []
+            if missing:
+                logger.info(f"Добавляем отсутствующие заголовки {missing} в лист {title}")
+                fixes.append({'range': f"'{title}'!{rowcol_to_a1(1, len(schema.headers) + 1)}", 'values': [missing]})
+                schema.refresh(schema.headers + missing)
+            schemas[title] = schema
+        if fixes:
+            self.spreadsheet.values_batch_update({'valueInputOption': 'RAW', 'data': fixes})
+        return schemas
+
+    def _records(self, title):
+        """Закэшированные записи листа (только для чтения внутри сервиса)."""
+        return self._tables[title].records()
 
-        # Удаляем пробелы, символы переноса строки и апострофы
-        date_str = date_str.strip().strip("'").strip('"')
+    def _allocate_ids(self, title, count=1):
+        """Резервирует count последовательных id для листа title, возвращает первый."""
+        return self._ids.allocate(self._tables[title], count)
 
-        # Пытаемся преобразовать в объект datetime для стандартизации
+    @contextmanager
+    def batch_writes(self):
+        """
+        Собирает изменения ячеек внутри блока в один запрос к API.
+
+        Вложенные блоки присоединяются к внешнему, поэтому обработчик может
+        обернуть в batch_writes() несколько операций сервиса и отправить их
+        изменения вместе. Запрос уходит при выходе из внешнего блока.
+        """
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            yield batch
+            return
+        batch = _WriteBatch(self.spreadsheet)
+        self._local.batch = batch
         try:
-            # Проверяем разные форматы даты
-            for fmt in ['%Y-%m-%d', '%d.%m.%Y', '%Y/%m/%d', '%d-%m-%Y']:
-                try:
-                    date_obj = datetime.strptime(date_str, fmt)
-                    return date_obj.strftime('%Y-%m-%d')
-                except ValueError:
-                    continue
+            yield batch
+        finally:
+            self._local.batch = None
+            batch.flush()
 
-            # Если не удалось распознать формат, пробуем разбить строку
-            if '/' in date_str:
-                parts = date_str.split('/')
-            elif '-' in date_str:
-                parts = date_str.split('-')
-            elif '.' in date_str:
-                parts = date_str.split('.')
-            else:
-                logger.warning(f"Не удалось нормализовать дату: {date_str}")
-                return date_str
-
-            if len(parts) == 3:
-                # Пытаемся угадать формат по длине года
-                if len(parts[0]) == 4:  # Год-месяц-день
-                    return f"{parts[0]}-{int(parts[1]):02d}-{int(parts[2]):02d}"
-                elif len(parts[2]) == 4:  # День-месяц-год
-                    return f"{parts[2]}-{int(parts[1]):02d}-{int(parts[0]):02d}"
-
-            logger.warning(f"Не удалось нормализовать дату: {date_str}")
-            return date_str
-        except Exception as e:
-            logger.warning(f"Ошибка при нормализации даты '{date_str}': {e}")
-            return date_str
+    def _delete_rows(self, title, row_indices):
+        """
+        Удаляет строки листа с указанными номерами за один запрос к API.
 
-        # Удаляем пробелы, символы переноса строки и апострофы
-        date_str = date_str.strip().strip("'").strip('"')
+        Соседние строки объединяются в диапазоны, и каждый диапазон удаляется
+        запросом deleteDimension (все в одном batchUpdate, снизу вверх,
+        чтобы номера еще не удаленных строк не сдвигались).
 
-        # Пытаемся преобразовать в объект datetime для стандартизации
+        Возвращает количество удаленных строк.
+        """
+        table = self._tables[title]
+        row_indices = sorted(set(row_indices))
+        if not row_indices:
+            return 0
         try:
-            # Проверяем разные форматы даты
-            for fmt in ['%Y-%m-%d', '%d.%m.%Y', '%Y/%m/%d', '%d-%m-%Y']:
-                try:
-                    date_obj = datetime.strptime(date_str, fmt)
-                    return date_obj.strftime('%Y-%m-%d')
-                except ValueError:
-                    continue
-
-            # Если не удалось распознать формат, пробуем разбить строку
-            if '/' in date_str:
-                parts = date_str.split('/')
-            elif '-' in date_str:
-                parts = date_str.split('-')
-            elif '.' in date_str:
-                parts = date_str.split('.')
-            else:
-                logger.warning(f"Не удалось нормализовать дату: {date_str}")
-                return date_str
-
-            if len(parts) == 3:
-                # Пытаемся угадать формат по длине года
-                if len(parts[0]) == 4:  # Год-месяц-день
-                    return f"{parts[0]}-{int(parts[1]):02d}-{int(parts[2]):02d}"
-                elif len(parts[2]) == 4:  # День-месяц-год
-                    return f"{parts[2]}-{int(parts[1]):02d}-{int(parts[0]):02d}"
-
-            logger.warning(f"Не удалось нормализовать дату: {date_str}")
-            return date_str
-        except Exception as e:
-            logger.warning(f"Ошибка при нормализации даты '{date_str}': {e}")
-            return date_str
+            requests = [
+                {
+                    'deleteDimension': {
+                        'range': {
+                            'sheetId': table.worksheet.id,
+                            'dimension': 'ROWS',
+                            'startIndex': first - 1,
+                            'endIndex': last,
+                        }
+                    }
+                }
+                for first, last in reversed(_row_ranges(row_indices))
+            ]
+            self.spreadsheet.batch_update({'requests': requests})
+        except Exception:
+            # Неизвестно, что успело примениться – перечитаем лист при следующем обращении
+            table.invalidate()
+            raise
+        table.delete_rows(row_indices)
+        return len(row_indices)
 
-        
-        # Удаляем пробелы, символы переноса строки и апострофы
-        date_str = date_str.strip().strip("'").strip('"')
-        
-        # Пытаемся преобразовать в объект datetime для стандартизации
+    @contextmanager
+    def _lock_specialists(self, specialist_ids):
+        """Захватывает блокировки расписания специалистов (в порядке id, чтобы не было взаимоблокировок)."""
+        with self._specialist_locks_guard:
+            locks = [self._specialist_locks.setdefault(sid, threading.Lock())
+                     for sid in sorted({str(sid) for sid in specialist_ids})]
+        for lock in locks:
+            lock.acquire()
         try:
-            # Проверяем разные форматы даты
-            for fmt in ['%Y-%m-%d', '%d.%m.%Y', '%Y/%m/%d', '%d-%m-%Y']:
-                try:
-                    date_obj = datetime.strptime(date_str, fmt)
-                    return date_obj.strftime('%Y-%m-%d')
-                except ValueError:
-                    continue
-            
-            # Если не удалось распознать формат, пробуем разбить строку
-            if '/' in date_str:
-                parts = date_str.split('/')
-            elif '-' in date_str:
-                parts = date_str.split('-')
-            elif '.' in date_str:
-                parts = date_str.split('.')
-            else:
-                logger.warning(f"Не удалось нормализовать дату: {date_str}")
-                return date_str
-            
-            if len(parts) == 3:
-                # Пытаемся угадать формат по длине года
-                if len(parts[0]) == 4:  # Год-месяц-день
-                    return f"{parts[0]}-{int(parts[1]):02d}-{int(parts[2]):02d}"
-                elif len(parts[2]) == 4:  # День-месяц-год
-                    return f"{parts[2]}-{int(parts[1]):02d}-{int(parts[0]):02d}"
-                
-            logger.warning(f"Не удалось нормализовать дату: {date_str}")
-            return date_str
-        except Exception as e:
-            logger.warning(f"Ошибка при нормализации даты '{date_str}': {e}")
-            return date_str
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _read_rows(self, title, row_indices):
+        """
+        Читает из таблицы актуальные значения строк одним запросом batch_get.
+        Изменения, еще не отправленные из текущего блока batch_writes(),
+        накладываются поверх прочитанного.
+        Возвращает {номер строки: {заголовок: значение}}.
+        """
+        table = self._tables[title]
+        headers = table.headers
+        last_col = rowcol_to_a1(1, len(headers)).rstrip('0123456789')
+        ranges = [f"A{row_idx}:{last_col}{row_idx}" for row_idx in row_indices]
+        result = {}
+        for row_idx, value_range in zip(row_indices, table.worksheet.batch_get(ranges)):
+            values = list(value_range[0]) if value_range else []
+            values += [''] * (len(headers) - len(values))
+            result[row_idx] = dict(zip(headers, numericise_all([str(v) for v in values])))
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            for row_idx in row_indices:
+                result[row_idx].update(batch.pending(table, row_idx))
+        return result
+
+    def get_worksheet(self, title):
+        """Лист таблицы по названию (для синхронизации с локальным хранилищем)."""
+        if title == 'Логи':
+            return self.logs_worksheet
+        return self._tables[title].worksheet
+
+    def _find(self, title, header, value):
+        """Поиск строки листа по индексу: (номер строки, запись) или (None, None)."""
+        return self._tables[title].find(header, value)
+
+    def invalidate_cache(self, title=None):
+        """
+        Сбрасывает кэш листа (или всех листов), чтобы следующее чтение
+        получило актуальные данные из таблицы.
+        """
+        tables = [self._tables[title]] if title else self._tables.values()
+        for table in tables:
+            table.invalidate()
+
+    def _normalize_date(self, date_str):
+        """
+        Нормализует строку даты, удаляя лишние пробелы, символы переноса строки и апострофы.
+        Возвращает строку в формате YYYY-MM-DD (см. normalize_date).
+        """
+        return normalize_date(date_str)
 
     def get_available_slots(self, specialist_id, date=None):
         """
@@ -266,8 +1002,21 @@ class GoogleSheetsService:
             Список доступных слотов расписания
         """
         try:
+            # Нормализуем искомую дату, если она задана
+            norm_date = self._normalize_date(date) if date else None
+            
+            # Для конкретной даты читаем только слоты этого дня из индекса
+            if norm_date is not None:
+                day_slots = self._tables['Расписание'].day_rows(specialist_id, norm_date, 'Свободно')
+                available_slots = [dict(slot) for _, slot in day_slots]
+                logger.debug(
+                    f"get_available_slots: специалист {specialist_id}, дата {date}, "
+                    f"найдено {len(available_slots)} слотов"
+                )
+                return available_slots
+            
             # Получаем все записи из листа расписания
-            all_slots = self.schedule_sheet.get_all_records()
+            all_slots = self._records('Расписание')
             
             # Для логирования
             total_slots = len(all_slots)
@@ -278,9 +1027,6 @@ class GoogleSheetsService:
             # Список для хранения доступных слотов
             available_slots = []
             
-            # Нормализуем искомую дату, если она задана
-            norm_date = self._normalize_date(date) if date else None
-            
             # Перебираем все слоты
             for slot in all_slots:
                 # Проверяем, что слот принадлежит запрашиваемому специалисту
@@ -294,41 +1040,118 @@ class GoogleSheetsService:
                     continue
                     
                 total_free_slots += 1
-                
-                # Проверяем дату, если она задана
-                if norm_date is not None:
-                    # Нормализуем дату слота для корректного сравнения
-                    slot_date = self._normalize_date(slot.get('Дата', ''))
-                    if slot_date != norm_date:
-                        continue
-                        
-                total_date_match += 1
-                available_slots.append(slot)
+                available_slots.append(dict(slot))
             
-            # Добавляем отладочное логирование
-            if date is not None:
-                logger.debug(
-                    f"get_available_slots: специалист {specialist_id}, дата {date}, "
-                    f"найдено {len(available_slots)} слотов из {total_slots} "
-                    f"(специалиста: {total_specialist_slots}, свободных: {total_free_slots}, "
-                    f"дата совпала: {total_date_match})"
-                )
+            logger.debug(
+                f"get_available_slots: специалист {specialist_id}, "
+                f"найдено {len(available_slots)} слотов из {total_slots} "
+                f"(специалиста: {total_specialist_slots}, свободных: {total_free_slots})"
+            )
             
             return available_slots
         except Exception as e:
             logger.error(f"Ошибка получения доступных слотов: {e}", exc_info=True)
             return []
 
+    def get_schedule_version(self, specialist_id):
+        """Версия слотов специалиста: меняется при любом изменении его расписания в кэше."""
+        return self._tables['Расписание'].version(specialist_id)
+
+    def get_month_availability(self, specialist_id, year, month, service_duration=30):
+        """
+        Доступность дней месяца для услуги заданной длительности.
+        
+        Args:
+            specialist_id: ID специалиста
+            year, month: месяц календаря
+            service_duration: продолжительность услуги в минутах
+            
+        Returns:
+            Словарь {дата YYYY-MM-DD: True/False}: True, если в этот день есть
+            непрерывная серия свободных 30-минутных слотов для услуги.
+            Результат запоминается до изменения слотов специалиста.
+        """
+        try:
+            import calendar
+            
+            key = (str(specialist_id), year, month, int(service_duration))
+            version = self.get_schedule_version(specialist_id)
+            with self._month_availability_lock:
+                cached = self._month_availability.get(key)
+                if cached and cached[0] == version:
+                    return dict(cached[1])
+            
+            schedule_table = self._tables['Расписание']
+            _, last_day_num = calendar.monthrange(year, month)
+            days = [f"{year}-{month:02d}-{day:02d}" for day in range(1, last_day_num + 1)]
+            masks = [schedule_table.day_masks(specialist_id, date_str) for date_str in days]
+            availability = dict(zip(days, _month_run_days(masks, _slot_count(service_duration))))
+            
+            with self._month_availability_lock:
+                if len(self._month_availability) > 1000:
+                    self._month_availability.clear()
+                self._month_availability[key] = (version, availability)
+            return dict(availability)
+        except Exception as e:
+            logger.error(f"Ошибка получения доступности на месяц: {e}", exc_info=True)
+            return {}
+
+    def get_month_day_statuses(self, specialist_id, year, month):
+        """
+        Статусы дней месяца для календаря специалиста.
+        
+        Returns:
+            Словарь {дата YYYY-MM-DD: статус} только для дней со слотами:
+            'busy' – только записи клиентов, 'mixed' – записи и другие слоты,
+            'free' – свободные (и закрытые) слоты, 'closed' – только закрытые.
+        """
+        try:
+            import calendar
+            
+            schedule_table = self._tables['Расписание']
+            _, last_day_num = calendar.monthrange(year, month)
+            statuses = {}
+            for day in range(1, last_day_num + 1):
+                date_str = f"{year}-{month:02d}-{day:02d}"
+                status = schedule_table.day_masks(specialist_id, date_str).status()
+                if status:
+                    statuses[date_str] = status
+            return statuses
+        except Exception as e:
+            logger.error(f"Ошибка получения статусов дней месяца: {e}", exc_info=True)
+            return {}
+
+    def get_booking_options(self, specialist_id, date, service_duration=30):
+        """
+        Варианты записи на услугу заданной длительности в указанный день.
+        
+        Returns:
+            Список [(начало в минутах от начала дня, [id слотов])] по возрастанию
+            времени: каждый вариант – непрерывная серия свободных слотов для услуги.
+        """
+        try:
+            masks = self._tables['Расписание'].day_masks(specialist_id, self._normalize_date(date))
+            return masks.options(_slot_count(service_duration))
+        except Exception as e:
+            logger.error(f"Ошибка получения вариантов записи: {e}", exc_info=True)
+            return []
+
+    def get_available_times(self, specialist_id, date, service_duration=30):
+        """Время начала ("HH:MM") всех вариантов записи на услугу в указанный день."""
+        return [f"{start // 60:02d}:{start % 60:02d}"
+                for start, _ in self.get_booking_options(specialist_id, date, service_duration)]
+
     def generate_month_schedule(self, specialist_id, working_days, start_time, end_time, break_minutes):
         """
         Генерирует расписание для специалиста на ближайшие 30 дней и добавляет слоты в расписание (лист "Расписание").
+        Все слоты записываются одним запросом. Возвращает список ID созданных слотов.
         """
         try:
             start_dt = datetime.strptime(start_time, "%H:%M").time()
             end_dt = datetime.strptime(end_time, "%H:%M").time()
         except Exception as e:
             logger.error(f"Ошибка преобразования времени: {e}")
-            return
+            return []
 
         today = date.today()
         mapping = {
@@ -341,6 +1164,8 @@ class GoogleSheetsService:
             "Sunday": "Воскресенье"
         }
 
+        started = time.monotonic()
+        new_slots = []
         for day_offset in range(30):
             current_day = today + timedelta(days=day_offset)
             day_russian = mapping.get(current_day.strftime("%A"), current_day.strftime("%A"))
@@ -349,21 +1174,28 @@ class GoogleSheetsService:
                 end_dt_full = datetime.combine(current_day, end_dt)
                 while current_dt + timedelta(minutes=30) <= end_dt_full:
                     slot_time = current_dt.strftime("%H:%M")
-                    self.add_schedule_slot(current_day.strftime("%Y-%m-%d"), slot_time, specialist_id)
+                    new_slots.append((current_day.strftime("%Y-%m-%d"), slot_time))
                     current_dt += timedelta(minutes=30 + break_minutes)
-        logger.info(f"Генерация расписания на месяц для специалиста {specialist_id} завершена.")
+        
+        slot_ids = self.add_schedule_slots(new_slots, specialist_id)
+        logger.info(
+            f"Генерация расписания на месяц для специалиста {specialist_id} завершена: "
+            f"создано {len(slot_ids)} слотов за {time.monotonic() - started:.2f} с."
+        )
+        return slot_ids
         
     def generate_specific_month_schedule(self, specialist_id, working_days, start_time, end_time, break_minutes, year, month):
         """
         Генерирует расписание для специалиста на выбранный месяц и год
         и добавляет слоты в расписание (лист "Расписание").
+        Все слоты записываются одним запросом. Возвращает список ID созданных слотов.
         """
         try:
             start_dt = datetime.strptime(start_time, "%H:%M").time()
             end_dt = datetime.strptime(end_time, "%H:%M").time()
         except Exception as e:
             logger.error(f"Ошибка преобразования времени: {e}")
-            return
+            return []
 
         import calendar
         
@@ -385,7 +1217,9 @@ class GoogleSheetsService:
             "Sunday": "Воскресенье"
         }
 
-        # Генерируем слоты для каждого дня месяца
+        # Генерируем слоты для каждого дня месяца в памяти
+        started = time.monotonic()
+        new_slots = []
         current_day = first_day
         while current_day <= last_day:
             day_russian = mapping.get(current_day.strftime("%A"), current_day.strftime("%A"))
@@ -394,15 +1228,24 @@ class GoogleSheetsService:
                 end_dt_full = datetime.combine(current_day, end_dt)
                 while current_dt + timedelta(minutes=30) <= end_dt_full:
                     slot_time = current_dt.strftime("%H:%M")
-                    self.add_schedule_slot(current_day.strftime("%Y-%m-%d"), slot_time, specialist_id)
+                    new_slots.append((current_day.strftime("%Y-%m-%d"), slot_time))
                     current_dt += timedelta(minutes=30 + break_minutes)
             current_day += timedelta(days=1)
-            
-        logger.info(f"Генерация расписания на {month}/{year} для специалиста {specialist_id} завершена.")
+        
+        # Записываем все слоты одним запросом
+        slot_ids = self.add_schedule_slots(new_slots, specialist_id)
+        logger.info(
+            f"Генерация расписания на {month}/{year} для специалиста {specialist_id} завершена: "
+            f"создано {len(slot_ids)} слотов за {time.monotonic() - started:.2f} с."
+        )
+        return slot_ids
 
     def clear_month_schedule(self, specialist_id, year, month):
         """
         Очищает все слоты для указанного специалиста за определенный месяц.
+        Строки удаляются одним запросом к API (см. _delete_rows). Номера строк
+        берутся из только что перечитанного листа под блокировкой расписания
+        специалиста, чтобы не удалить чужие строки, если лист правили вручную.
         Возвращает количество удаленных слотов.
         """
         try:
@@ -415,47 +1258,15 @@ class GoogleSheetsService:
             _, last_day_num = calendar.monthrange(year, month)
             last_day = date(year, month, last_day_num)
             
-            # Форматируем даты в строки для сравнения
-            start_date_str = first_day.strftime("%Y-%m-%d")
-            end_date_str = last_day.strftime("%Y-%m-%d")
-            
-            # Получаем все строки из листа расписания
-            all_rows = self.schedule_sheet.get_all_values()
-            
-            # Индексы для столбцов
-            idx_id = 0
-            idx_date = 1
-            idx_specialist = 3
-            idx_status = 4
-            idx_client = 5
-            
-            # Строки для удаления (в обратном порядке, чтобы не нарушить индексацию)
-            rows_to_delete = []
-            
-            # Проходимся по всем строкам (кроме заголовка)
-            for i in range(1, len(all_rows)):
-                row = all_rows[i]
-                if len(row) <= max(idx_date, idx_specialist, idx_status, idx_client):
-                    # Неполная строка, пропускаем
-                    continue
+            schedule_table = self._tables['Расписание']
+            with self._lock_specialists([specialist_id]):
+                # Слоты месяца берем из индекса по дням перечитанного листа
+                schedule_table.load()
+                rows_to_delete = schedule_table.range_rows(
+                    specialist_id, first_day.toordinal(), last_day.toordinal())
                 
-                # Проверяем, что это запись нужного специалиста
-                if str(row[idx_specialist]) != str(specialist_id):
-                    continue
-                
-                # Проверяем, что дата находится в нужном месяце
-                date_str = self._normalize_date(row[idx_date].strip() if row[idx_date] else "")
-                if not date_str or date_str < start_date_str or date_str > end_date_str:
-                    continue
-                
-                # Этот слот подходит для удаления
-                rows_to_delete.append(i + 1)  # +1 т.к. в Google Sheets строки начинаются с 1
-            
-            # Удаляем строки в обратном порядке
-            deleted_count = 0
-            for row_idx in sorted(rows_to_delete, reverse=True):
-                self.schedule_sheet.delete_row(row_idx)
-                deleted_count += 1
+                # Удаляем все строки одним запросом
+                deleted_count = self._delete_rows('Расписание', rows_to_delete)
             
             logger.info(f"Удалено {deleted_count} слотов за {month}/{year} для специалиста {specialist_id}")
             return deleted_count
@@ -478,26 +1289,16 @@ class GoogleSheetsService:
         """
         try:
             normalized_date = self._normalize_date(date_str)
-            all_slots = self.schedule_sheet.get_all_records()
+            schedule_table = self._tables['Расписание']
+            day_slots = schedule_table.day_rows(specialist_id, normalized_date)
             updated = False
-            # Получаем заголовки, чтобы найти нужные колонки
-            headers = self.schedule_sheet.row_values(1)
-            status_col = headers.index('Статус') + 1
-            client_col = headers.index('id_клиента') + 1
-            
-            # Итерируем по слотам (начиная со второй строки, т.к. первая – заголовки)
-            for idx, slot in enumerate(all_slots, start=2):
-                slot_date = self._normalize_date(slot.get('Дата', ''))
-                
-                # Логирование для отладки
-                if str(slot.get('id_специалиста')) == str(specialist_id):
-                    logger.debug(f"Проверка слота: дата в слоте={slot.get('Дата', '')}, нормализованная={slot_date}, искомая={normalized_date}")
-                
-                if (str(slot.get('id_специалиста')) == str(specialist_id) and 
-                    slot_date == normalized_date and slot.get('Статус') != 'Закрыто'):
-                    self.schedule_sheet.update_cell(idx, status_col, 'Закрыто')
-                    self.schedule_sheet.update_cell(idx, client_col, '')
-                    updated = True
+            
+            # Итерируем только по слотам этого дня из индекса, все изменения уходят одним запросом
+            with self.batch_writes() as batch:
+                for idx, slot in day_slots:
+                    if slot.get('Статус') != 'Закрыто':
+                        batch.update(schedule_table, idx, {'Статус': 'Закрыто', 'id_клиента': ''})
+                        updated = True
             
             if updated:
                 logger.info(f"Слоты для специалиста {specialist_id} на дату {date_str} закрыты.")
@@ -509,10 +1310,14 @@ class GoogleSheetsService:
             return False
 
     def add_log_entry(self, log_data):
+        """
+        Ставит строку лога в очередь на запись. В таблицу она попадет вместе
+        с другими через batch_write_logs, вызывающий поток API не ждет.
+        """
         try:
             if self.logs_worksheet:
-                self.logs_worksheet.append_row(log_data)
-                logger.debug(f"Лог добавлен в Google Sheets: {log_data}")
+                if not self._log_writer.submit(list(log_data)):
+                    logger.debug(f"Лог отброшен, буфер переполнен: {log_data}")
             else:
                 logger.warning("Не удалось добавить лог: logs_worksheet не инициализирован")
         except Exception as e:
@@ -524,39 +1329,43 @@ class GoogleSheetsService:
         Если все записи выполнены успешно – возвращает True, иначе False.
         """
         try:
-            self.logs_worksheet.append_rows(logs, value_input_option='RAW')
+            # Логи пишутся из фонового потока и пропускают вперед запросы пользователей
+            with self.background_requests():
+                self.logs_worksheet.append_rows(logs, value_input_option='RAW')
             logger.info(f"Успешно записаны {len(logs)} логов в Google Sheets.")
             return True
         except Exception as e:
             logger.error(f"Ошибка в batch_write_logs: {e}")
             return False
             
+    def background_requests(self):
+        """Контекст, в котором запросы текущего потока к API идут с фоновым приоритетом."""
+        return self.connection.scheduler.background()
+
+    def close(self):
+        """Дописывает накопленные логи в таблицу и останавливает фоновую запись."""
+        self._log_writer.stop()
+
     # Методы для работы со специалистами
     def get_all_specialists(self):
         try:
-            return self.specialists_sheet.get_all_records()
+            return [dict(specialist) for specialist in self._records('Специалисты')]
         except Exception as e:
             logger.error(f"Ошибка получения специалистов: {e}")
             return []
 
     def get_specialist_by_id(self, specialist_id):
         try:
-            all_specialists = self.specialists_sheet.get_all_records()
-            for specialist in all_specialists:
-                if str(specialist['id']) == str(specialist_id):
-                    return specialist
-            return None
+            _, specialist = self._find('Специалисты', 'id', specialist_id)
+            return dict(specialist) if specialist else None
         except Exception as e:
             logger.error(f"Ошибка получения специалиста по ID: {e}")
             return None
 
     def get_specialist_by_ref_link(self, ref_link):
         try:
-            all_specialists = self.specialists_sheet.get_all_records()
-            for specialist in all_specialists:
-                if specialist['Реферальная'] == ref_link:
-                    return specialist
-            return None
+            _, specialist = self._find('Специалисты', 'Реферальная', ref_link)
+            return dict(specialist) if specialist else None
         except Exception as e:
             logger.error(f"Ошибка получения специалиста по реферальной ссылке: {e}")
             return None
@@ -565,32 +1374,17 @@ class GoogleSheetsService:
         try:
             # Проверяем, зарегистрирован ли уже пользователь с таким Telegram_ID
             if telegram_id:
-                all_specialists = self.specialists_sheet.get_all_records()
-                for specialist in all_specialists:
-                    if str(specialist.get('Telegram_ID', '')) == str(telegram_id):
-                        logger.info(f"Специалист с Telegram_ID {telegram_id} уже существует.")
-                        return specialist.get('id')
+                _, specialist = self._find('Специалисты', 'Telegram_ID', telegram_id)
+                if specialist:
+                    logger.info(f"Специалист с Telegram_ID {telegram_id} уже существует.")
+                    return specialist.get('id')
                         
-            # Получаем заголовки для определения порядка столбцов
-            headers = self.specialists_sheet.row_values(1)
-            
-            # Убедимся, что все необходимые колонки существуют
-            required_headers = ['id', 'Имя', 'Специализация', 'Часовой пояс', 'Реферальная', 'Telegram_ID']
-            for header in required_headers:
-                if header not in headers:
-                    logger.info(f"Добавляем отсутствующий заголовок '{header}' в лист Специалисты.")
-                    col_idx = len(headers) + 1
-                    self.specialists_sheet.update_cell(1, col_idx, header)
-                    headers.append(header)
-            
-            # Получаем всех специалистов для определения нового ID
-            all_specialists = self.specialists_sheet.get_all_records()
-            new_id = 1
-            if all_specialists:
-                try:
-                    new_id = max(int(specialist.get('id', 0)) for specialist in all_specialists) + 1
-                except ValueError:
-                    logger.warning("Ошибка определения нового ID специалиста. Используем значение по умолчанию.")
+            # Убедимся, что все необходимые колонки существуют (заголовки берутся из схемы листа)
+            specialists_table = self._tables['Специалисты']
+            specialists_table.ensure_headers(['id', 'Имя', 'Специализация', 'Часовой пояс', 'Реферальная', 'Telegram_ID'])
+            
+            # Получаем новый ID специалиста
+            new_id = self._allocate_ids('Специалисты')
             
             # Создаем новый словарь данных специалиста
             new_specialist_data = {
@@ -603,8 +1397,9 @@ class GoogleSheetsService:
             }
             
             # Добавляем специалиста в таблицу в правильном порядке колонок
-            new_specialist_row = [new_specialist_data.get(header, '') for header in headers]
+            new_specialist_row = specialists_table.schema.row(new_specialist_data)
             self.specialists_sheet.append_row(new_specialist_row)
+            specialists_table.append(new_specialist_row)
             
             logger.info(f"Добавлен новый специалист: {name}, ID: {new_id}")
             return new_id
@@ -614,23 +1409,18 @@ class GoogleSheetsService:
             
     def update_specialist_referral_link(self, specialist_id, referral_link):
         try:
-            all_specialists = self.specialists_sheet.get_all_records()
-            row_idx = None
-            for idx, specialist in enumerate(all_specialists, start=2):
-                if str(specialist.get('id', '')) == str(specialist_id):
-                    row_idx = idx
-                    break
+            row_idx, specialist = self._find('Специалисты', 'id', specialist_id)
             
             if row_idx:
-                headers = self.specialists_sheet.row_values(1)
-                col_idx = headers.index('Реферальная') + 1
-                self.specialists_sheet.update_cell(row_idx, col_idx, referral_link)
+                specialists_table = self._tables['Специалисты']
+                changes = {'Реферальная': referral_link}
                 
                 # Также обновляем Telegram_ID, если он есть
-                if 'Telegram_ID' in headers and not specialist.get('Telegram_ID'):
-                    col_idx_tg = headers.index('Telegram_ID') + 1
-                    telegram_id = specialist.get('Telegram_ID', '')
-                    self.specialists_sheet.update_cell(row_idx, col_idx_tg, telegram_id)
+                if 'Telegram_ID' in specialists_table.headers and not specialist.get('Telegram_ID'):
+                    changes['Telegram_ID'] = specialist.get('Telegram_ID', '')
+                
+                with self.batch_writes() as batch:
+                    batch.update(specialists_table, row_idx, changes)
                 
                 logger.info(f"Обновлена реферальная ссылка для специалиста ID: {specialist_id}")
                 return True
@@ -641,22 +1431,16 @@ class GoogleSheetsService:
 
     def get_specialist_by_telegram_id(self, telegram_id):
         try:
-            all_specialists = self.get_all_specialists()
-            for specialist in all_specialists:
-                if str(specialist.get('Telegram_ID', '')) == str(telegram_id):
-                    return specialist
-            return None
+            _, specialist = self._find('Специалисты', 'Telegram_ID', telegram_id)
+            return dict(specialist) if specialist else None
         except Exception as e:
             logger.error(f"Ошибка при получении специалиста по Telegram ID: {e}")
             return None
             
     def get_client_by_telegram_id(self, telegram_id):
         try:
-            all_clients = self.get_all_clients()
-            for client in all_clients:
-                if str(client.get('Telegram_ID', '')) == str(telegram_id):
-                    return client
-            return None
+            _, client = self._find('Клиенты', 'Telegram_ID', telegram_id)
+            return dict(client) if client else None
         except Exception as e:
             logger.error(f"Ошибка при получении клиента по Telegram ID: {e}")
             return None
@@ -664,29 +1448,23 @@ class GoogleSheetsService:
     # Методы для работы с клиентами
     def get_all_clients(self):
         try:
-            return self.clients_sheet.get_all_records()
+            return [dict(client) for client in self._records('Клиенты')]
         except Exception as e:
             logger.error(f"Ошибка получения клиентов: {e}")
             return []
 
     def get_client_by_id(self, client_id):
         try:
-            all_clients = self.clients_sheet.get_all_records()
-            for client in all_clients:
-                if str(client['id']) == str(client_id):
-                    return client
-            return None
+            _, client = self._find('Клиенты', 'id', client_id)
+            return dict(client) if client else None
         except Exception as e:
             logger.error(f"Ошибка получения клиента по ID: {e}")
             return None
 
     def get_client_by_phone(self, phone):
         try:
-            all_clients = self.clients_sheet.get_all_records()
-            for client in all_clients:
-                if client['Телефон'] == phone:
-                    return client
-            return None
+            _, client = self._find('Клиенты', 'Телефон', phone)
+            return dict(client) if client else None
         except Exception as e:
             logger.error(f"Ошибка получения клиента по телефону: {e}")
             return None
@@ -695,32 +1473,17 @@ class GoogleSheetsService:
         try:
             # Проверяем, зарегистрирован ли уже пользователь с таким Telegram_ID
             if telegram_id:
-                all_clients = self.clients_sheet.get_all_records()
-                for client in all_clients:
-                    if str(client.get('Telegram_ID', '')) == str(telegram_id):
-                        logger.info(f"Клиент с Telegram_ID {telegram_id} уже существует.")
-                        return client.get('id')
+                _, client = self._find('Клиенты', 'Telegram_ID', telegram_id)
+                if client:
+                    logger.info(f"Клиент с Telegram_ID {telegram_id} уже существует.")
+                    return client.get('id')
                         
-            # Получаем заголовки для определения порядка столбцов
-            headers = self.clients_sheet.row_values(1)
-            
-            # Убедимся, что все необходимые колонки существуют
-            required_headers = ['id', 'Имя', 'Телефон', 'id_специалиста', 'Telegram_ID']
-            for header in required_headers:
-                if header not in headers:
-                    logger.info(f"Добавляем отсутствующий заголовок '{header}' в лист Клиенты.")
-                    col_idx = len(headers) + 1
-                    self.clients_sheet.update_cell(1, col_idx, header)
-                    headers.append(header)
-            
-            # Получаем всех клиентов для определения нового ID
-            all_clients = self.clients_sheet.get_all_records()
-            new_id = 1
-            if all_clients:
-                try:
-                    new_id = max(int(client.get('id', 0)) for client in all_clients) + 1
-                except ValueError:
-                    logger.warning("Ошибка определения нового ID клиента. Используем значение по умолчанию.")
+            # Убедимся, что все необходимые колонки существуют (заголовки берутся из схемы листа)
+            clients_table = self._tables['Клиенты']
+            clients_table.ensure_headers(['id', 'Имя', 'Телефон', 'id_специалиста', 'Telegram_ID'])
+            
+            # Получаем новый ID клиента
+            new_id = self._allocate_ids('Клиенты')
             
             # Создаем новый словарь данных клиента
             new_client_data = {
@@ -732,8 +1495,9 @@ class GoogleSheetsService:
             }
             
             # Добавляем клиента в таблицу в правильном порядке колонок
-            new_client_row = [new_client_data.get(header, '') for header in headers]
+            new_client_row = clients_table.schema.row(new_client_data)
             self.clients_sheet.append_row(new_client_row)
+            clients_table.append(new_client_row)
             
             logger.info(f"Добавлен новый клиент: {name}, ID: {new_id}")
             return new_id
@@ -742,13 +1506,39 @@ class GoogleSheetsService:
             return None
 
     # Методы для работы с расписанием
+    def get_all_slots(self):
+        """
+        Возвращает все слоты расписания (копии записей из кэша).
+        """
+        try:
+            return [dict(slot) for slot in self._records('Расписание')]
+        except Exception as e:
+            logger.error(f"Ошибка получения расписания: {e}")
+            return []
+
+    def set_slot_status(self, slot_id, new_status):
+        """
+        Меняет статус слота расписания (например, "Закрыто" или "Свободно").
+        """
+        try:
+            row_idx, _ = self._find('Расписание', 'id', slot_id)
+            if row_idx:
+                with self.batch_writes() as batch:
+                    batch.update(self._tables['Расписание'], row_idx, {'Статус': new_status})
+                logger.info(f"Статус слота ID={slot_id} изменен на {new_status}")
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка изменения статуса слота: {e}")
+            return False
+
     def get_client_appointments(self, client_id):
         try:
-            all_slots = self.schedule_sheet.get_all_records()
+            all_slots = self._records('Расписание')
             client_slots = []
             for slot in all_slots:
                 if str(slot.get('id_клиента', '')) == str(client_id):
-                    client_slots.append(slot)
+                    client_slots.append(dict(slot))
             return client_slots
         except Exception as e:
             logger.error(f"Ошибка получения записей клиента: {e}")
@@ -756,32 +1546,179 @@ class GoogleSheetsService:
 
     def book_appointment(self, slot_id, client_id):
         try:
-            all_slots = self.schedule_sheet.get_all_records()
-            row_idx = None
-            for idx, slot in enumerate(all_slots, start=2):
-                if str(slot['id']) == str(slot_id) and slot['Статус'] == 'Свободно':
-                    row_idx = idx
-                    break
-            if row_idx:
-                self.schedule_sheet.update_cell(row_idx, 5, 'Занято')
-                self.schedule_sheet.update_cell(row_idx, 6, client_id)
-                return True
-            return False
+            return self.book_slots([slot_id], client_id).ok
         except Exception as e:
             logger.error(f"Ошибка бронирования слота: {e}")
             return False
 
-    def cancel_appointment(self, slot_id):
+    def _slot_conflicts(self, slots, book_ids, client_id):
+        """
+        id слотов, которые нельзя изменить: бронируемые (book_ids) должны быть
+        свободны, остальные – заняты этим клиентом.
+        """
+        conflicts = []
+        for sid, slot in slots.items():
+            if sid in book_ids:
+                ok = slot.get('Статус') == 'Свободно'
+            else:
+                ok = slot.get('Статус') == 'Занято' and str(slot.get('id_клиента')) == str(client_id)
+            if not ok:
+                conflicts.append(sid)
+        return conflicts
+
+    def _change_slots(self, client_id, book_ids=(), release_ids=(), held_ids=(), on_commit=None):
+        """
+        Бронирует для клиента слоты book_ids и освобождает его слоты release_ids –
+        все или ничего. held_ids только проверяются (должны быть заняты клиентом).
+        
+        Под блокировкой расписания специалистов проверяет слоты по кэшу, затем
+        одним запросом перечитывает их строки из таблицы (проверка версии: строка
+        на месте и статус слота не изменился) и одним запросом записывает все
+        изменения, не выходя из-под блокировки (в том числе внутри внешнего
+        batch_writes()). on_commit(batch, slots) может добавить в ту же пачку свои
+        изменения. Если строки сдвинулись (лист правили вручную), кэш
+        перечитывается и проверка повторяется.
+        
+        Returns:
+            BookingResult(ok, conflicts)
+        """
+        book_ids = [str(sid) for sid in book_ids]
+        release_ids = [str(sid) for sid in release_ids]
+        slot_ids = book_ids + release_ids + [str(sid) for sid in held_ids]
+        schedule_table = self._tables['Расписание']
+        for _ in range(2):
+            found = {sid: self._find('Расписание', 'id', sid) for sid in slot_ids}
+            missing = [sid for sid, (row_idx, _) in found.items() if not row_idx]
+            if missing:
+                return BookingResult(False, missing)
+            
+            with self._lock_specialists(slot.get('id_специалиста') for _, slot in found.values()):
+                # Под блокировкой смотрим состояние еще раз: слоты могли изменить, пока мы ждали
+                found = {sid: self._find('Расписание', 'id', sid) for sid in slot_ids}
+                missing = [sid for sid, (row_idx, _) in found.items() if not row_idx]
+                if missing:
+                    return BookingResult(False, missing)
+                conflicts = self._slot_conflicts({sid: slot for sid, (_, slot) in found.items()}, book_ids, client_id)
+                if conflicts:
+                    return BookingResult(False, conflicts)
+                
+                fresh = self._read_rows('Расписание', [row_idx for row_idx, _ in found.values()])
+                if any(str(fresh[row_idx].get('id')) != sid for sid, (row_idx, _) in found.items()):
+                    logger.info("Строки расписания сдвинулись, перечитываем лист")
+                    schedule_table.invalidate()
+                    continue
+                conflicts = self._slot_conflicts({sid: fresh[row_idx] for sid, (row_idx, _) in found.items()},
+                                                 book_ids, client_id)
+                if conflicts:
+                    # В таблице слоты уже изменены, а кэш устарел
+                    schedule_table.invalidate()
+                    return BookingResult(False, conflicts)
+                
+                # Своя пачка, отправляемая под блокировкой: даже внутри внешнего
+                # batch_writes() бронь попадает в таблицу раньше, чем слоты проверит другой поток
+                batch = _WriteBatch(self.spreadsheet)
+                try:
+                    for sid in book_ids:
+                        batch.update(schedule_table, found[sid][0], {'Статус': 'Занято', 'id_клиента': client_id})
+                    for sid in release_ids:
+                        batch.update(schedule_table, found[sid][0], {'Статус': 'Свободно', 'id_клиента': ''})
+                    if on_commit:
+                        on_commit(batch, {sid: fresh[row_idx] for sid, (row_idx, _) in found.items()})
+                except Exception:
+                    batch.abort()
+                    raise
+                written = batch.cells()
+                batch.flush()
+                # Более старые значения тех же ячеек во внешней пачке не должны затереть бронь
+                outer = getattr(self._local, 'batch', None)
+                if outer is not None:
+                    outer.discard(written)
+                return BookingResult(True, [])
+        return BookingResult(False, slot_ids)
+
+    def book_slots(self, slot_ids, client_id):
+        """
+        Бронирует для клиента все слоты slot_ids или ни одного
+        (одно чтение для проверки и один запрос на запись).
+        
+        Returns:
+            BookingResult(ok, conflicts)
+        """
+        slot_ids = list(slot_ids)
+        if not slot_ids:
+            return BookingResult(False, [])
         try:
-            all_slots = self.schedule_sheet.get_all_records()
-            row_idx = None
-            for idx, slot in enumerate(all_slots, start=2):
-                if str(slot['id']) == str(slot_id) and slot['Статус'] == 'Занято':
-                    row_idx = idx
-                    break
+            result = self._change_slots(client_id, book_ids=slot_ids)
+            if result.ok:
+                logger.info(f"Клиент {client_id} забронировал слоты {slot_ids}")
+            return result
+        except Exception as e:
+            logger.error(f"Ошибка бронирования слотов {slot_ids}: {e}", exc_info=True)
+            return BookingResult(False, [])
+
+    def reschedule(self, old_slot_ids, new_slot_ids, client_id):
+        """
+        Переносит запись клиента со слотов old_slot_ids на new_slot_ids.
+        
+        Бронь новых слотов, освобождение старых и перенос последнего напоминания
+        клиента о записи (его id_записи, дата и время) выполняются одной пачкой после одного
+        проверочного чтения: либо перенос выполнен целиком, либо ничего не изменилось.
+        Слоты, входящие в обе записи, остаются за клиентом.
+        
+        Returns:
+            BookingResult(ok, conflicts)
+        """
+        old_slot_ids = [str(sid) for sid in old_slot_ids]
+        new_slot_ids = [str(sid) for sid in new_slot_ids]
+        if not old_slot_ids or not new_slot_ids:
+            return BookingResult(False, [])
+        
+        def move_reminder(batch, slots):
+            row_idx = self._client_reminder_row(old_slot_ids[0], client_id)
             if row_idx:
-                self.schedule_sheet.update_cell(row_idx, 5, 'Свободно')
-                self.schedule_sheet.update_cell(row_idx, 6, '')
+                new_slot = slots[new_slot_ids[0]]
+                batch.update(self._tables['Напоминания'], row_idx, {
+                    'id_записи': new_slot_ids[0],
+                    'Дата': self._normalize_date(str(new_slot.get('Дата', ''))),
+                    'Время': new_slot.get('Время', ''),
+                    'Статус': 'pending',
+                })
+        
+        try:
+            result = self._change_slots(
+                client_id,
+                book_ids=[sid for sid in new_slot_ids if sid not in old_slot_ids],
+                release_ids=[sid for sid in old_slot_ids if sid not in new_slot_ids],
+                held_ids=[sid for sid in old_slot_ids if sid in new_slot_ids],
+                on_commit=move_reminder,
+            )
+            if result.ok:
+                logger.info(f"Запись клиента {client_id} перенесена со слотов {old_slot_ids} на {new_slot_ids}")
+            return result
+        except Exception as e:
+            logger.error(f"Ошибка переноса записи {old_slot_ids} -> {new_slot_ids}: {e}", exc_info=True)
+            return BookingResult(False, [])
+
+    def _client_reminder_row(self, appointment_id, client_id):
+        """
+        Номер строки последнего напоминания клиента о записи appointment_id или None.
+        Напоминания при отмене не удаляются, поэтому по одному слоту могут быть
+        напоминания прежних клиентов – их не трогаем.
+        """
+        reminders = self._records('Напоминания')
+        for row_idx in range(len(reminders) + 1, 1, -1):
+            reminder = reminders[row_idx - 2]
+            if (str(reminder.get('id_записи', '')) == str(appointment_id) and
+                    str(reminder.get('id_клиента', '')) == str(client_id)):
+                return row_idx
+        return None
+
+    def cancel_appointment(self, slot_id):
+        try:
+            row_idx, slot = self._find('Расписание', 'id', slot_id)
+            if row_idx and slot['Статус'] == 'Занято':
+                with self.batch_writes() as batch:
+                    batch.update(self._tables['Расписание'], row_idx, {'Статус': 'Свободно', 'id_клиента': ''})
                 logger.info(f"Отменена запись, слот ID={slot_id}")
                 return True
             return False
@@ -791,37 +1728,113 @@ class GoogleSheetsService:
 
     def add_schedule_slot(self, date, time, specialist_id):
         try:
-            all_slots = self.schedule_sheet.get_all_records()
-            new_id = 1
-            if all_slots:
-                try:
-                    new_id = max(int(slot.get('id', 0)) for slot in all_slots) + 1
-                except ValueError:
-                    logger.warning("Ошибка определения нового ID слота. Используем значение по умолчанию.")
+            new_id = self._allocate_ids('Расписание')
                     
             # Нормализуем дату
             date = self._normalize_date(date)
                 
-            new_slot = [new_id, date, time, specialist_id, 'Свободно', '']
+            new_slot = self._tables['Расписание'].schema.row({
+                'id': new_id, 'Дата': date, 'Время': time, 'id_специалиста': specialist_id,
+                'Статус': 'Свободно', 'id_клиента': '',
+            })
             self.schedule_sheet.append_row(new_slot)
+            self._tables['Расписание'].append(new_slot)
             return new_id
         except Exception as e:
             logger.error(f"Ошибка добавления слота в расписание: {e}")
             return None
 
+    def add_schedule_slots(self, slots, specialist_id):
+        """
+        Добавляет несколько свободных слотов специалиста одним запросом append_rows.
+        
+        Args:
+            slots: список пар (дата, время)
+            specialist_id: ID специалиста
+            
+        Returns:
+            Список ID созданных слотов (пустой список при ошибке)
+        """
+        if not slots:
+            return []
+        try:
+            # Резервируем сразу весь блок id
+            first_id = self._allocate_ids('Расписание', len(slots))
+            
+            schedule_table = self._tables['Расписание']
+            new_rows = [
+                schedule_table.schema.row({
+                    'id': first_id + i, 'Дата': self._normalize_date(slot_date), 'Время': slot_time,
+                    'id_специалиста': specialist_id, 'Статус': 'Свободно', 'id_клиента': '',
+                })
+                for i, (slot_date, slot_time) in enumerate(slots)
+            ]
+            self.schedule_sheet.append_rows(new_rows, value_input_option='RAW')
+            
+            for row in new_rows:
+                schedule_table.append(row)
+            return list(range(first_id, first_id + len(slots)))
+        except Exception as e:
+            logger.error(f"Ошибка пакетного добавления слотов в расписание: {e}", exc_info=True)
+            return []
+
     # Методы для работы с услугами
     def get_specialist_services(self, specialist_id):
         """
         Получает список услуг специалиста из листа "Услуги".
         """
         try:
-            services_sheet = self.spreadsheet.worksheet("Услуги")
-            all_services = services_sheet.get_all_records()
-            specialist_services = [service for service in all_services if str(service.get('id_специалиста', '')) == str(specialist_id)]
+            all_services = self._records('Услуги')
+            specialist_services = [dict(service) for service in all_services if str(service.get('id_специалиста', '')) == str(specialist_id)]
             return specialist_services
         except Exception as e:
             logger.error(f"Ошибка получения услуг для специалиста {specialist_id}: {e}")
             return []
+
+    def add_specialist_service(self, specialist_id, name, duration, price):
+        """
+        Добавляет услугу специалиста в лист "Услуги".
+        Возвращает False, если услуга с таким названием уже есть.
+        """
+        try:
+            for service in self._records('Услуги'):
+                if (str(service.get('id_специалиста', '')) == str(specialist_id) and
+                    service.get('Название', '') == name):
+                    return False
+
+            new_row = self._tables['Услуги'].schema.row({
+                'id_специалиста': specialist_id, 'Название': name,
+                'Продолжительность': duration, 'Стоимость': price,
+            })
+            self.services_sheet.append_row(new_row)
+            self._tables['Услуги'].append(new_row)
+            logger.info(f"Добавлена услуга '{name}' для специалиста {specialist_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка добавления услуги: {e}")
+            return False
+
+    def delete_specialist_service(self, specialist_id, name):
+        """
+        Удаляет услугу специалиста из листа "Услуги".
+        """
+        try:
+            row_idx = None
+            for idx, service in enumerate(self._records('Услуги'), start=2):
+                if (str(service.get('id_специалиста', '')) == str(specialist_id) and
+                    service.get('Название', '') == name):
+                    row_idx = idx
+                    break
+
+            if row_idx:
+                self.services_sheet.delete_row(row_idx)
+                self._tables['Услуги'].delete_rows([row_idx])
+                logger.info(f"Удалена услуга '{name}' специалиста {specialist_id}")
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка удаления услуги: {e}")
+            return False
     
     # Методы для работы с отзывами
     def add_review(self, client_id, specialist_id, rating, comment=""):
@@ -833,7 +1846,12 @@ class GoogleSheetsService:
             date_str = datetime.now().strftime("%Y-%m-%d")
             
             # Добавляем отзыв
-            self.reviews_sheet.append_row([client_id, specialist_id, date_str, rating, comment])
+            new_review = self._tables['Отзывы'].schema.row({
+                'id_клиента': client_id, 'id_специалиста': specialist_id,
+                'Дата': date_str, 'Оценка': rating, 'Комментарий': comment,
+            })
+            self.reviews_sheet.append_row(new_review)
+            self._tables['Отзывы'].append(new_review)
             logger.info(f"Добавлен новый отзыв от клиента {client_id} для специалиста {specialist_id}")
             return True
         except Exception as e:
@@ -845,9 +1863,9 @@ class GoogleSheetsService:
         Получает все отзывы о конкретном специалисте
         """
         try:
-            all_reviews = self.reviews_sheet.get_all_records()
+            all_reviews = self._records('Отзывы')
             specialist_reviews = [
-                review for review in all_reviews 
+                dict(review) for review in all_reviews 
                 if str(review.get('id_специалиста', '')) == str(specialist_id)
             ]
             return specialist_reviews
@@ -868,28 +1886,26 @@ class GoogleSheetsService:
                 logger.error("Лист напоминаний не найден")
                 return None
             
-            # Получаем все напоминания для определения ID
-            all_reminders = reminders_sheet.get_all_records()
-            new_id = 1
-            if all_reminders:
-                try:
-                    new_id = max(int(reminder.get('id', 0)) for reminder in all_reminders) + 1
-                except:
-                    logger.warning("Ошибка определения нового ID напоминания. Используем значение по умолчанию.")
+            # Получаем новый ID напоминания
+            new_id = self._allocate_ids('Напоминания')
             
             # Если specialist_id не указан, получаем его из записи
             if not specialist_id:
-                appointments = self.schedule_sheet.get_all_records()
-                for appt in appointments:
-                    if str(appt.get('id')) == str(appointment_id):
-                        specialist_id = appt.get('id_специалиста')
-                        break
+                _, appt = self._find('Расписание', 'id', appointment_id)
+                if appt:
+                    specialist_id = appt.get('id_специалиста')
             
             # Нормализуем дату
             date_str = self._normalize_date(date_str)
             
             # Добавляем напоминание
-            reminders_sheet.append_row([new_id, appointment_id, client_id, specialist_id, date_str, time_str, status, service_name or ''])
+            new_reminder = self._tables['Напоминания'].schema.row({
+                'id': new_id, 'id_записи': appointment_id, 'id_клиента': client_id,
+                'id_специалиста': specialist_id, 'Дата': date_str, 'Время': time_str,
+                'Статус': status, 'Услуга': service_name or '',
+            })
+            reminders_sheet.append_row(new_reminder)
+            self._tables['Напоминания'].append(new_reminder)
             
             logger.info(f"Добавлено напоминание ID={new_id} для записи ID={appointment_id}")
             return new_id
@@ -908,20 +1924,12 @@ class GoogleSheetsService:
                 logger.error("Лист напоминаний не найден")
                 return False
             
-            all_reminders = reminders_sheet.get_all_records()
-            row_idx = None
-            for idx, reminder in enumerate(all_reminders, start=2):
-                if str(reminder.get('id')) == str(reminder_id):
-                    row_idx = idx
-                    break
+            row_idx, _ = self._find('Напоминания', 'id', reminder_id)
             
             if row_idx:
-                # Получаем индекс колонки статуса
-                headers = reminders_sheet.row_values(1)
-                status_col = headers.index('Статус') + 1
-                
                 # Обновляем статус
-                reminders_sheet.update_cell(row_idx, status_col, new_status)
+                with self.batch_writes() as batch:
+                    batch.update(self._tables['Напоминания'], row_idx, {'Статус': new_status})
                 logger.info(f"Обновлен статус напоминания ID={reminder_id} на {new_status}")
                 return True
             
@@ -945,7 +1953,7 @@ class GoogleSheetsService:
                 logger.error("Лист напоминаний не найден")
                 return []
             
-            all_reminders = reminders_sheet.get_all_records()
+            all_reminders = self._records('Напоминания')
             
             # Преобразуем строку в список если передана одна строка
             if isinstance(status_list, str):
@@ -953,7 +1961,7 @@ class GoogleSheetsService:
             
             # Фильтруем напоминания по статусу
             filtered_reminders = [
-                reminder for reminder in all_reminders 
+                dict(reminder) for reminder in all_reminders 
                 if reminder.get('Статус', '') in status_list
             ]
             
@@ -973,12 +1981,8 @@ class GoogleSheetsService:
                 logger.error("Лист напоминаний не найден")
                 return None
             
-            all_reminders = reminders_sheet.get_all_records()
-            for reminder in all_reminders:
-                if str(reminder.get('id')) == str(reminder_id):
-                    return reminder
-            
-            return None
+            _, reminder = self._find('Напоминания', 'id', reminder_id)
+            return dict(reminder) if reminder else None
         except Exception as e:
             logger.error(f"Ошибка получения напоминания по ID: {e}", exc_info=True)
             return None
@@ -988,27 +1992,16 @@ class GoogleSheetsService:
         Обновляет статус подтверждения записи
         """
         try:
-            # Проверяем, есть ли колонка для подтверждения
-            headers = self.schedule_sheet.row_values(1)
-            if 'Подтверждено' not in headers:
-                # Добавляем колонку если её нет
-                confirm_col = len(headers) + 1
-                self.schedule_sheet.update_cell(1, confirm_col, 'Подтверждено')
-                headers.append('Подтверждено')
-            
-            confirm_col = headers.index('Подтверждено') + 1
+            # Добавляем колонку для подтверждения, если её нет
+            self._tables['Расписание'].ensure_headers(['Подтверждено'])
             
             # Ищем запись
-            all_slots = self.schedule_sheet.get_all_records()
-            row_idx = None
-            for idx, slot in enumerate(all_slots, start=2):
-                if str(slot.get('id')) == str(appointment_id):
-                    row_idx = idx
-                    break
+            row_idx, _ = self._find('Расписание', 'id', appointment_id)
             
             if row_idx:
                 # Обновляем статус подтверждения
-                self.schedule_sheet.update_cell(row_idx, confirm_col, 'Да' if confirmed else 'Нет')
+                with self.batch_writes() as batch:
+                    batch.update(self._tables['Расписание'], row_idx, {'Подтверждено': 'Да' if confirmed else 'Нет'})
                 logger.info(f"Обновлен статус подтверждения записи ID={appointment_id} на {confirmed}")
                 return True
             
@@ -1023,27 +2016,16 @@ class GoogleSheetsService:
         Обновляет статус запроса на оценку визита
         """
         try:
-            # Проверяем, есть ли колонка для запроса оценки
-            headers = self.schedule_sheet.row_values(1)
-            if 'Запрос_оценки' not in headers:
-                # Добавляем колонку если её нет
-                feedback_col = len(headers) + 1
-                self.schedule_sheet.update_cell(1, feedback_col, 'Запрос_оценки')
-                headers.append('Запрос_оценки')
-            
-            feedback_col = headers.index('Запрос_оценки') + 1
+            # Добавляем колонку для запроса оценки, если её нет
+            self._tables['Расписание'].ensure_headers(['Запрос_оценки'])
             
             # Ищем запись
-            all_slots = self.schedule_sheet.get_all_records()
-            row_idx = None
-            for idx, slot in enumerate(all_slots, start=2):
-                if str(slot.get('id')) == str(appointment_id):
-                    row_idx = idx
-                    break
+            row_idx, _ = self._find('Расписание', 'id', appointment_id)
             
             if row_idx:
                 # Обновляем статус запроса на оценку
-                self.schedule_sheet.update_cell(row_idx, feedback_col, 'Да' if requested else 'Нет')
+                with self.batch_writes() as batch:
+                    batch.update(self._tables['Расписание'], row_idx, {'Запрос_оценки': 'Да' if requested else 'Нет'})
                 logger.info(f"Обновлен статус запроса оценки записи ID={appointment_id} на {requested}")
                 return True
             
@@ -1058,21 +2040,12 @@ class GoogleSheetsService:
         Получает список завершенных записей, для которых не был отправлен запрос на оценку
         """
         try:
-            all_slots = self.schedule_sheet.get_all_records()
-            
-            # Проверяем, есть ли колонка для запроса оценки
-            if all_slots and 'Запрос_оценки' not in all_slots[0]:
-                # Добавляем колонку если её нет
-                headers = self.schedule_sheet.row_values(1)
-                feedback_col = len(headers) + 1
-                self.schedule_sheet.update_cell(1, feedback_col, 'Запрос_оценки')
-                
-                # Обновляем записи, добавляя пустое значение для новой колонки
-                for i in range(2, len(all_slots) + 2):
-                    self.schedule_sheet.update_cell(i, feedback_col, '')
-                
-                # Обновляем данные
-                all_slots = self.schedule_sheet.get_all_records()
+            # Добавляем колонку для запроса оценки, если её нет
+            # (ячейки новой колонки и так пустые, в кэше они появляются сразу)
+            schedule_table = self._tables['Расписание']
+            schedule_table.records()
+            schedule_table.ensure_headers(['Запрос_оценки'])
+            all_slots = schedule_table.records()
             
             # Фильтруем записи
             now = datetime.now()
@@ -1086,8 +2059,7 @@ class GoogleSheetsService:
                     
                     # Проверяем, прошла ли запись (время приема + его длительность)
                     try:
-                        slot_date = self._normalize_date(slot.get('Дата', ''))
-                        appt_date = datetime.strptime(slot_date, '%Y-%m-%d').date()
+                        appt_date = date.fromordinal(_date_ordinal(slot.get('Дата', '')))
                         appt_time = datetime.strptime(slot.get('Время', ''), '%H:%M').time()
                         appt_dt = datetime.combine(appt_date, appt_time)
                         
@@ -1097,7 +2069,7 @@ class GoogleSheetsService:
                         
                         # Если запись завершилась + прошел 1 час, добавляем в список
                         if (now - end_dt).total_seconds() >= 3600:  # 3600 секунд = 1 час
-                            completed_appointments.append(slot)
+                            completed_appointments.append(dict(slot))
                     except Exception as e_date:
                         logger.warning(f"Ошибка при проверке даты записи: {e_date}")
             
@@ -1111,11 +2083,8 @@ class GoogleSheetsService:
         Получает запись по ID
         """
         try:
-            all_slots = self.schedule_sheet.get_all_records()
-            for slot in all_slots:
-                if str(slot.get('id')) == str(appointment_id):
-                    return slot
-            return None
+            _, slot = self._find('Расписание', 'id', appointment_id)
+            return dict(slot) if slot else None
         except Exception as e:
             logger.error(f"Ошибка получения записи по ID: {e}", exc_info=True)
             return None
@@ -1125,28 +2094,12 @@ class GoogleSheetsService:
         Получает все записи специалиста на указанную дату
         """
         try:
-            all_slots = self.schedule_sheet.get_all_records()
-            appointments = []
-            
             # Нормализуем дату для сравнения
             normalized_date = self._normalize_date(date_str)
             
-            # Проверяем и логируем первые несколько слотов для отладки
-            debug_count = 0
-            for slot in all_slots:
-                if debug_count < 5 and str(slot.get('id_специалиста')) == str(specialist_id):
-                    slot_date = slot.get('Дата', '')
-                    normalized_slot_date = self._normalize_date(slot_date)
-                    logger.debug(f"Слот специалиста {specialist_id}: дата в слоте='{slot_date}', нормализованная='{normalized_slot_date}', искомая='{normalized_date}'")
-                    debug_count += 1
-                
-                slot_date = self._normalize_date(slot.get('Дата', ''))
-                
-                if (str(slot.get('id_специалиста')) == str(specialist_id) and 
-                    slot_date == normalized_date and 
-                    slot.get('Статус') == 'Занято' and 
-                    slot.get('id_клиента')):
-                    appointments.append(slot)
+            # Берем только занятые слоты этого дня из индекса
+            day_slots = self._tables['Расписание'].day_rows(specialist_id, normalized_date, 'Занято')
+            appointments = [dict(slot) for _, slot in day_slots if slot.get('id_клиента')]
             
             logger.info(f"Найдено {len(appointments)} записей для специалиста {specialist_id} на дату {date_str}")
             return appointments
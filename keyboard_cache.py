@@ -0,0 +1,96 @@
+# services/keyboard_cache.py
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import KEYBOARD_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def shift_month(year, month, delta):
+    """(год, месяц), отстоящие от заданного на delta месяцев."""
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+class KeyboardCache:
+    """
+    Кэш готовых инлайн-клавиатур в сериализованном виде.
+
+    Хранится JSON разметки (markup.to_json()), который передается в
+    reply_markup как есть – объекты кнопок при повторном показе не создаются.
+    Вместе с записью хранится версия данных, из которых клавиатура построена
+    (например, версия расписания специалиста): если при чтении версия
+    другая, запись выбрасывается. Размер кэша ограничен max_size записями,
+    при переполнении вытесняются давно не использованные.
+
+    prefetch() заранее строит клавиатуры в фоновых потоках – например,
+    соседние месяцы календаря, чтобы листание сразу находило их в кэше.
+    """
+
+    def __init__(self, max_size=500, prefetch_workers=2):
+        self.max_size = max_size
+        self._entries = OrderedDict()   # ключ -> (версия, JSON разметки)
+        self._pending = set()           # ключи, которые сейчас строятся в фоне
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(prefetch_workers, thread_name_prefix="keyboard-prefetch")
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, version):
+        """JSON клавиатуры для ключа, если она построена по той же версии данных, иначе None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, key, version, markup):
+        """Запоминает клавиатуру и возвращает ее JSON."""
+        markup_json = markup.to_json()
+        with self._lock:
+            self._entries[key] = (version, markup_json)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return markup_json
+
+    def get_or_build(self, key, version, build):
+        """JSON клавиатуры из кэша или построенной заново через build()."""
+        markup_json = self.get(key, version)
+        if markup_json is None:
+            markup_json = self.put(key, version, build())
+        return markup_json
+
+    def prefetch(self, key, version, build):
+        """Строит клавиатуру в фоне, если для этой версии ее еще нет в кэше."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None and entry[0] == version) or key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._prefetch, key, version, build)
+
+    def _prefetch(self, key, version, build):
+        try:
+            self.put(key, version, build())
+        except Exception as e:
+            logger.warning(f"Не удалось заранее построить клавиатуру {key}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self._hits, 'misses': self._misses}
+
+
+# Общий кэш календарей клиента и специалиста
+calendar_keyboards = KeyboardCache(KEYBOARD_CACHE_SIZE)
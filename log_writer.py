@@ -0,0 +1,142 @@
+# services/log_writer.py
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Что делать с новой записью, когда буфер заполнен
+DROP_OLDEST = 'drop_oldest'   # вытеснить самую старую запись (кольцевой буфер)
+DROP_NEWEST = 'drop_newest'   # отбросить новую запись
+
+
+class BufferedLogWriter:
+    """
+    Фоновая запись логов пачками.
+
+    submit() только кладет запись в буфер в памяти и никогда не ждет API,
+    поэтому логирование не задерживает ответ пользователю. Фоновый поток
+    отправляет накопленное через write_batch(rows) -> bool, когда набралось
+    flush_size записей или прошло flush_interval секунд с последней отправки.
+
+    Если запись не удалась (API недоступен или тормозит), пачка возвращается
+    в начало буфера, а следующая попытка откладывается с экспоненциальной
+    паузой до max_backoff секунд. Пока API не отвечает, буфер ограничен
+    capacity записями, лишние отбрасываются согласно drop_policy.
+    """
+
+    def __init__(self, write_batch, capacity=1000, flush_size=50, flush_interval=5.0,
+                 drop_policy=DROP_OLDEST, max_batch=500, max_backoff=60.0):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Неизвестная политика переполнения: {drop_policy}")
+        self.write_batch = write_batch
+        self.capacity = capacity
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.max_batch = max_batch
+        self.max_backoff = max_backoff
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._backoff = 0.0
+        self._dropped = 0
+        self._written = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        """Добавляет запись в буфер. Возвращает False, если запись отброшена."""
+        with self._cond:
+            if self._stopping:
+                self._dropped += 1
+                return False
+            if len(self._buffer) >= self.capacity:
+                self._dropped += 1
+                if self.drop_policy == DROP_NEWEST:
+                    return False
+                self._buffer.popleft()
+            self._buffer.append(row)
+            if len(self._buffer) >= self.flush_size and not self._backoff:
+                self._cond.notify()
+        return True
+
+    def _take_batch(self):
+        return [self._buffer.popleft() for _ in range(min(self.max_batch, len(self._buffer)))]
+
+    def _requeue(self, batch):
+        """Возвращает неотправленную пачку в начало буфера с учетом capacity."""
+        free = self.capacity - len(self._buffer)
+        if free < len(batch):
+            if self.drop_policy == DROP_OLDEST:
+                self._dropped += len(batch) - max(free, 0)
+                batch = batch[len(batch) - max(free, 0):]
+            else:
+                # Новые записи уже в буфере, старые пришлось бы вытеснить ими
+                overflow = len(batch) - max(free, 0)
+                for _ in range(overflow):
+                    self._buffer.pop()
+                self._dropped += overflow
+        self._buffer.extendleft(reversed(batch))
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    wait = self._backoff or self.flush_interval
+                    remaining = last_flush + wait - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    if len(self._buffer) >= self.flush_size and not self._backoff:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+                batch = self._take_batch()
+
+            if batch:
+                ok = False
+                try:
+                    ok = self.write_batch(batch)
+                except Exception as e:
+                    logger.error(f"Ошибка записи пачки логов: {e}")
+                with self._cond:
+                    if ok:
+                        self._written += len(batch)
+                        self._backoff = 0.0
+                    else:
+                        self._requeue(batch)
+                        self._backoff = min(max(self._backoff * 2, 1.0), self.max_backoff)
+                        logger.warning(f"Запись логов не удалась, повтор через {self._backoff:g} с, "
+                                       f"в буфере {len(self._buffer)} записей")
+                        if stopping:
+                            # При остановке повторять некогда
+                            self._dropped += len(self._buffer)
+                            self._buffer.clear()
+            last_flush = time.monotonic()
+
+            with self._cond:
+                if stopping and not self._buffer:
+                    return
+
+    def stop(self, timeout=10):
+        """Останавливает поток, предварительно отправив все накопленные записи."""
+        with self._cond:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._dropped:
+            logger.warning(f"Отброшено записей логов: {self._dropped}")
+
+    def stats(self):
+        with self._cond:
+            return {
+                'buffered': len(self._buffer),
+                'written': self._written,
+                'dropped': self._dropped,
+                'backoff': self._backoff,
+            }
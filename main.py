@@ -10,11 +10,15 @@ from fastapi.responses import JSONResponse
 import signal
 import sys
 
-from settings import TOKEN, WEBHOOK_URL
+from settings import (TOKEN, WEBHOOK_URL, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, DEBUG_DIAGNOSTICS,
+                      STORAGE_BACKEND, SQLITE_DB_PATH, SYNC_INTERVAL, SYNC_MAX_REQUESTS_PER_MINUTE)
 from handlers import client, specialist, common
 from services.google_sheets import GoogleSheetsService
 from services.logger import LoggingService
 from services.scheduler import SchedulerService
+from services.update_dispatcher import UpdateDispatcher
+from services.keyboard_cache import calendar_keyboards
+from services.sheets_client import get_connection
 
 # Создаём папку logs если нужно
 log_dir = os.path.join(os.getcwd(), 'logs')
@@ -45,13 +49,29 @@ logger = logging.getLogger(__name__)
 
 # FSM-хранилище
 state_storage = StateMemoryStorage()
-bot = telebot.TeleBot(TOKEN, state_storage=state_storage)
+# Апдейты обрабатываются пулом UpdateDispatcher, поэтому TeleBot запускает
+# хендлеры синхронно – иначе порядок сообщений одного чата не гарантирован
+bot = telebot.TeleBot(TOKEN, state_storage=state_storage, threaded=False)
 
 # Добавляем StateFilter
 bot.add_custom_filter(custom_filters.StateFilter(bot))
 
 # Сервисы
-sheets_service = GoogleSheetsService()
+sheets_sync = None
+if STORAGE_BACKEND == 'sqlite':
+    from services.sqlite_storage import SQLiteStorageService
+    sheets_service = SQLiteStorageService(SQLITE_DB_PATH)
+elif STORAGE_BACKEND == 'synced':
+    # Бот работает с локальной базой, таблица обновляется в фоне
+    from services.sqlite_storage import SQLiteStorageService
+    from services.sheets_sync import SheetsSyncEngine
+    sheets_service = SQLiteStorageService(SQLITE_DB_PATH, track_changes=True)
+    sheets_sync = SheetsSyncEngine(sheets_service, GoogleSheetsService(),
+                                   interval=SYNC_INTERVAL,
+                                   max_requests_per_minute=SYNC_MAX_REQUESTS_PER_MINUTE)
+    sheets_sync.start()
+else:
+    sheets_service = GoogleSheetsService()
 logging_service = LoggingService(sheets_service)
 scheduler_service = SchedulerService(sheets_service, bot)
 
@@ -307,15 +327,24 @@ common.register_handlers(bot, sheets_service, logging_service, scheduler_service
 logger.info(
     f"После регистрации common: {len(bot.message_handlers)} обработчиков")
 
-# Проверка на конфликты состояний
+# Таблица обработчиков строится один раз при запуске.
+# В PyTelegramBotAPI 4.10+ каждый хендлер – это dict с ключами 'function' и 'filters'.
+handlers_table = []
 state_handlers = {}
 for h in bot.message_handlers:
-    if hasattr(h, 'filters') and hasattr(h.filters, 'state'):
-        st = str(h.filters.state)
+    filters_info = h.get('filters', {})
+    st = filters_info.get('state')
+    handlers_table.append({
+        'function': getattr(h.get('function'), '__name__', str(h.get('function'))),
+        'filters': {name: str(value) for name, value in filters_info.items()},
+    })
+    # Проверка на конфликты состояний
+    if st is not None:
+        st = str(st)
         if st in state_handlers:
             logger.warning(f"КОНФЛИКТ: Несколько хендлеров для состояния {st}")
         else:
-            state_handlers[st] = h
+            state_handlers[st] = handlers_table[-1]['function']
 
 logger.info(f"Обработчики по состояниям: {list(state_handlers.keys())}")
 
@@ -324,9 +353,16 @@ app = FastAPI()
 # Обработчик остановки приложения
 def shutdown_handler():
     """Обработчик завершения работы приложения"""
+    logger.info("Останавливаем обработку апдейтов...")
+    update_dispatcher.stop()
     logger.info("Останавливаем планировщик уведомлений...")
     scheduler_service.stop_scheduler()
     logger.info("Планировщик остановлен")
+    if sheets_sync is not None:
+        logger.info("Отправляем последние изменения в Google Sheets...")
+        sheets_sync.stop()
+    logger.info("Записываем накопленные логи...")
+    sheets_service.close()
 
 # Обработчики сигналов
 def signal_handler(sig, frame):
@@ -360,6 +396,64 @@ async def webhook_get():
     })
 
 
+# Перехват отправки send_message для логирования исходящих сообщений
+bot.original_send_message = bot.send_message
+
+
+def logged_send_message(chat_id, text, *args, **kwargs):
+    try:
+        logger.debug(
+            f"WEBHOOK: Отправка сообщения {chat_id}: {text[:50]}..."
+        )
+        logging_service.log_message(chat_id, 'bot', text, 'bot')
+    except Exception as e:
+        logger.error(
+            f"Ошибка логирования исходящего сообщения: {e}")
+    return bot.original_send_message(chat_id, text, *args,
+                                     **kwargs)
+
+
+bot.send_message = logged_send_message
+
+
+def process_update(update):
+    """Обработка одного апдейта в потоке пула UpdateDispatcher"""
+    # Лог входящего
+    if update.message and update.message.text:
+        user_id = update.message.from_user.id
+        chat_id = update.message.chat.id
+        username = update.message.from_user.username or f"{update.message.from_user.first_name} {update.message.from_user.last_name or ''}"
+        logger.debug(
+            f"WEBHOOK: Сообщение от {user_id} ({username}): {update.message.text}"
+        )
+        logging_service.log_message(user_id, username, update.message.text,
+                                    'user')
+
+    # Состояние пользователя смотрим только в режиме диагностики
+    if DEBUG_DIAGNOSTICS and update.message and update.message.from_user:
+        try:
+            uid = update.message.from_user.id
+            ch = update.message.chat.id
+            cur_state = bot.get_state(uid, ch)
+            logger.info(
+                f"WEBHOOK: Текущее состояние пользователя {uid}: {cur_state}"
+            )
+        except Exception as st_err:
+            logger.error(f"WEBHOOK: Ошибка получения состояния: {st_err}")
+
+    # Передаём в TeleBot
+    logger.debug(f"WEBHOOK: process_new_updates({update.update_id})")
+    bot.process_new_updates([update])
+    logger.debug("WEBHOOK: Обновление обработано успешно")
+
+
+# Пул обработки апдейтов: по очереди на чат, чаты параллельно
+update_dispatcher = UpdateDispatcher(process_update,
+                                     workers=WEBHOOK_WORKERS,
+                                     max_queue=WEBHOOK_QUEUE_SIZE)
+update_dispatcher.start()
+
+
 @app.post("/webhook")
 async def webhook(request: Request):
     if request.headers.get("content-type") != "application/json":
@@ -369,70 +463,40 @@ async def webhook(request: Request):
     json_string = json_bytes.decode("utf-8")
 
     try:
-        logger.info(f"WEBHOOK: Получено обновление: {json_string[:100]}...")
+        logger.debug(f"WEBHOOK: Получено обновление: {json_string[:100]}...")
         update = types.Update.de_json(json_string)
+    except Exception as e:
+        logger.error(f"Ошибка разбора обновления: {e}", exc_info=True)
+        raise HTTPException(status_code=400,
+                            detail="Ошибка разбора обновления")
 
-        # Лог входящего
-        if update.message and update.message.text:
-            user_id = update.message.from_user.id
-            chat_id = update.message.chat.id
-            username = update.message.from_user.username or f"{update.message.from_user.first_name} {update.message.from_user.last_name or ''}"
-            logger.info(
-                f"WEBHOOK: Сообщение от {user_id} ({username}): {update.message.text}"
-            )
-            logging_service.log_message(user_id, username, update.message.text,
-                                        'user')
-
-        # Перехват отправки send_message
-        if not hasattr(bot, 'original_send_message'):
-            bot.original_send_message = bot.send_message
-            logger.info("WEBHOOK: Перехватываем send_message для логирования")
+    # Отвечаем сразу, обработка идет в пуле
+    if not update_dispatcher.submit(update):
+        logger.warning(f"WEBHOOK: Очередь обработки переполнена, апдейт {update.update_id} отклонен")
+        raise HTTPException(status_code=503,
+                            detail="Очередь обработки переполнена")
 
-            def logged_send_message(chat_id, text, *args, **kwargs):
-                try:
-                    logger.info(
-                        f"WEBHOOK: Отправка сообщения {chat_id}: {text[:50]}..."
-                    )
-                    logging_service.log_message(chat_id, 'bot', text, 'bot')
-                except Exception as e:
-                    logger.error(
-                        f"Ошибка логирования исходящего сообщения: {e}")
-                return bot.original_send_message(chat_id, text, *args,
-                                                 **kwargs)
-
-            bot.send_message = logged_send_message
-
-        logger.info("WEBHOOK: Начинаем обработку")
-        if update.message and update.message.from_user:
-            try:
-                uid = update.message.from_user.id
-                ch = update.message.chat.id
-                cur_state = bot.get_state(uid, ch)
-                logger.info(
-                    f"WEBHOOK: Текущее состояние пользователя {uid}: {cur_state}"
-                )
-
-                # Выведем все зарегистрированные message_handlers
-                hlist = bot.message_handlers.copy()
-                logger.info(f"WEBHOOK: Всего {len(hlist)} обработчиков")
-                for hh in hlist:
-                    if hasattr(hh, 'filters') and hasattr(hh.filters, 'state'):
-                        logger.info(f" - хендлер со state={hh.filters.state}")
-
-            except Exception as st_err:
-                logger.error(f"WEBHOOK: Ошибка получения состояния: {st_err}")
-
-        # Передаём в TeleBot
-        logger.info(f"WEBHOOK: process_new_updates({update.update_id})")
-        bot.process_new_updates([update])
-        logger.info("WEBHOOK: Обновление обработано успешно")
+    return JSONResponse({"status": "ok"})
 
-    except Exception as e:
-        logger.error(f"Ошибка обработки: {e}", exc_info=True)
-        raise HTTPException(status_code=500,
-                            detail="Ошибка обработки обновления")
 
-    return JSONResponse({"status": "ok"})
+@app.get("/metrics")
+async def metrics():
+    result = {**update_dispatcher.metrics(), 'keyboard_cache': calendar_keyboards.stats()}
+    if STORAGE_BACKEND != 'sqlite':
+        connection = get_connection()
+        result['sheets_connection'] = connection.stats()
+        result['sheets_requests'] = connection.scheduler.stats()
+    return JSONResponse(result)
+
+
+if DEBUG_DIAGNOSTICS:
+    @app.get("/debug/handlers")
+    async def debug_handlers():
+        """Список обработчиков и состояний, собранный при запуске (аналог debug_states.py)"""
+        return JSONResponse({
+            "handlers": handlers_table,
+            "states": state_handlers,
+        })
 
 
 def setup_webhook():
@@ -0,0 +1,238 @@
+# services/request_scheduler.py
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты запросов: меньше – раньше
+READ = 0          # чтение для ответа пользователю
+WRITE = 1         # запись по действию пользователя
+BACKGROUND = 2    # фоновая запись (логи, синхронизация)
+
+
+class _TokenBucket:
+    """Бюджет запросов: per_minute запросов в минуту, не больше burst подряд."""
+
+    def __init__(self, per_minute, burst=None):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, per_minute // 6)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.waiters = []      # куча (приоритет, порядковый номер)
+        self.used = deque()    # моменты выдачи токенов за последнюю минуту
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        """Берет токен. Возвращает 0 или сколько секунд ждать следующего токена."""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.used.append(now)
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def drain(self, now):
+        """Обнуляет бюджет: API сообщил о превышении квоты."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+    def used_last_minute(self, now):
+        while self.used and now - self.used[0] >= 60:
+            self.used.popleft()
+        return len(self.used)
+
+
+class RequestScheduler:
+    """
+    Центральный планировщик запросов к API с квотой на минуту.
+
+    Каждый запрос перед отправкой получает токен из бюджета своего вида
+    (чтение или запись), настроенного под квоту API. Пока токенов нет,
+    запросы ждут в очереди по приоритету: чтения для пользователей
+    проходят раньше записей, фоновые записи (логи, синхронизация) – последними.
+
+    Ответ 429 повторяется с экспоненциальной паузой и случайным разбросом
+    (full jitter), а бюджет обнуляется, чтобы остальные запросы тоже
+    притормозили. Одинаковые одновременные чтения объединяются: запрос
+    уходит один раз, ответ получают все ожидающие.
+    """
+
+    def __init__(self, reads_per_minute=60, writes_per_minute=60, max_retries=5,
+                 backoff_base=1.0, backoff_max=32.0):
+        self._buckets = {'read': _TokenBucket(reads_per_minute), 'write': _TokenBucket(writes_per_minute)}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._local = threading.local()
+        self._reads = SingleFlight()
+
+        self._requests = 0
+        self._retries = 0
+        self._throttled = 0
+        self._wait_total = {READ: 0.0, WRITE: 0.0, BACKGROUND: 0.0}
+        self._wait_max = {READ: 0.0, WRITE: 0.0, BACKGROUND: 0.0}
+        self._wait_count = {READ: 0, WRITE: 0, BACKGROUND: 0}
+
+    @contextmanager
+    def background(self):
+        """Запросы текущего потока внутри блока идут с приоритетом BACKGROUND."""
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = BACKGROUND
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def _priority(self, kind):
+        forced = getattr(self._local, 'priority', None)
+        if forced is not None:
+            return forced
+        return READ if kind == 'read' else WRITE
+
+    def _acquire(self, kind, priority):
+        bucket = self._buckets[kind]
+        entry = (priority, next(self._seq))
+        enqueued = time.monotonic()
+        with self._cond:
+            heapq.heappush(bucket.waiters, entry)
+            try:
+                while True:
+                    if bucket.waiters[0] == entry:
+                        wait = bucket.take(time.monotonic())
+                        if not wait:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            finally:
+                bucket.waiters.remove(entry)
+                heapq.heapify(bucket.waiters)
+                self._cond.notify_all()
+            waited = time.monotonic() - enqueued
+            self._requests += 1
+            self._wait_total[priority] += waited
+            self._wait_count[priority] += 1
+            self._wait_max[priority] = max(self._wait_max[priority], waited)
+
+    def _throttle(self, kind, attempt, retry_after=None):
+        """Пауза после ответа 429: Retry-After или экспоненциальная с разбросом."""
+        with self._cond:
+            self._buckets[kind].drain(time.monotonic())
+            self._throttled += 1
+            self._retries += 1
+        if retry_after is not None:
+            delay = min(retry_after, self.backoff_max)
+        else:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        logger.warning(f"Превышена квота API ({kind}), повтор через {delay:.1f} с")
+        time.sleep(delay)
+
+    def execute(self, kind, send, key=None):
+        """
+        Выполняет запрос send() -> ответ с учетом бюджета и повторов при 429.
+
+        kind – 'read' или 'write'. Для чтений можно передать key: одновременные
+        запросы с одинаковым ключом выполняются один раз.
+        """
+        if key is None:
+            return self._execute(kind, send)
+        return self._reads.do(key, lambda: self._execute(kind, send))
+
+    def _execute(self, kind, send):
+        priority = self._priority(kind)
+        attempt = 0
+        while True:
+            self._acquire(kind, priority)
+            response = send()
+            if getattr(response, 'status_code', None) != 429 or attempt >= self.max_retries:
+                return response
+            self._throttle(kind, attempt, _retry_after(response))
+            attempt += 1
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            return {
+                'requests': self._requests,
+                'retries': self._retries,
+                'throttled': self._throttled,
+                'merged_reads': self._reads.shared,
+                'quota': {
+                    kind: {'per_minute': bucket.per_minute, 'used_last_minute': bucket.used_last_minute(now),
+                           'queued': len(bucket.waiters)}
+                    for kind, bucket in self._buckets.items()
+                },
+                'wait_seconds': {
+                    name: {'avg': round(self._wait_total[p] / self._wait_count[p], 3) if self._wait_count[p] else 0.0,
+                           'max': round(self._wait_max[p], 3)}
+                    for name, p in (('read', READ), ('write', WRITE), ('background', BACKGROUND))
+                },
+            }
+
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых вызовов.
+
+    Пока выполняется вызов do(key, fn), другие потоки, вызвавшие do с тем
+    же ключом, не запускают fn повторно, а ждут его и получают тот же
+    результат (или то же исключение). Результаты не кэшируются: после
+    завершения вызова следующий do(key, ...) снова выполнит fn.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0     # сколько вызовов получили чужой результат
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Call:
+    """Выполняющийся вызов SingleFlight."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError, AttributeError):
+        return None
@@ -40,3 +40,51 @@ QVN1XNOkfsv+GvuznhPm/YMm
     "client_x509_cert_url": "https://www.googleapis.com/robot/v1/metadata/x509/autoadminbot%40autogid-451111.iam.gserviceaccount.com",
     "universe_domain": "googleapis.com"
 }
+
+# Время жизни кэша листов Google Sheets в памяти (секунды).
+# Правки, сделанные вручную в таблице, подхватываются не позже чем через это время.
+SHEETS_CACHE_TTL = 60
+
+# Обработка апдейтов вебхука: число потоков и максимум ожидающих апдейтов.
+# При переполнении очереди вебхук отвечает 503, и Telegram повторяет доставку.
+WEBHOOK_WORKERS = 8
+WEBHOOK_QUEUE_SIZE = 1000
+
+# Режим диагностики: логирование состояния пользователя на каждый апдейт
+# и эндпоинт /debug/handlers со списком обработчиков. В работе выключен.
+DEBUG_DIAGNOSTICS = False
+
+# Запись логов в лист "Логи": размер буфера в памяти, число записей и интервал
+# (секунды), по достижении которых буфер отправляется одним запросом,
+# и политика при переполнении буфера: 'drop_oldest' или 'drop_newest'.
+LOG_BUFFER_SIZE = 5000
+LOG_FLUSH_SIZE = 50
+LOG_FLUSH_INTERVAL = 5
+LOG_DROP_POLICY = 'drop_oldest'
+
+# Хранилище данных бота: 'sheets' – Google Sheets, 'sqlite' – локальная база
+# SQLite по пути SQLITE_DB_PATH (для разработки и нагрузочных тестов),
+# 'synced' – локальная база, которая в фоне синхронизируется с Google Sheets.
+STORAGE_BACKEND = 'sheets'
+SQLITE_DB_PATH = 'data/bot.db'
+
+# Режим 'synced': период синхронизации (секунды) и ограничение запросов к API.
+SYNC_INTERVAL = 15
+SYNC_MAX_REQUESTS_PER_MINUTE = 50
+
+# Кэш готовых клавиатур календаря: максимальное число хранимых клавиатур.
+KEYBOARD_CACHE_SIZE = 500
+
+# Подключение к Google Sheets: размер пула HTTP-соединений (одна сессия на процесс)
+# и за сколько секунд до истечения OAuth-токен обновляется в фоновом потоке.
+SHEETS_POOL_SIZE = 16
+SHEETS_TOKEN_REFRESH_MARGIN = 300
+
+# Планировщик запросов к Sheets API: квоты чтений и записей в минуту (по умолчанию –
+# квота Google на одного пользователя), число повторов при ответе 429 и пределы
+# экспоненциальной паузы между повторами (секунды).
+SHEETS_READS_PER_MINUTE = 60
+SHEETS_WRITES_PER_MINUTE = 60
+SHEETS_MAX_RETRIES = 5
+SHEETS_BACKOFF_BASE = 1
+SHEETS_BACKOFF_MAX = 32
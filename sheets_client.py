@@ -0,0 +1,168 @@
+# services/sheets_client.py
+import logging
+import threading
+from datetime import datetime, timezone
+
+import gspread
+import requests
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+
+from settings import (GOOGLE_CREDENTIALS_JSON, SHEETS_POOL_SIZE, SHEETS_TOKEN_REFRESH_MARGIN,
+                      SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE, SHEETS_MAX_RETRIES,
+                      SHEETS_BACKOFF_BASE, SHEETS_BACKOFF_MAX)
+from services.request_scheduler import RequestScheduler
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+SHEETS_API = 'https://sheets.googleapis.com/'
+
+
+class _ScheduledSession(AuthorizedSession):
+    """
+    Сессия, которая отправляет запросы к Sheets API через планировщик:
+    GET считаются чтениями (одинаковые одновременные объединяются),
+    остальные методы – записями. Прочие адреса идут напрямую.
+    """
+
+    def __init__(self, credentials, scheduler):
+        super().__init__(credentials)
+        self.scheduler = scheduler
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        parent = super(_ScheduledSession, self)
+        if not url.startswith(SHEETS_API):
+            return parent.request(method, url, data=data, headers=headers, **kwargs)
+
+        def send():
+            return parent.request(method, url, data=data, headers=headers, **kwargs)
+
+        if method.upper() == 'GET':
+            return self.scheduler.execute('read', send, key=(url, repr(kwargs.get('params'))))
+        return self.scheduler.execute('write', send)
+
+
+class SheetsConnection:
+    """
+    Одно подключение к Google Sheets на весь процесс.
+
+    Все запросы идут через одну HTTP-сессию с keep-alive и пулом из
+    pool_size соединений, общим для всех потоков, – TLS-рукопожатие
+    не повторяется на каждый запрос. Таблицы открываются один раз, листы
+    читаются одним запросом метаданных при старте сервиса, который дальше
+    держит их объекты у себя.
+
+    OAuth-токен обновляется фоновым потоком за refresh_margin секунд до
+    истечения, поэтому запросы пользователей не ждут обновления токена.
+    Запросы к Sheets API проходят через scheduler (RequestScheduler).
+    """
+
+    def __init__(self, credentials_info, pool_size=16, refresh_margin=300, scheduler=None):
+        self.credentials = Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
+        self.refresh_margin = refresh_margin
+        self.scheduler = scheduler or RequestScheduler()
+        self.session = _ScheduledSession(self.credentials, self.scheduler)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.client = gspread.Client(self.credentials, session=self.session)
+        # Токен запрашивается отдельной сессией без заголовка авторизации
+        self._token_request = Request(requests.Session())
+
+        self._spreadsheets = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshes = 0
+        self._stop_event = threading.Event()
+
+        self.refresh_token()
+        self._thread = threading.Thread(target=self._refresh_loop, name="sheets-token", daemon=True)
+        self._thread.start()
+
+    def refresh_token(self):
+        """Получает новый OAuth-токен."""
+        with self._refresh_lock:
+            self.credentials.refresh(self._token_request)
+            self._refreshes += 1
+        logger.debug(f"OAuth-токен Google Sheets обновлен, действует до {self.credentials.expiry}")
+
+    def _seconds_left(self):
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return 0
+        return (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+
+    def _refresh_loop(self):
+        while True:
+            wait = max(self._seconds_left() - self.refresh_margin, 1)
+            if self._stop_event.wait(wait):
+                return
+            try:
+                self.refresh_token()
+            except Exception as e:
+                # Повторим через минуту; при неудаче токен обновит сама сессия
+                logger.error(f"Ошибка обновления OAuth-токена Google Sheets: {e}")
+                if self._stop_event.wait(60):
+                    return
+
+    def open(self, spreadsheet_id):
+        """Таблица по id (открывается один раз)."""
+        with self._lock:
+            spreadsheet = self._spreadsheets.get(spreadsheet_id)
+            if spreadsheet is None:
+                spreadsheet = self._spreadsheets[spreadsheet_id] = self.client.open_by_key(spreadsheet_id)
+            return spreadsheet
+
+    def worksheets(self, spreadsheet_id):
+        """Все листы таблицы одним запросом метаданных: {название: лист}."""
+        return {ws.title: ws for ws in self.open(spreadsheet_id).worksheets()}
+
+    def worksheets_with_headers(self, spreadsheet_id, titles):
+        """
+        Листы titles и их первые строки одним запросом spreadsheets.get.
+
+        Сетка ограничена первой строкой каждого листа, из ячеек берутся только
+        отображаемые значения. Возвращает ({название: лист}, {название: заголовки}).
+        Если какого-то листа нет, API отвечает ошибкой (gspread.exceptions.APIError).
+        """
+        spreadsheet = self.open(spreadsheet_id)
+        metadata = spreadsheet.fetch_sheet_metadata(params={
+            'includeGridData': 'true',
+            'ranges': [f"'{title}'!1:1" for title in titles],
+            'fields': 'sheets(properties,data.rowData.values.formattedValue)',
+        })
+        worksheets, header_rows = {}, {}
+        for sheet in metadata.get('sheets', []):
+            worksheet = gspread.Worksheet(spreadsheet, sheet['properties'], spreadsheet.id, spreadsheet.client)
+            rows = (sheet.get('data') or [{}])[0].get('rowData') or [{}]
+            worksheets[worksheet.title] = worksheet
+            header_rows[worksheet.title] = [cell.get('formattedValue', '') for cell in rows[0].get('values', [])]
+        return worksheets, header_rows
+
+    def stats(self):
+        return {'token_seconds_left': round(self._seconds_left()), 'token_refreshes': self._refreshes}
+
+    def close(self):
+        self._stop_event.set()
+        self.session.close()
+
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def get_connection():
+    """Общее для процесса подключение к Google Sheets (создается при первом вызове)."""
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            scheduler = RequestScheduler(SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE, SHEETS_MAX_RETRIES,
+                                         SHEETS_BACKOFF_BASE, SHEETS_BACKOFF_MAX)
+            _connection = SheetsConnection(GOOGLE_CREDENTIALS_JSON, SHEETS_POOL_SIZE, SHEETS_TOKEN_REFRESH_MARGIN,
+                                           scheduler)
+        return _connection
@@ -0,0 +1,312 @@
+# services/sheets_sync.py
+import logging
+import threading
+import time
+
+from gspread.utils import rowcol_to_a1
+
+from services.google_sheets import _row_ranges
+from services.sqlite_storage import KEY_COLUMNS, SCHEMA, row_key
+
+logger = logging.getLogger(__name__)
+
+# Листы, в которые бот только дописывает строки: их изменения не читаются из таблицы
+APPEND_ONLY = ('Отзывы', 'Логи')
+
+# Колонки брони в расписании согласуются вместе
+BOOKING_COLUMNS = ('Статус', 'id_клиента')
+
+# Максимум строк, дописываемых в лист за один запрос
+APPEND_BATCH = 500
+
+
+def _sheet_value(value):
+    """
+    Значение для записи в лист с RAW: целые числа отправляются числами,
+    чтобы в таблице они не превращались в текст. Строки с ведущим нулем
+    (например, телефоны) остаются строками.
+    """
+    if isinstance(value, str) and value.isdigit() and (value == '0' or not value.startswith('0')):
+        return int(value)
+    return value
+
+
+class _RateLimiter:
+    """Равномерно распределяет запросы к API: не больше per_minute в минуту."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class SheetsSyncEngine:
+    """
+    Двусторонняя синхронизация локального хранилища SQLite с Google Sheets.
+
+    Бот читает и пишет только локальную базу (SQLiteStorageService с
+    track_changes=True), а этот движок раз в interval секунд в фоновом потоке:
+      - читает каждый лист одним get_all_values и сравнивает его с последним
+        согласованным снимком – так находятся ручные правки в таблице;
+      - берет из журнала базы строки, измененные ботом;
+      - строки, измененные только с одной стороны, переносит на другую,
+        измененные с обеих – согласует (см. _resolve);
+      - отправляет изменения в таблицу пачками (обновления одним
+        values:batchUpdate, удаления одним batchUpdate, новые строки одним
+        append_rows), не чаще max_requests_per_minute запросов в минуту.
+    Отзывы и логи только дописываются в таблицу.
+
+    Номера строк листа берутся из прочитанного в этом же цикле снимка. Если
+    между чтением и записью в таблице вручную вставят или удалят строки,
+    расхождение будет найдено и исправлено в следующем цикле.
+    """
+
+    def __init__(self, local, remote, interval=15, max_requests_per_minute=50):
+        self.local = local
+        self.remote = remote
+        self.interval = interval
+        self._limiter = _RateLimiter(max_requests_per_minute)
+        self._headers = {}
+        self._stop_event = threading.Event()
+        self._cycle_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="sheets-sync", daemon=True)
+        self._thread.start()
+        logger.info(f"Синхронизация с Google Sheets запущена, интервал {self.interval} с")
+
+    def stop(self, timeout=30):
+        """Останавливает фоновый поток и отправляет в таблицу последние изменения."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.sync_once()
+        except Exception as e:
+            logger.error(f"Ошибка финальной синхронизации с Google Sheets: {e}", exc_info=True)
+        self.remote.close()
+        logger.info("Синхронизация с Google Sheets остановлена")
+
+    def _run(self):
+        while True:
+            try:
+                self.sync_once()
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации с Google Sheets: {e}", exc_info=True)
+            if self._stop_event.wait(self.interval):
+                return
+
+    def sync_once(self):
+        """Один цикл синхронизации всех листов."""
+        with self._cycle_lock, self.remote.background_requests():
+            started = time.monotonic()
+            if not self.local.get_sync_state('initialized'):
+                self._bootstrap()
+
+            max_seq, changes = self.local.pending_changes()
+            for title in KEY_COLUMNS:
+                try:
+                    self._sync_table(title, changes.get(title, set()), max_seq)
+                    self.local.ack_changes(title, max_seq)
+                except Exception as e:
+                    # Журнал листа не очищаем – изменения уйдут в следующем цикле
+                    logger.error(f"Ошибка синхронизации листа {title}: {e}", exc_info=True)
+            for title in APPEND_ONLY:
+                try:
+                    self._push_appended(title)
+                except Exception as e:
+                    logger.error(f"Ошибка записи в лист {title}: {e}", exc_info=True)
+            logger.debug(f"Цикл синхронизации с Google Sheets: {time.monotonic() - started:.2f} с")
+
+    def _bootstrap(self):
+        """
+        Первая синхронизация: все строки базы считаются измененными (чтобы
+        согласовать их с таблицей), а отзывы загружаются из таблицы в пустую базу.
+        """
+        for title in KEY_COLUMNS:
+            self.local.mark_all_changed(title)
+        imported_reviews = False
+        if not self.local.max_rowid('Отзывы'):
+            values = self._read('Отзывы')
+            columns = [name for name, _ in SCHEMA['Отзывы'][1]]
+            if values:
+                headers = values[0]
+                records = [
+                    {c: (row[headers.index(c)] if c in headers and headers.index(c) < len(row) else '')
+                     for c in columns}
+                    for row in values[1:] if any(row)
+                ]
+                self.local.import_rows('Отзывы', records)
+                imported_reviews = True
+        # Загруженные из таблицы отзывы отправлять обратно не нужно
+        self.local.set_sync_state('pushed_rowid:Отзывы', self.local.max_rowid('Отзывы') if imported_reviews else 0)
+        self.local.set_sync_state('pushed_rowid:Логи', 0)
+        self.local.set_sync_state('initialized', 1)
+        logger.info("Первичная синхронизация с Google Sheets подготовлена")
+
+    def _read(self, title):
+        self._limiter.acquire()
+        values = self.remote.get_worksheet(title).get_all_values()
+        if values:
+            self._headers[title] = values[0]
+        return values
+
+    def _cell(self, header, value):
+        """Значение ячейки в виде для сравнения: строка, даты в формате YYYY-MM-DD."""
+        if value is None:
+            return ''
+        value = str(value)
+        if header == 'Дата' and value:
+            return self.local._normalize_date(value)
+        return value
+
+    def _sync_table(self, title, local_keys, max_seq):
+        values = self._read(title)
+        if not values:
+            logger.warning(f"Лист {title} пуст, синхронизация пропущена")
+            return
+        headers = values[0]
+        schema_columns = {name for name, _ in SCHEMA[title][1]}
+        columns = [h for h in headers if h in schema_columns]
+        key_columns = KEY_COLUMNS[title]
+
+        # Текущее состояние листа: ключ -> (номер строки, строка, значения колонок)
+        sheet = {}
+        for row_idx, row in enumerate(values[1:], start=2):
+            row = row + [''] * (len(headers) - len(row))
+            data = {h: self._cell(h, row[i]) for i, h in enumerate(headers) if h in schema_columns}
+            if not any(data.get(c) for c in key_columns):
+                continue
+            if not all(data.get(c) for c in key_columns):
+                logger.warning(f"Лист {title}, строка {row_idx}: не заполнен ключ {key_columns}, строка пропущена")
+                continue
+            key = row_key(title, data)
+            if key in sheet:
+                logger.warning(f"Лист {title}, строка {row_idx}: повтор ключа {key}, строка пропущена")
+                continue
+            sheet[key] = (row_idx, row, data)
+
+        base = self.local.load_snapshot(title)
+        remote_keys = {key for key, (_, _, data) in sheet.items() if base.get(key) != data}
+        remote_keys |= {key for key in base if key not in sheet}
+
+        to_local, updates, deletes, appends, new_base = [], [], [], [], {}
+        for key in remote_keys | local_keys:
+            remote_data = sheet[key][2] if key in sheet else None
+            local_record = self.local.get_by_key(title, key)
+            local_data = {c: self._cell(c, local_record.get(c)) for c in columns} if local_record else None
+
+            if key not in local_keys:
+                merged = remote_data
+            elif key not in remote_keys:
+                merged = local_data
+            else:
+                merged = self._resolve(title, key, base.get(key), local_data, remote_data)
+
+            if merged != local_data:
+                to_local.append((title, key, merged))
+            if merged is None:
+                if key in sheet:
+                    deletes.append(sheet[key][0])
+            elif key not in sheet:
+                appends.append([_sheet_value(merged.get(h, '')) for h in headers])
+            elif merged != remote_data:
+                row_idx, row, _ = sheet[key]
+                updates.append((row_idx, [_sheet_value(merged.get(h, cell)) for h, cell in zip(headers, row)]))
+            new_base[key] = merged
+
+        self._write(title, updates, deletes, appends)
+        self.local.apply_remote(to_local, max_seq)
+        self.local.save_snapshot(title, new_base)
+        if to_local or updates or deletes or appends:
+            logger.info(
+                f"Синхронизация листа {title}: из таблицы {len(to_local)}, "
+                f"в таблицу обновлено {len(updates)}, удалено {len(deletes)}, добавлено {len(appends)}"
+            )
+
+    def _resolve(self, title, key, base, local, remote):
+        """
+        Согласует строку, измененную и ботом, и в таблице.
+        - Удаление против изменения: строка сохраняется.
+        - Разные колонки: берутся изменения обеих сторон.
+        - Одна и та же колонка: побеждает таблица (ручная правка), кроме брони
+          в расписании – если одна из сторон забронировала слот, бронь сохраняется.
+        """
+        if local is None or remote is None:
+            if local is not None or remote is not None:
+                logger.warning(f"Конфликт синхронизации {title}/{key}: строка удалена только с одной стороны, сохраняем")
+            return local if local is not None else remote
+
+        base = base or {}
+        merged = {}
+        groups = [(c,) for c in remote if not (title == 'Расписание' and c in BOOKING_COLUMNS)]
+        if title == 'Расписание':
+            groups.append(tuple(c for c in BOOKING_COLUMNS if c in remote))
+        for group in groups:
+            b = tuple(base.get(c) for c in group)
+            l = tuple(local.get(c, '') for c in group)
+            r = tuple(remote[c] for c in group)
+            if l == r or l == b:
+                chosen = r
+            elif r == b:
+                chosen = l
+            else:
+                chosen = r
+                if group and group[0] in BOOKING_COLUMNS:
+                    if local.get('Статус') == 'Занято':
+                        chosen = l
+                logger.warning(f"Конфликт синхронизации {title}/{key}, колонки {group}: "
+                               f"бот {l}, таблица {r}, выбрано {chosen}")
+            merged.update(zip(group, chosen))
+        return merged
+
+    def _write(self, title, updates, deletes, appends):
+        """Отправляет изменения листа: не больше трех запросов на лист."""
+        worksheet = self.remote.get_worksheet(title)
+        spreadsheet = self.remote.spreadsheet
+        if updates:
+            self._limiter.acquire()
+            spreadsheet.values_batch_update({
+                'valueInputOption': 'RAW',
+                'data': [{'range': f"'{title}'!{rowcol_to_a1(row_idx, 1)}", 'values': [row]}
+                         for row_idx, row in updates],
+            })
+        if deletes:
+            self._limiter.acquire()
+            spreadsheet.batch_update({'requests': [
+                {'deleteDimension': {'range': {'sheetId': worksheet.id, 'dimension': 'ROWS',
+                                               'startIndex': first - 1, 'endIndex': last}}}
+                for first, last in reversed(_row_ranges(deletes))
+            ]})
+        if appends:
+            self._limiter.acquire()
+            worksheet.append_rows(appends, value_input_option='RAW')
+
+    def _push_appended(self, title):
+        """Дописывает в лист строки, добавленные ботом с прошлого цикла."""
+        state_name = f'pushed_rowid:{title}'
+        last_rowid = int(self.local.get_sync_state(state_name, 0))
+        rows = self.local.rows_after(title, last_rowid)[:APPEND_BATCH]
+        if not rows:
+            return
+        headers = self._headers.get(title)
+        if headers is None:
+            self._limiter.acquire()
+            headers = self._headers[title] = self.remote.get_worksheet(title).row_values(1)
+        self._limiter.acquire()
+        self.remote.get_worksheet(title).append_rows(
+            [['' if record.get(h) is None else record.get(h) for h in headers] for _, record in rows],
+            value_input_option='RAW')
+        self.local.set_sync_state(state_name, rows[-1][0])
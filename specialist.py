@@ -7,6 +7,9 @@ from datetime import datetime, date, timedelta
 import calendar
 import re
 
+from services.google_sheets import normalize_date
+from services.keyboard_cache import calendar_keyboards, shift_month
+
 logger = logging.getLogger(__name__)
 
 
@@ -108,61 +111,39 @@ def get_working_days_keyboard(selected_days):
     keyboard.add(types.InlineKeyboardButton("Готово", callback_data="working_days_done"))
     return keyboard
 
-def normalize_date(date_str):
-    """
-    Нормализует строку даты, удаляя лишние пробелы, символы переноса строки и апострофы.
-    Приводит дату к формату YYYY-MM-DD для корректного сравнения.
-    """
-    if not date_str:
-        return ""
-
-    # Удаляем пробелы, символы переноса строки и апострофы
-    date_str = date_str.strip().strip("'").strip('"')
-
-    # Проверяем формат даты и при необходимости преобразуем
-    try:
-        # Проверяем разные форматы даты
-        for fmt in ['%Y-%m-%d', '%d.%m.%Y', '%Y/%m/%d', '%d-%m-%Y']:
-            try:
-                date_obj = datetime.strptime(date_str, fmt)
-                return date_obj.strftime('%Y-%m-%d')
-            except ValueError:
-                continue
-
-        # Если не удалось распознать стандартный формат, пробуем разбить строку
-        if '/' in date_str:
-            parts = date_str.split('/')
-        elif '-' in date_str:
-            parts = date_str.split('-')
-        elif '.' in date_str:
-            parts = date_str.split('.')
-        else:
-            # Если не смогли разобрать, возвращаем как есть
-            return date_str
-
-        if len(parts) == 3:
-            # Пытаемся угадать формат по длине года
-            if len(parts[0]) == 4:  # Год-месяц-день
-                return f"{parts[0]}-{int(parts[1]):02d}-{int(parts[2]):02d}"
-            elif len(parts[2]) == 4:  # День-месяц-год
-                return f"{parts[2]}-{int(parts[1]):02d}-{int(parts[0]):02d}"
-
-        # Если не смогли разобрать, возвращаем как есть
-        return date_str
-    except Exception as e:
-        # В случае ошибки возвращаем исходную строку
-        logger.warning(f"Ошибка при нормализации даты '{date_str}': {e}")
-        return date_str
-
 def get_calendar_keyboard(year, month, selected_dates=None, specialist_id=None, sheets_service=None, mode="select"):
     """
-    Инлайн-клавиатура календаря для выбора дат.
+    Инлайн-клавиатура календаря для выбора дат (JSON разметки для reply_markup).
     selected_dates – набор дат в формате YYYY-MM-DD, которые помечаются галочкой.
     mode - режим календаря ("select" или "view")
+
+    Готовая клавиатура берется из кэша; в режиме просмотра – пока расписание
+    специалиста не изменилось, а соседние месяцы строятся в фоне, чтобы
+    листание календаря сразу находило их в кэше.
     """
     if selected_dates is None:
         selected_dates = []
 
+    view = mode == "view" and specialist_id and sheets_service
+    today = date.today()
+    version = sheets_service.get_schedule_version(specialist_id) if view else None
+
+    def key(y, m):
+        return ('specialist', mode, str(specialist_id) if view else None, y, m, tuple(sorted(selected_dates)), today)
+
+    markup = calendar_keyboards.get_or_build(
+        key(year, month), version,
+        lambda: _build_calendar_keyboard(year, month, selected_dates, specialist_id, sheets_service, mode)
+    )
+    if view:
+        for y, m in (shift_month(year, month, -1), shift_month(year, month, 1)):
+            calendar_keyboards.prefetch(
+                key(y, m), version,
+                lambda y=y, m=m: _build_calendar_keyboard(y, m, selected_dates, specialist_id, sheets_service, mode)
+            )
+    return markup
+
+def _build_calendar_keyboard(year, month, selected_dates, specialist_id, sheets_service, mode):
     keyboard = types.InlineKeyboardMarkup(row_width=7)
 
     # Кнопка с названием месяца и стрелками переключения
@@ -193,52 +174,8 @@ def get_calendar_keyboard(year, month, selected_dates=None, specialist_id=None,
     day_statuses = {}  # Словарь, где ключ - дата, значение - статус (busy, free, mixed, closed)
 
     if mode == "view" and specialist_id and sheets_service:
-        from datetime import datetime, timedelta
-        start_date = datetime(year, month, 1).date()
-        # Получаем последний день месяца
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1).date() - timedelta(days=1)
-        else:
-            end_date = datetime(year, month + 1, 1).date() - timedelta(days=1)
-
-        # Получаем все записи за выбранный период
-        all_slots = sheets_service.schedule_sheet.get_all_records()
-
-        # Фильтруем слоты для специалиста
-        specialist_slots = []
-        for slot in all_slots:
-            if str(slot.get('id_специалиста')) == str(specialist_id):
-                # Нормализуем дату для корректного сравнения
-                slot_date = normalize_date(slot.get('Дата', ''))
-                slot['Дата'] = slot_date
-                specialist_slots.append(slot)
-
-        # Проверяем каждый день на наличие слотов разных типов
-        current_date = start_date
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-
-            # Слоты на текущую дату
-            date_slots = [s for s in specialist_slots if s.get('Дата') == date_str]
-
-            if date_slots:
-                # Проверяем наличие слотов разных типов
-                busy_slots = [s for s in date_slots if s.get('Статус') == 'Занято' and s.get('id_клиента')]
-                free_slots = [s for s in date_slots if s.get('Статус') == 'Свободно']
-                closed_slots = [s for s in date_slots if s.get('Статус') == 'Закрыто' or 
-                              (s.get('Статус') == 'Занято' and not s.get('id_клиента'))]
-
-                # Определяем статус дня
-                if busy_slots and (free_slots or closed_slots):
-                    day_statuses[date_str] = 'mixed'  # Смешанный (занятые и другие слоты)
-                elif busy_slots:
-                    day_statuses[date_str] = 'busy'   # Только занятые слоты
-                elif free_slots:
-                    day_statuses[date_str] = 'free'   # Только свободные слоты
-                elif closed_slots:
-                    day_statuses[date_str] = 'closed' # Только закрытые слоты
-
-            current_date += timedelta(days=1)
+        # Статусы всех дней месяца считаются хранилищем по битовым маскам слотов
+        day_statuses = sheets_service.get_month_day_statuses(specialist_id, year, month)
 
     cal = calendar.monthcalendar(year, month)
     today = date.today()
@@ -1042,7 +979,7 @@ def register_handlers(bot: telebot.TeleBot, sheets_service, logging_service, sch
                 formatted_date = date_str
 
             # Получаем все слоты на эту дату
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
             day_slots = []
             normalized_date = normalize_date(date_str)
 
@@ -1179,7 +1116,7 @@ def view_day_appointments(call):
             formatted_date = date_str
 
         # Получаем все слоты на эту дату
-        all_slots = sheets_service.schedule_sheet.get_all_records()
+        all_slots = sheets_service.get_all_slots()
         day_slots = []
         normalized_date = normalize_date(date_str)
 
@@ -1309,7 +1246,7 @@ def view_day_appointments(call):
                 formatted_date = date_str
     
             # Получаем все слоты на эту дату
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
             day_slots = []
             normalized_date = normalize_date(date_str)
     
@@ -1475,7 +1412,7 @@ def view_day_appointments(call):
                 return
             
             # Получаем информацию о записи перед отменой
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
             appointment_info = None
             client_id = None
             
@@ -1544,7 +1481,7 @@ def view_day_appointments(call):
                 return
             
             # Получаем информацию о записи перед отменой
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
             appointment_info = None
             client_id = None
             
@@ -1713,7 +1650,7 @@ def view_day_appointments(call):
                 formatted_date = date_str
 
             # Получаем все слоты на эту дату
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
             day_slots = []
             normalized_date = normalize_date(date_str)
             
@@ -1808,7 +1745,7 @@ def view_day_appointments(call):
                 return
 
             # Проверяем, что слот все еще свободен
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
             target_slot = None
 
             for slot in all_slots:
@@ -1824,22 +1761,8 @@ def view_day_appointments(call):
                 bot.answer_callback_query(call.id, "Этот слот уже недоступен для закрытия")
                 return
 
-            # Закрываем слот
-            all_slots = sheets_service.schedule_sheet.get_all_records()
-            row_idx = None
-            for idx, slot in enumerate(all_slots, start=2):  # +2 т.к. первая строка - заголовки
-                if str(slot.get('id')) == str(slot_id):
-                    row_idx = idx
-                    break
-
-            if row_idx:
-                # Получаем заголовки для определения индекса колонки
-                headers = sheets_service.schedule_sheet.row_values(1)
-                status_col = headers.index('Статус') + 1
-
-                # Меняем статус на "Закрыто"
-                sheets_service.schedule_sheet.update_cell(row_idx, status_col, 'Закрыто')
-
+            # Закрываем слот (меняем статус на "Закрыто")
+            if sheets_service.set_slot_status(slot_id, 'Закрыто'):
                 # Получаем информацию о дате и времени
                 date_str = target_slot.get('Дата', '')
                 time_str = target_slot.get('Время', '')
@@ -1889,7 +1812,7 @@ def view_day_appointments(call):
                 return
 
             # Проверяем, что слот закрыт и не занят клиентом
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
             target_slot = None
 
             for slot in all_slots:
@@ -1905,22 +1828,8 @@ def view_day_appointments(call):
                 bot.answer_callback_query(call.id, "Этот слот недоступен для открытия")
                 return
 
-            # Открываем слот
-            all_slots = sheets_service.schedule_sheet.get_all_records()
-            row_idx = None
-            for idx, slot in enumerate(all_slots, start=2):  # +2 т.к. первая строка - заголовки
-                if str(slot.get('id')) == str(slot_id):
-                    row_idx = idx
-                    break
-
-            if row_idx:
-                # Получаем заголовки для определения индекса колонки
-                headers = sheets_service.schedule_sheet.row_values(1)
-                status_col = headers.index('Статус') + 1
-
-                # Меняем статус на "Свободно"
-                sheets_service.schedule_sheet.update_cell(row_idx, status_col, 'Свободно')
-
+            # Открываем слот (меняем статус на "Свободно")
+            if sheets_service.set_slot_status(slot_id, 'Свободно'):
                 # Получаем информацию о дате и времени
                 date_str = target_slot.get('Дата', '')
                 time_str = target_slot.get('Время', '')
@@ -2117,7 +2026,7 @@ def view_day_appointments(call):
                 data['target_month_str'] = f"{month_str} {year}"
 
             # Проверяем, есть ли уже записи на этот месяц
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
 
             # Получаем первый и последний день месяца
             if month == 12:
@@ -2508,16 +2417,18 @@ def view_day_appointments(call):
                 end_date = datetime(next_year, next_month, 1).date() - timedelta(days=1)
 
                 # Получаем все слоты
-                all_slots = sheets_service.schedule_sheet.get_all_records()
+                all_slots = sheets_service.get_all_slots()
 
                 # Находим индексы строк для удаления
                 rows_to_update = []
-                for idx, slot in enumerate(all_slots, start=2):  # +2 т.к. первая строка - заголовки
-                    if (str(slot.get('id_специалиста')) == str(spec_id) and 
-                        start_date <= datetime.strptime(slot.get('Дата', '1970-01-01'), '%Y-%m-%d').date() <= end_date):
-                        # Если это занятая запись - отменяем её
-                        if slot.get('Статус') == 'Занято' and slot.get('id_клиента'):
-                            sheets_service.cancel_appointment(slot['id'])
+                # Отмены отправляются в таблицу одним запросом
+                with sheets_service.batch_writes():
+                    for idx, slot in enumerate(all_slots, start=2):  # +2 т.к. первая строка - заголовки
+                        if (str(slot.get('id_специалиста')) == str(spec_id) and 
+                            start_date <= datetime.strptime(slot.get('Дата', '1970-01-01'), '%Y-%m-%d').date() <= end_date):
+                            # Если это занятая запись - отменяем её
+                            if slot.get('Статус') == 'Занято' and slot.get('id_клиента'):
+                                sheets_service.cancel_appointment(slot['id'])
 
                 # Очищаем все существующие слоты для этого месяца и специалиста
                 sheets_service.clear_month_schedule(spec_id, target_year, target_month)
@@ -3079,25 +2990,11 @@ def view_day_appointments(call):
             # Получаем ID специалиста
             spec_id = specialist['id']
 
-            # Сохраняем услугу в Google Sheets (лист "Услуги")
-            services_sheet = None
-            try:
-                services_sheet = sheets_service.spreadsheet.worksheet("Услуги")
-            except:
-                # Создаем, если нет
-                services_sheet = sheets_service.spreadsheet.add_worksheet(title='Услуги', rows=1000, cols=6)
-                services_sheet.append_row(["id_специалиста", "Название", "Продолжительность", "Стоимость"])
-
-            # Проверим, существует ли уже такая услуга
-            all_svc = services_sheet.get_all_records()
-            duplicate = False
-            for svc in all_svc:
-                if (str(svc.get('id_специалиста', '')) == str(spec_id) and 
-                    svc.get('Название', '') == service_name):
-                    duplicate = True
-                    break
+            # Сохраняем услугу в Google Sheets (лист "Услуги"),
+            # если услуги с таким названием еще нет
+            added = sheets_service.add_specialist_service(spec_id, service_name, duration, price)
 
-            if duplicate:
+            if not added:
                 bot.send_message(
                     message.chat.id,
                     f"Услуга с названием '{service_name}' уже существует. Пожалуйста, выберите другое название.",
@@ -3106,10 +3003,6 @@ def view_day_appointments(call):
                 bot.delete_state(user_id, message.chat.id)
                 return
 
-            # Добавляем новую услугу
-            new_row = [spec_id, service_name, duration, price]
-            services_sheet.append_row(new_row)
-
             bot.send_message(
                 message.chat.id,
                 f"Услуга '{service_name}' продолжительностью {duration} мин и стоимостью {price} ₽ добавлена!",
@@ -3218,24 +3111,7 @@ def view_day_appointments(call):
                 return
 
             # Удаляем услугу из листа "Услуги"
-            services_sheet = sheets_service.spreadsheet.worksheet("Услуги")
-            all_rows = services_sheet.get_all_values()  # Включая заголовок
-
-            # Ищем строку, совпадающую с услугой
-            target_row = None
-            for row_idx, row in enumerate(all_rows, start=1):
-                if row_idx == 1:  # Пропускаем заголовок
-                    continue
-
-                if (len(row) >= 3 and 
-                    str(row[0]) == str(sid) and 
-                    row[1] == name):
-                    target_row = row_idx
-                    break
-
-            if target_row:
-                # Удаляем строку
-                services_sheet.delete_row(target_row)
+            if sheets_service.delete_specialist_service(sid, name):
                 bot.answer_callback_query(call.id, f"Услуга '{name}' удалена.")
 
                 # Обновляем список услуг
@@ -3543,7 +3419,7 @@ def view_day_appointments(call):
                         seven_days_later = today + timedelta(days=7)
 
                         # Получаем все слоты расписания
-                        all_slots = sheets_service.schedule_sheet.get_all_records()
+                        all_slots = sheets_service.get_all_slots()
 
                         # Собираем ID клиентов с записями на ближайшие 7 дней
                         client_ids = set()
@@ -3579,7 +3455,7 @@ def view_day_appointments(call):
                             return
 
                         # Получаем все слоты расписания
-                        all_slots = sheets_service.schedule_sheet.get_all_records()
+                        all_slots = sheets_service.get_all_slots()
 
                         # Собираем ID клиентов с записями на выбранную дату
                         client_ids = set()
@@ -3752,7 +3628,7 @@ def view_day_appointments(call):
                     total_count = len(my_clients)
 
                     # Получаем данные по записям
-                    all_slots = sheets_service.schedule_sheet.get_all_records()
+                    all_slots = sheets_service.get_all_slots()
 
                     # Находим слоты, привязанные к этому специалисту и имеющие статус "Занято"
                     booked_slots = [
@@ -3975,7 +3851,7 @@ def view_day_appointments(call):
                 seven_days_later = today + timedelta(days=7)
     
                 # Получаем все слоты расписания
-                all_slots = sheets_service.schedule_sheet.get_all_records()
+                all_slots = sheets_service.get_all_slots()
     
                 # Собираем ID клиентов с записями на ближайшие 7 дней
                 client_ids = set()
@@ -4011,7 +3887,7 @@ def view_day_appointments(call):
                     return
     
                 # Получаем все слоты расписания
-                all_slots = sheets_service.schedule_sheet.get_all_records()
+                all_slots = sheets_service.get_all_slots()
     
                 # Собираем ID клиентов с записями на выбранную дату
                 client_ids = set()
@@ -4182,7 +4058,7 @@ def view_day_appointments(call):
             total_count = len(my_clients)
     
             # Получаем данные по записям
-            all_slots = sheets_service.schedule_sheet.get_all_records()
+            all_slots = sheets_service.get_all_slots()
     
             # Находим слоты, привязанные к этому специалисту и имеющие статус "Занято"
             booked_slots = [
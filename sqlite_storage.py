@@ -0,0 +1,924 @@
+# services/sqlite_storage.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from services.google_sheets import (
+    BookingResult, GoogleSheetsService, _DayMasks, _month_run_days, _slot_count, _time_minutes
+)
+
+logger = logging.getLogger(__name__)
+
+# Таблицы повторяют листы Google Sheets: те же названия колонок,
+# поэтому записи выглядят так же, как у GoogleSheetsService.
+SCHEMA = {
+    'Специалисты': ('specialists', [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('Имя', 'TEXT'),
+        ('Специализация', 'TEXT'),
+        ('Часовой пояс', 'TEXT'),
+        ('Реферальная', 'TEXT'),
+        ('Telegram_ID', 'INTEGER'),
+    ]),
+    'Клиенты': ('clients', [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('Имя', 'TEXT'),
+        ('Телефон', 'TEXT'),
+        ('id_специалиста', 'INTEGER'),
+        ('Telegram_ID', 'INTEGER'),
+    ]),
+    'Расписание': ('schedule', [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('Дата', 'TEXT'),
+        ('Время', 'TEXT'),
+        ('id_специалиста', 'INTEGER'),
+        ('Статус', 'TEXT'),
+        ('id_клиента', 'INTEGER'),
+        ('Подтверждено', 'TEXT'),
+        ('Запрос_оценки', 'TEXT'),
+        ('Продолжительность', 'INTEGER'),
+    ]),
+    'Услуги': ('services', [
+        ('id_специалиста', 'INTEGER'),
+        ('Название', 'TEXT'),
+        ('Продолжительность', 'INTEGER'),
+        ('Стоимость', 'INTEGER'),
+    ]),
+    'Отзывы': ('reviews', [
+        ('id_клиента', 'INTEGER'),
+        ('id_специалиста', 'INTEGER'),
+        ('Дата', 'TEXT'),
+        ('Оценка', 'INTEGER'),
+        ('Комментарий', 'TEXT'),
+    ]),
+    'Напоминания': ('reminders', [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('id_записи', 'INTEGER'),
+        ('id_клиента', 'INTEGER'),
+        ('id_специалиста', 'INTEGER'),
+        ('Дата', 'TEXT'),
+        ('Время', 'TEXT'),
+        ('Статус', 'TEXT'),
+        ('Услуга', 'TEXT'),
+    ]),
+    'Логи': ('logs', [
+        ('Время', 'TEXT'),
+        ('ID пользователя', 'TEXT'),
+        ('Имя пользователя', 'TEXT'),
+        ('Сообщение', 'TEXT'),
+        ('Тип', 'TEXT'),
+    ]),
+}
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS schedule_day ON schedule ("id_специалиста", "Дата", "Статус")',
+    'CREATE INDEX IF NOT EXISTS schedule_client ON schedule ("id_клиента")',
+    'CREATE INDEX IF NOT EXISTS specialists_telegram ON specialists ("Telegram_ID")',
+    'CREATE INDEX IF NOT EXISTS specialists_referral ON specialists ("Реферальная")',
+    'CREATE INDEX IF NOT EXISTS clients_telegram ON clients ("Telegram_ID")',
+    'CREATE INDEX IF NOT EXISTS clients_phone ON clients ("Телефон")',
+    'CREATE UNIQUE INDEX IF NOT EXISTS services_name ON services ("id_специалиста", "Название")',
+    'CREATE INDEX IF NOT EXISTS reviews_specialist ON reviews ("id_специалиста")',
+    'CREATE INDEX IF NOT EXISTS reminders_status ON reminders ("Статус")',
+]
+
+# Версии расписания специалистов (для кэшей, зависящих от слотов): триггеры
+# увеличивают версию специалиста при любом изменении его слотов
+SCHEDULE_VERSION_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS schedule_versions (specialist_id TEXT PRIMARY KEY, version INTEGER NOT NULL)',
+] + [
+    f"CREATE TRIGGER IF NOT EXISTS schedule_version_{event.lower()} AFTER {event} ON schedule BEGIN "
+    + ' '.join(
+        f'INSERT INTO schedule_versions (specialist_id, version) VALUES ({row}."id_специалиста", 1) '
+        f'ON CONFLICT (specialist_id) DO UPDATE SET version = version + 1;'
+        for row in rows
+    )
+    + " END"
+    for event, rows in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',)))
+]
+
+# Ключ строки для синхронизации с таблицей: по нему строка находится и в базе, и на листе.
+# Отзывы и логи только дописываются, для них ключ не нужен.
+KEY_COLUMNS = {
+    'Специалисты': ('id',),
+    'Клиенты': ('id',),
+    'Расписание': ('id',),
+    'Услуги': ('id_специалиста', 'Название'),
+    'Напоминания': ('id',),
+}
+KEY_SEPARATOR = '\x1f'
+
+SYNC_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS sync_outbox (seq INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, key TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS sync_flags (applying INTEGER NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS sync_snapshot (title TEXT NOT NULL, key TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (title, key))',
+    'CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT NOT NULL)',
+]
+
+
+def row_key(title, record):
+    """Ключ строки листа title по значениям ключевых колонок."""
+    return KEY_SEPARATOR.join(str(record.get(column, '')) for column in KEY_COLUMNS[title])
+
+
+def _q(name):
+    """Экранирует имя колонки для SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _day_sorted(slots):
+    return sorted(slots, key=lambda slot: _time_minutes(slot.get('Время', '')))
+
+
+class SQLiteStorageService:
+    """
+    Хранилище в локальной базе SQLite с тем же набором публичных методов,
+    что и у GoogleSheetsService. Подходит для локальной разработки и нагрузочных
+    тестов без аккаунта Google: каждая операция – запрос к файлу базы без сети.
+
+    Одно соединение используется всеми потоками под блокировкой, изменения
+    выполняются в транзакциях (см. batch_writes).
+    """
+
+    # Логика, не зависящая от хранилища, общая с GoogleSheetsService
+    _normalize_date = GoogleSheetsService._normalize_date
+    generate_month_schedule = GoogleSheetsService.generate_month_schedule
+    generate_specific_month_schedule = GoogleSheetsService.generate_specific_month_schedule
+    _slot_conflicts = GoogleSheetsService._slot_conflicts
+    get_available_times = GoogleSheetsService.get_available_times
+
+    def __init__(self, path, track_changes=False):
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._lock = threading.RLock()
+            self._depth = 0
+            self._create_schema()
+            if track_changes:
+                self._create_change_tracking()
+            logger.info(f"Хранилище SQLite открыто: {path}")
+        except Exception as e:
+            logger.error(f"Ошибка инициализации SQLite: {e}", exc_info=True)
+            raise
+
+    def _create_schema(self):
+        with self.batch_writes():
+            for table, columns in SCHEMA.values():
+                definitions = []
+                for name, sql_type in columns:
+                    if 'PRIMARY KEY' in sql_type:
+                        definitions.append(f"{_q(name)} {sql_type}")
+                    else:
+                        definitions.append(f"{_q(name)} {sql_type} NOT NULL DEFAULT ''")
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(definitions)})")
+            for statement in INDEXES + SCHEDULE_VERSION_SCHEMA:
+                self._conn.execute(statement)
+
+    def _create_change_tracking(self):
+        """
+        Журнал изменений для синхронизации с Google Sheets: триггеры записывают
+        в sync_outbox ключи строк, измененных ботом. Изменения, пришедшие из
+        таблицы (apply_remote), в журнал не попадают.
+        """
+        with self.batch_writes():
+            for statement in SYNC_SCHEMA:
+                self._conn.execute(statement)
+            if self._conn.execute('SELECT COUNT(*) FROM sync_flags').fetchone()[0] == 0:
+                self._conn.execute('INSERT INTO sync_flags (applying) VALUES (0)')
+            self._conn.execute('UPDATE sync_flags SET applying = 0')
+            for title, columns in KEY_COLUMNS.items():
+                table, _ = SCHEMA[title]
+                for event, rows in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',))):
+                    inserts = ' '.join(
+                        f"INSERT INTO sync_outbox (title, key) VALUES ('{title}', "
+                        f"{' || char(31) || '.join(f'{row}.{_q(c)}' for c in columns)});"
+                        for row in rows
+                    )
+                    self._conn.execute(
+                        f"CREATE TRIGGER IF NOT EXISTS {table}_sync_{event.lower()} AFTER {event} ON {table} "
+                        f"WHEN (SELECT applying FROM sync_flags) = 0 BEGIN {inserts} END"
+                    )
+
+    @contextmanager
+    def batch_writes(self):
+        """
+        Выполняет изменения внутри блока в одной транзакции.
+        Вложенные блоки присоединяются к внешнему, при ошибке все откатывается.
+        """
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._depth = 1
+            try:
+                yield
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            else:
+                self._conn.execute('COMMIT')
+            finally:
+                self._depth = 0
+
+    def invalidate_cache(self, title=None):
+        """Кэша нет – метод оставлен для совместимости с GoogleSheetsService."""
+
+    def close(self):
+        """Закрывает соединение с базой."""
+        with self._lock:
+            self._conn.close()
+
+    # Вспомогательные запросы
+    def _select(self, title, where='', params=(), limit=None):
+        table, _ = SCHEMA[title]
+        sql = f"SELECT * FROM {table}"
+        if where:
+            sql += f" WHERE {where}"
+        sql += " ORDER BY rowid"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def _select_one(self, title, where, params):
+        rows = self._select(title, where, params, limit=1)
+        return rows[0] if rows else None
+
+    def _insert(self, title, rows):
+        """Вставляет строки ({колонка: значение}) одним запросом."""
+        table, _ = SCHEMA[title]
+        columns = list(rows[0])
+        sql = (f"INSERT INTO {table} ({', '.join(_q(c) for c in columns)}) "
+               f"VALUES ({', '.join('?' for _ in columns)})")
+        values = [['' if row.get(c) is None else row.get(c) for c in columns] for row in rows]
+        with self.batch_writes():
+            self._conn.executemany(sql, values)
+
+    def _update(self, title, changes, where, params):
+        """Обновляет строки по условию и возвращает число измененных строк."""
+        table, _ = SCHEMA[title]
+        assignments = ', '.join(f"{_q(c)} = ?" for c in changes)
+        values = ['' if v is None else v for v in changes.values()]
+        with self.batch_writes():
+            cursor = self._conn.execute(f"UPDATE {table} SET {assignments} WHERE {where}", values + list(params))
+            return cursor.rowcount
+
+    def _delete(self, title, where, params):
+        table, _ = SCHEMA[title]
+        with self.batch_writes():
+            return self._conn.execute(f"DELETE FROM {table} WHERE {where}", params).rowcount
+
+    def _next_id(self, title):
+        """Первый свободный id (вызывать внутри транзакции, чтобы блок id не заняли)."""
+        table, _ = SCHEMA[title]
+        row = self._conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()
+        return row[0]
+
+    def _key_where(self, title, key):
+        columns = KEY_COLUMNS[title]
+        return ' AND '.join(f"{_q(c)} = ?" for c in columns), tuple(key.split(KEY_SEPARATOR, len(columns) - 1))
+
+    # Синхронизация с Google Sheets (см. services/sheets_sync.py)
+    def pending_changes(self):
+        """Изменения бота, еще не отправленные в таблицу: (последний seq, {лист: {ключи}})."""
+        with self._lock:
+            rows = self._conn.execute('SELECT seq, title, key FROM sync_outbox ORDER BY seq').fetchall()
+        changes = {}
+        for seq, title, key in rows:
+            changes.setdefault(title, set()).add(key)
+        return (rows[-1][0] if rows else 0), changes
+
+    def ack_changes(self, title, max_seq):
+        """Удаляет из журнала изменения листа до max_seq включительно (они уже в таблице)."""
+        with self.batch_writes():
+            self._conn.execute('DELETE FROM sync_outbox WHERE title = ? AND seq <= ?', (title, max_seq))
+
+    def mark_all_changed(self, title):
+        """Ставит в журнал все строки листа – для первой синхронизации уже заполненной базы."""
+        with self.batch_writes():
+            for record in self._select(title):
+                self._conn.execute('INSERT INTO sync_outbox (title, key) VALUES (?, ?)', (title, row_key(title, record)))
+
+    def get_by_key(self, title, key):
+        where, params = self._key_where(title, key)
+        return self._select_one(title, where, params)
+
+    def apply_remote(self, changes, since_seq):
+        """
+        Применяет изменения из таблицы, не записывая их в журнал:
+        changes – список (лист, ключ, запись или None для удаления).
+        Строки, которые бот успел изменить после since_seq, пропускаются –
+        их согласует следующий цикл синхронизации.
+        """
+        with self.batch_writes():
+            self._conn.execute('UPDATE sync_flags SET applying = 1')
+            try:
+                for title, key, record in changes:
+                    changed_since = self._conn.execute(
+                        'SELECT 1 FROM sync_outbox WHERE title = ? AND key = ? AND seq > ? LIMIT 1',
+                        (title, key, since_seq)).fetchone()
+                    if changed_since:
+                        continue
+                    table, columns = SCHEMA[title]
+                    where, params = self._key_where(title, key)
+                    if record is None:
+                        self._conn.execute(f"DELETE FROM {table} WHERE {where}", params)
+                        continue
+                    # Колонки, которых нет на листе, не трогаем
+                    known = [name for name, _ in columns if name in record]
+                    values = [record[c] for c in known]
+                    cursor = self._conn.execute(
+                        f"UPDATE {table} SET {', '.join(f'{_q(c)} = ?' for c in known)} WHERE {where}",
+                        values + list(params))
+                    if cursor.rowcount == 0:
+                        self._conn.execute(
+                            f"INSERT INTO {table} ({', '.join(_q(c) for c in known)}) "
+                            f"VALUES ({', '.join('?' for _ in known)})",
+                            values)
+            finally:
+                self._conn.execute('UPDATE sync_flags SET applying = 0')
+
+    def import_rows(self, title, records):
+        """Добавляет строки, загруженные из таблицы, не записывая их в журнал."""
+        if not records:
+            return
+        with self.batch_writes():
+            self._conn.execute('UPDATE sync_flags SET applying = 1')
+            try:
+                self._insert(title, records)
+            finally:
+                self._conn.execute('UPDATE sync_flags SET applying = 0')
+
+    def max_rowid(self, title):
+        table, _ = SCHEMA[title]
+        with self._lock:
+            return self._conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+
+    def rows_after(self, title, rowid):
+        """Строки листа, добавленные после rowid: [(rowid, запись)]."""
+        table, _ = SCHEMA[title]
+        with self._lock:
+            rows = self._conn.execute(f"SELECT rowid AS _rowid, * FROM {table} WHERE rowid > ? ORDER BY rowid", (rowid,))
+            return [(row['_rowid'], {k: row[k] for k in row.keys() if k != '_rowid'}) for row in rows]
+
+    def load_snapshot(self, title):
+        """Последнее согласованное с таблицей состояние листа: {ключ: {колонка: строка}}."""
+        with self._lock:
+            rows = self._conn.execute('SELECT key, data FROM sync_snapshot WHERE title = ?', (title,)).fetchall()
+        return {key: json.loads(data) for key, data in rows}
+
+    def save_snapshot(self, title, rows):
+        """Обновляет сохраненное состояние листа: {ключ: {колонка: строка} или None для удаления}."""
+        with self.batch_writes():
+            for key, data in rows.items():
+                if data is None:
+                    self._conn.execute('DELETE FROM sync_snapshot WHERE title = ? AND key = ?', (title, key))
+                else:
+                    self._conn.execute('INSERT OR REPLACE INTO sync_snapshot (title, key, data) VALUES (?, ?, ?)',
+                                       (title, key, json.dumps(data, ensure_ascii=False)))
+
+    def get_sync_state(self, name, default=None):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM sync_state WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_sync_state(self, name, value):
+        with self.batch_writes():
+            self._conn.execute('INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)', (name, str(value)))
+
+    # Методы для работы с расписанием
+    def get_schedule_version(self, specialist_id):
+        """Версия слотов специалиста: меняется при любом изменении его расписания."""
+        with self._lock:
+            row = self._conn.execute('SELECT version FROM schedule_versions WHERE specialist_id = ?',
+                                     (str(specialist_id),)).fetchone()
+        return row[0] if row else 0
+
+    def get_available_slots(self, specialist_id, date=None):
+        try:
+            if date:
+                norm_date = self._normalize_date(date)
+                return _day_sorted(self._select(
+                    'Расписание', '"id_специалиста" = ? AND "Дата" = ? AND "Статус" = ?',
+                    (specialist_id, norm_date, 'Свободно')))
+            return self._select('Расписание', '"id_специалиста" = ? AND "Статус" = ?',
+                                (specialist_id, 'Свободно'))
+        except Exception as e:
+            logger.error(f"Ошибка получения доступных слотов: {e}", exc_info=True)
+            return []
+
+    def _month_masks(self, specialist_id, year, month):
+        """Битовые маски слотов специалиста по дням месяца: [(дата, _DayMasks)] – одним запросом."""
+        import calendar
+
+        _, last_day_num = calendar.monthrange(year, month)
+        slots = self._select(
+            'Расписание', '"id_специалиста" = ? AND "Дата" BETWEEN ? AND ?',
+            (specialist_id, f"{year}-{month:02d}-01", f"{year}-{month:02d}-{last_day_num:02d}"))
+        slots_by_day = {}
+        for slot in slots:
+            slots_by_day.setdefault(slot['Дата'], []).append(slot)
+        days = [f"{year}-{month:02d}-{day:02d}" for day in range(1, last_day_num + 1)]
+        return [(date_str, _DayMasks(_day_sorted(slots_by_day.get(date_str, [])))) for date_str in days]
+
+    def get_month_availability(self, specialist_id, year, month, service_duration=30):
+        try:
+            month_masks = self._month_masks(specialist_id, year, month)
+            flags = _month_run_days([masks for _, masks in month_masks], _slot_count(service_duration))
+            return {date_str: flag for (date_str, _), flag in zip(month_masks, flags)}
+        except Exception as e:
+            logger.error(f"Ошибка получения доступности на месяц: {e}", exc_info=True)
+            return {}
+
+    def get_month_day_statuses(self, specialist_id, year, month):
+        try:
+            statuses = {}
+            for date_str, masks in self._month_masks(specialist_id, year, month):
+                status = masks.status()
+                if status:
+                    statuses[date_str] = status
+            return statuses
+        except Exception as e:
+            logger.error(f"Ошибка получения статусов дней месяца: {e}", exc_info=True)
+            return {}
+
+    def get_booking_options(self, specialist_id, date, service_duration=30):
+        try:
+            slots = self._select('Расписание', '"id_специалиста" = ? AND "Дата" = ?',
+                                 (specialist_id, self._normalize_date(date)))
+            return _DayMasks(_day_sorted(slots)).options(_slot_count(service_duration))
+        except Exception as e:
+            logger.error(f"Ошибка получения вариантов записи: {e}", exc_info=True)
+            return []
+
+    def clear_month_schedule(self, specialist_id, year, month):
+        try:
+            import calendar
+
+            _, last_day_num = calendar.monthrange(year, month)
+            deleted_count = self._delete(
+                'Расписание', '"id_специалиста" = ? AND "Дата" BETWEEN ? AND ?',
+                (specialist_id, f"{year}-{month:02d}-01", f"{year}-{month:02d}-{last_day_num:02d}"))
+            logger.info(f"Удалено {deleted_count} слотов за {month}/{year} для специалиста {specialist_id}")
+            return deleted_count
+        except Exception as e:
+            logger.error(f"Ошибка при очистке расписания на месяц: {e}", exc_info=True)
+            return 0
+
+    def close_day_slots(self, specialist_id, date_str):
+        try:
+            updated = self._update(
+                'Расписание', {'Статус': 'Закрыто', 'id_клиента': ''},
+                '"id_специалиста" = ? AND "Дата" = ? AND "Статус" != ?',
+                (specialist_id, self._normalize_date(date_str), 'Закрыто'))
+            if updated:
+                logger.info(f"Слоты для специалиста {specialist_id} на дату {date_str} закрыты.")
+            else:
+                logger.info(f"Для специалиста {specialist_id} на дату {date_str} не найдено активных слотов для закрытия.")
+            return bool(updated)
+        except Exception as e:
+            logger.error(f"Ошибка в close_day_slots: {e}")
+            return False
+
+    def get_all_slots(self):
+        try:
+            return self._select('Расписание')
+        except Exception as e:
+            logger.error(f"Ошибка получения расписания: {e}")
+            return []
+
+    def set_slot_status(self, slot_id, new_status):
+        try:
+            if self._update('Расписание', {'Статус': new_status}, 'id = ?', (slot_id,)):
+                logger.info(f"Статус слота ID={slot_id} изменен на {new_status}")
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка изменения статуса слота: {e}")
+            return False
+
+    def get_client_appointments(self, client_id):
+        try:
+            return self._select('Расписание', '"id_клиента" = ?', (client_id,))
+        except Exception as e:
+            logger.error(f"Ошибка получения записей клиента: {e}")
+            return []
+
+    def book_appointment(self, slot_id, client_id):
+        try:
+            # Проверка статуса и запись в одном UPDATE – слот не забронируют дважды
+            return self._update('Расписание', {'Статус': 'Занято', 'id_клиента': client_id},
+                                'id = ? AND "Статус" = ?', (slot_id, 'Свободно')) == 1
+        except Exception as e:
+            logger.error(f"Ошибка бронирования слота: {e}")
+            return False
+
+    def book_slots(self, slot_ids, client_id):
+        """Бронирует для клиента все слоты slot_ids или ни одного (в одной транзакции)."""
+        slot_ids = list(slot_ids)
+        if not slot_ids:
+            return BookingResult(False, [])
+        try:
+            with self.batch_writes():
+                placeholders = ', '.join('?' for _ in slot_ids)
+                free = {str(slot['id']) for slot in self._select(
+                    'Расписание', f'id IN ({placeholders}) AND "Статус" = ?', tuple(slot_ids) + ('Свободно',))}
+                conflicts = [sid for sid in slot_ids if str(sid) not in free]
+                if conflicts:
+                    return BookingResult(False, conflicts)
+                self._update('Расписание', {'Статус': 'Занято', 'id_клиента': client_id},
+                             f'id IN ({placeholders})', tuple(slot_ids))
+            logger.info(f"Клиент {client_id} забронировал слоты {slot_ids}")
+            return BookingResult(True, [])
+        except Exception as e:
+            logger.error(f"Ошибка бронирования слотов {slot_ids}: {e}", exc_info=True)
+            return BookingResult(False, [])
+
+    def reschedule(self, old_slot_ids, new_slot_ids, client_id):
+        """
+        Переносит запись клиента со слотов old_slot_ids на new_slot_ids вместе
+        с последним напоминанием клиента о ней – в одной транзакции, целиком или никак.
+        Напоминания прежних клиентов этих слотов не меняются.
+        """
+        old_slot_ids = [str(sid) for sid in old_slot_ids]
+        new_slot_ids = [str(sid) for sid in new_slot_ids]
+        if not old_slot_ids or not new_slot_ids:
+            return BookingResult(False, [])
+        book_ids = [sid for sid in new_slot_ids if sid not in old_slot_ids]
+        slot_ids = old_slot_ids + book_ids
+        try:
+            with self.batch_writes():
+                placeholders = ', '.join('?' for _ in slot_ids)
+                slots = {str(slot['id']): slot for slot in self._select(
+                    'Расписание', f'id IN ({placeholders})', tuple(slot_ids))}
+                conflicts = [sid for sid in slot_ids if sid not in slots]
+                conflicts += self._slot_conflicts({sid: slots[sid] for sid in slot_ids if sid in slots},
+                                                  book_ids, client_id)
+                if conflicts:
+                    return BookingResult(False, conflicts)
+                
+                for sid in book_ids:
+                    self._update('Расписание', {'Статус': 'Занято', 'id_клиента': client_id}, 'id = ?', (sid,))
+                for sid in old_slot_ids:
+                    if sid not in new_slot_ids:
+                        self._update('Расписание', {'Статус': 'Свободно', 'id_клиента': ''}, 'id = ?', (sid,))
+                new_slot = slots[new_slot_ids[0]]
+                self._update('Напоминания', {
+                    'id_записи': new_slot_ids[0],
+                    'Дата': self._normalize_date(str(new_slot['Дата'])),
+                    'Время': new_slot['Время'],
+                    'Статус': 'pending',
+                }, 'rowid = (SELECT MAX(rowid) FROM reminders WHERE "id_записи" = ? AND "id_клиента" = ?)',
+                   (old_slot_ids[0], client_id))
+            logger.info(f"Запись клиента {client_id} перенесена со слотов {old_slot_ids} на {new_slot_ids}")
+            return BookingResult(True, [])
+        except Exception as e:
+            logger.error(f"Ошибка переноса записи {old_slot_ids} -> {new_slot_ids}: {e}", exc_info=True)
+            return BookingResult(False, [])
+
+    def cancel_appointment(self, slot_id):
+        try:
+            if self._update('Расписание', {'Статус': 'Свободно', 'id_клиента': ''},
+                            'id = ? AND "Статус" = ?', (slot_id, 'Занято')):
+                logger.info(f"Отменена запись, слот ID={slot_id}")
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка отмены бронирования: {e}")
+            return False
+
+    def add_schedule_slot(self, date, time, specialist_id):
+        ids = self.add_schedule_slots([(date, time)], specialist_id)
+        return ids[0] if ids else None
+
+    def add_schedule_slots(self, slots, specialist_id):
+        if not slots:
+            return []
+        try:
+            with self.batch_writes():
+                first_id = self._next_id('Расписание')
+                rows = [
+                    {'id': first_id + i, 'Дата': self._normalize_date(slot_date), 'Время': slot_time,
+                     'id_специалиста': specialist_id, 'Статус': 'Свободно', 'id_клиента': ''}
+                    for i, (slot_date, slot_time) in enumerate(slots)
+                ]
+                self._insert('Расписание', rows)
+            return [row['id'] for row in rows]
+        except Exception as e:
+            logger.error(f"Ошибка пакетного добавления слотов в расписание: {e}", exc_info=True)
+            return []
+
+    def get_appointment_by_id(self, appointment_id):
+        try:
+            return self._select_one('Расписание', 'id = ?', (appointment_id,))
+        except Exception as e:
+            logger.error(f"Ошибка получения записи по ID: {e}", exc_info=True)
+            return None
+
+    def get_specialist_appointments_by_date(self, specialist_id, date_str):
+        try:
+            appointments = _day_sorted(self._select(
+                'Расписание', '"id_специалиста" = ? AND "Дата" = ? AND "Статус" = ? AND "id_клиента" != ?',
+                (specialist_id, self._normalize_date(date_str), 'Занято', '')))
+            logger.info(f"Найдено {len(appointments)} записей для специалиста {specialist_id} на дату {date_str}")
+            return appointments
+        except Exception as e:
+            logger.error(f"Ошибка получения записей специалиста на дату: {e}", exc_info=True)
+            return []
+
+    def update_appointment_confirmation(self, appointment_id, confirmed=True):
+        try:
+            if self._update('Расписание', {'Подтверждено': 'Да' if confirmed else 'Нет'}, 'id = ?', (appointment_id,)):
+                logger.info(f"Обновлен статус подтверждения записи ID={appointment_id} на {confirmed}")
+                return True
+            logger.warning(f"Запись ID={appointment_id} не найдена")
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка обновления статуса подтверждения: {e}", exc_info=True)
+            return False
+
+    def update_appointment_feedback_request(self, appointment_id, requested=True):
+        try:
+            if self._update('Расписание', {'Запрос_оценки': 'Да' if requested else 'Нет'}, 'id = ?', (appointment_id,)):
+                logger.info(f"Обновлен статус запроса оценки записи ID={appointment_id} на {requested}")
+                return True
+            logger.warning(f"Запись ID={appointment_id} не найдена")
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка обновления статуса запроса оценки: {e}", exc_info=True)
+            return False
+
+    def get_completed_appointments_without_feedback(self):
+        try:
+            candidates = self._select('Расписание', '"Статус" = ? AND "id_клиента" != ? AND "Запрос_оценки" != ?',
+                                      ('Занято', '', 'Да'))
+            now = datetime.now()
+            completed_appointments = []
+            for slot in candidates:
+                try:
+                    appt_date = datetime.strptime(self._normalize_date(slot.get('Дата', '')), '%Y-%m-%d').date()
+                    appt_time = datetime.strptime(slot.get('Время', ''), '%H:%M').time()
+                    duration = int(slot.get('Продолжительность') or 30)
+                    end_dt = datetime.combine(appt_date, appt_time) + timedelta(minutes=duration)
+                    # Если запись завершилась + прошел 1 час, добавляем в список
+                    if (now - end_dt).total_seconds() >= 3600:
+                        completed_appointments.append(slot)
+                except Exception as e_date:
+                    logger.warning(f"Ошибка при проверке даты записи: {e_date}")
+            return completed_appointments
+        except Exception as e:
+            logger.error(f"Ошибка получения завершенных записей: {e}", exc_info=True)
+            return []
+
+    # Логи
+    def add_log_entry(self, log_data):
+        self.batch_write_logs([log_data])
+
+    def batch_write_logs(self, logs):
+        try:
+            columns = [name for name, _ in SCHEMA['Логи'][1]]
+            self._insert('Логи', [dict(zip(columns, [str(v) for v in row])) for row in logs])
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка в batch_write_logs: {e}")
+            return False
+
+    # Методы для работы со специалистами
+    def get_all_specialists(self):
+        try:
+            return self._select('Специалисты')
+        except Exception as e:
+            logger.error(f"Ошибка получения специалистов: {e}")
+            return []
+
+    def get_specialist_by_id(self, specialist_id):
+        try:
+            return self._select_one('Специалисты', 'id = ?', (specialist_id,))
+        except Exception as e:
+            logger.error(f"Ошибка получения специалиста по ID: {e}")
+            return None
+
+    def get_specialist_by_ref_link(self, ref_link):
+        try:
+            return self._select_one('Специалисты', '"Реферальная" = ?', (ref_link,))
+        except Exception as e:
+            logger.error(f"Ошибка получения специалиста по реферальной ссылке: {e}")
+            return None
+
+    def get_specialist_by_telegram_id(self, telegram_id):
+        try:
+            return self._select_one('Специалисты', '"Telegram_ID" = ?', (telegram_id,))
+        except Exception as e:
+            logger.error(f"Ошибка при получении специалиста по Telegram ID: {e}")
+            return None
+
+    def add_specialist(self, name, specialization, timezone, telegram_id=None):
+        try:
+            with self.batch_writes():
+                if telegram_id:
+                    specialist = self.get_specialist_by_telegram_id(telegram_id)
+                    if specialist:
+                        logger.info(f"Специалист с Telegram_ID {telegram_id} уже существует.")
+                        return specialist.get('id')
+                new_id = self._next_id('Специалисты')
+                self._insert('Специалисты', [{
+                    'id': new_id,
+                    'Имя': name,
+                    'Специализация': specialization,
+                    'Часовой пояс': timezone,
+                    'Реферальная': '',
+                    'Telegram_ID': telegram_id or '',
+                }])
+            logger.info(f"Добавлен новый специалист: {name}, ID: {new_id}")
+            return new_id
+        except Exception as e:
+            logger.error(f"Ошибка добавления специалиста: {e}", exc_info=True)
+            return None
+
+    def update_specialist_referral_link(self, specialist_id, referral_link):
+        try:
+            if self._update('Специалисты', {'Реферальная': referral_link}, 'id = ?', (specialist_id,)):
+                logger.info(f"Обновлена реферальная ссылка для специалиста ID: {specialist_id}")
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка обновления реферальной ссылки: {e}")
+            return False
+
+    # Методы для работы с клиентами
+    def get_all_clients(self):
+        try:
+            return self._select('Клиенты')
+        except Exception as e:
+            logger.error(f"Ошибка получения клиентов: {e}")
+            return []
+
+    def get_client_by_id(self, client_id):
+        try:
+            return self._select_one('Клиенты', 'id = ?', (client_id,))
+        except Exception as e:
+            logger.error(f"Ошибка получения клиента по ID: {e}")
+            return None
+
+    def get_client_by_telegram_id(self, telegram_id):
+        try:
+            return self._select_one('Клиенты', '"Telegram_ID" = ?', (telegram_id,))
+        except Exception as e:
+            logger.error(f"Ошибка при получении клиента по Telegram ID: {e}")
+            return None
+
+    def get_client_by_phone(self, phone):
+        try:
+            return self._select_one('Клиенты', '"Телефон" = ?', (str(phone),))
+        except Exception as e:
+            logger.error(f"Ошибка получения клиента по телефону: {e}")
+            return None
+
+    def add_client(self, name, phone, specialist_id, telegram_id=None):
+        try:
+            with self.batch_writes():
+                if telegram_id:
+                    client = self.get_client_by_telegram_id(telegram_id)
+                    if client:
+                        logger.info(f"Клиент с Telegram_ID {telegram_id} уже существует.")
+                        return client.get('id')
+                new_id = self._next_id('Клиенты')
+                self._insert('Клиенты', [{
+                    'id': new_id,
+                    'Имя': name,
+                    'Телефон': phone,
+                    'id_специалиста': specialist_id,
+                    'Telegram_ID': telegram_id or '',
+                }])
+            logger.info(f"Добавлен новый клиент: {name}, ID: {new_id}")
+            return new_id
+        except Exception as e:
+            logger.error(f"Ошибка добавления клиента: {e}", exc_info=True)
+            return None
+
+    # Методы для работы с услугами
+    def get_specialist_services(self, specialist_id):
+        try:
+            return self._select('Услуги', '"id_специалиста" = ?', (specialist_id,))
+        except Exception as e:
+            logger.error(f"Ошибка получения услуг для специалиста {specialist_id}: {e}")
+            return []
+
+    def add_specialist_service(self, specialist_id, name, duration, price):
+        try:
+            self._insert('Услуги', [{
+                'id_специалиста': specialist_id,
+                'Название': name,
+                'Продолжительность': duration,
+                'Стоимость': price,
+            }])
+            logger.info(f"Добавлена услуга '{name}' для специалиста {specialist_id}")
+            return True
+        except sqlite3.IntegrityError:
+            # Услуга с таким названием уже есть (уникальный индекс services_name)
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка добавления услуги: {e}")
+            return False
+
+    def delete_specialist_service(self, specialist_id, name):
+        try:
+            if self._delete('Услуги', '"id_специалиста" = ? AND "Название" = ?', (specialist_id, name)):
+                logger.info(f"Удалена услуга '{name}' специалиста {specialist_id}")
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка удаления услуги: {e}")
+            return False
+
+    # Методы для работы с отзывами
+    def add_review(self, client_id, specialist_id, rating, comment=""):
+        try:
+            self._insert('Отзывы', [{
+                'id_клиента': client_id,
+                'id_специалиста': specialist_id,
+                'Дата': datetime.now().strftime("%Y-%m-%d"),
+                'Оценка': rating,
+                'Комментарий': comment,
+            }])
+            logger.info(f"Добавлен новый отзыв от клиента {client_id} для специалиста {specialist_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка добавления отзыва: {e}")
+            return False
+
+    def get_specialist_reviews(self, specialist_id):
+        try:
+            return self._select('Отзывы', '"id_специалиста" = ?', (specialist_id,))
+        except Exception as e:
+            logger.error(f"Ошибка получения отзывов специалиста {specialist_id}: {e}")
+            return []
+
+    # Методы для работы с напоминаниями
+    def add_reminder(self, appointment_id, client_id, date_str, time_str, status="pending", specialist_id=None, service_name=None):
+        try:
+            with self.batch_writes():
+                if not specialist_id:
+                    appt = self.get_appointment_by_id(appointment_id)
+                    if appt:
+                        specialist_id = appt.get('id_специалиста')
+                new_id = self._next_id('Напоминания')
+                self._insert('Напоминания', [{
+                    'id': new_id,
+                    'id_записи': appointment_id,
+                    'id_клиента': client_id,
+                    'id_специалиста': specialist_id,
+                    'Дата': self._normalize_date(date_str),
+                    'Время': time_str,
+                    'Статус': status,
+                    'Услуга': service_name or '',
+                }])
+            logger.info(f"Добавлено напоминание ID={new_id} для записи ID={appointment_id}")
+            return new_id
+        except Exception as e:
+            logger.error(f"Ошибка добавления напоминания: {e}", exc_info=True)
+            return None
+
+    def update_reminder_status(self, reminder_id, new_status):
+        try:
+            if self._update('Напоминания', {'Статус': new_status}, 'id = ?', (reminder_id,)):
+                logger.info(f"Обновлен статус напоминания ID={reminder_id} на {new_status}")
+                return True
+            logger.warning(f"Напоминание ID={reminder_id} не найдено")
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка обновления статуса напоминания: {e}", exc_info=True)
+            return False
+
+    def get_reminders_by_status(self, status_list):
+        try:
+            if isinstance(status_list, str):
+                status_list = [status_list]
+            if not status_list:
+                return []
+            placeholders = ', '.join('?' for _ in status_list)
+            return self._select('Напоминания', f'"Статус" IN ({placeholders})', tuple(status_list))
+        except Exception as e:
+            logger.error(f"Ошибка получения напоминаний по статусу: {e}", exc_info=True)
+            return []
+
+    def get_reminder_by_id(self, reminder_id):
+        try:
+            return self._select_one('Напоминания', 'id = ?', (reminder_id,))
+        except Exception as e:
+            logger.error(f"Ошибка получения напоминания по ID: {e}", exc_info=True)
+            return None
@@ -0,0 +1,38 @@
+from services.google_sheets import _DayMasks, _month_run_days
+
+
+def _slot(slot_id, time, status='Свободно', client_id=''):
+    return {'id': slot_id, 'Время': time, 'Статус': status, 'id_клиента': client_id}
+
+
+def test_off_grid_slots_are_kept():
+    # Расписание с перерывами 15 минут: слоты начинаются в 10:00, 10:45, 11:30, 12:15
+    masks = _DayMasks([
+        _slot(1, '10:00'), _slot(2, '10:45'), _slot(3, '11:30'),
+        _slot(4, '12:15', 'Занято', 7),
+    ])
+    assert masks.options(1) == [(600, [1]), (645, [2]), (690, [3])]
+    assert masks.fits(645, 1)
+    # Между слотами перерыв, поэтому услуга на час не помещается
+    assert masks.options(2) == []
+    assert masks.status() == 'mixed'
+
+
+def test_runs_need_exact_slot_step():
+    masks = _DayMasks([_slot(1, '09:00'), _slot(2, '09:30'), _slot(3, '10:15'), _slot(4, '10:45')])
+    assert masks.options(2) == [(540, [1, 2]), (615, [3, 4])]
+    assert not masks.fits(570, 2)
+
+
+def test_status_counts_every_slot():
+    assert _DayMasks([_slot(1, '10:00'), _slot(2, '10:45', 'Закрыто')]).status() == 'free'
+    assert _DayMasks([_slot(1, '10:10', 'Занято', 7)]).status() == 'busy'
+    assert _DayMasks([_slot(1, '10:00', 'Закрыто'), _slot(2, '10:45', 'Занято', 7)]).status() == 'mixed'
+    assert _DayMasks([]).status() is None
+
+
+def test_month_runs_do_not_cross_midnight():
+    late = _DayMasks([_slot(1, '23:30')])
+    early = _DayMasks([_slot(2, '00:00')])
+    assert _month_run_days([late, early], 2) == [False, False]
+    assert _month_run_days([late, _DayMasks([_slot(3, '13:15'), _slot(4, '13:45')])], 2) == [False, True]
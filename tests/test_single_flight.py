@@ -0,0 +1,92 @@
+import threading
+import time
+
+from services.google_sheets import _SheetTable
+from services.request_scheduler import SingleFlight
+
+THREADS = 10
+
+
+class SlowWorksheet:
+    """Лист, который отвечает с задержкой и считает запросы get_all_values."""
+
+    title = 'Расписание'
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_all_values(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return [list(row) for row in self.rows]
+
+
+def _run_concurrently(target):
+    barrier = threading.Barrier(THREADS)
+    results = [None] * THREADS
+
+    def worker(i):
+        barrier.wait()
+        results[i] = target()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_records_make_one_api_call():
+    worksheet = SlowWorksheet([['id', 'Дата', 'Время'], ['1', '2030-01-01', '10:00'], ['2', '2030-01-01', '10:30']])
+    table = _SheetTable(worksheet, ttl=60, index_headers=('id',))
+
+    results = _run_concurrently(table.records)
+
+    assert worksheet.calls == 1
+    assert all(result is results[0] for result in results)
+    assert results[0] == [{'id': 1, 'Дата': '2030-01-01', 'Время': '10:00'},
+                          {'id': 2, 'Дата': '2030-01-01', 'Время': '10:30'}]
+
+    # Свежий кэш отдается без запросов, после сброса лист читается снова
+    table.records()
+    assert worksheet.calls == 1
+    table.invalidate()
+    table.records()
+    assert worksheet.calls == 2
+
+
+def test_change_during_read_forces_reload():
+    worksheet = SlowWorksheet([['id', 'Статус'], ['1', 'Свободно']])
+    table = _SheetTable(worksheet, ttl=60)
+
+    reader = threading.Thread(target=table.records)
+    reader.start()
+    time.sleep(0.05)
+    table.invalidate()
+    reader.join()
+
+    table.records()
+    assert worksheet.calls == 2
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        time.sleep(0.1)
+        raise RuntimeError('quota')
+
+    def call():
+        try:
+            flight.do('key', failing)
+        except RuntimeError as e:
+            return str(e)
+
+    assert _run_concurrently(call) == ['quota'] * THREADS
+    assert len(calls) == 1
@@ -0,0 +1,72 @@
+from services.google_sheets import _SheetTable, _WriteBatch
+
+
+class MemoryWorksheet:
+    """Лист в памяти: get_all_values отдает текущие строки."""
+
+    title = 'Расписание'
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def get_all_values(self):
+        self.calls += 1
+        return [list(row) for row in self.rows]
+
+
+class MemorySpreadsheet:
+    """Таблица в памяти: values_batch_update пишет в лист, если не задан отказ."""
+
+    def __init__(self, worksheet, error=None):
+        self.worksheet = worksheet
+        self.error = error
+
+    def values_batch_update(self, body):
+        if self.error:
+            raise self.error
+        for item in body['data']:
+            cell = item['range'].split('!')[1]
+            col_idx, row_idx = ord(cell[0]) - ord('A'), int(cell[1:]) - 1
+            self.worksheet.rows[row_idx][col_idx] = item['values'][0][0]
+
+
+def _table():
+    worksheet = MemoryWorksheet([['id', 'Статус'], ['1', 'Свободно']])
+    table = _SheetTable(worksheet, ttl=60)
+    table.records()
+    return worksheet, table
+
+
+def test_reload_before_flush_is_not_kept_as_fresh():
+    worksheet, table = _table()
+    batch = _WriteBatch(MemorySpreadsheet(worksheet))
+    batch.update(table, 2, {'Статус': 'Занято'})
+
+    # Лист перечитан (истек TTL) до отправки пачки: в таблице еще старое значение
+    assert table.load()[0]['Статус'] == 'Свободно'
+    batch.flush()
+
+    assert worksheet.rows[1][1] == 'Занято'
+    assert table.records()[0]['Статус'] == 'Занято'
+    assert worksheet.calls == 3
+
+
+def test_failed_flush_and_abort_drop_cache():
+    worksheet, table = _table()
+    batch = _WriteBatch(MemorySpreadsheet(worksheet, error=RuntimeError('quota')))
+    batch.update(table, 2, {'Статус': 'Занято'})
+    try:
+        batch.flush()
+    except RuntimeError:
+        pass
+    assert table.records()[0]['Статус'] == 'Свободно'
+
+    batch = _WriteBatch(MemorySpreadsheet(worksheet))
+    batch.update(table, 2, {'Статус': 'Закрыто'})
+    batch.abort()
+    assert table.records()[0]['Статус'] == 'Свободно'
+    # После завершения пачек перечитанный лист снова держится в кэше
+    calls = worksheet.calls
+    table.records()
+    assert worksheet.calls == calls
@@ -0,0 +1,182 @@
+# services/update_dispatcher.py
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def _update_chat_id(update):
+    """
+    Определяет чат, к которому относится апдейт Telegram.
+    Апдейты без чата (например, inline-запросы) привязываются к пользователю.
+    """
+    for name in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        message = getattr(update, name, None)
+        if message is not None:
+            return message.chat.id
+
+    callback = getattr(update, 'callback_query', None)
+    if callback is not None:
+        if callback.message is not None:
+            return callback.message.chat.id
+        return callback.from_user.id
+
+    for name in ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+                 'my_chat_member', 'chat_member', 'chat_join_request'):
+        event = getattr(update, name, None)
+        if event is not None:
+            chat = getattr(event, 'chat', None)
+            if chat is not None:
+                return chat.id
+            return event.from_user.id
+
+    return None
+
+
+class _LatencyStats:
+    """Скользящее окно последних замеров времени (в секундах)."""
+
+    def __init__(self, size=1000):
+        self._samples = deque(maxlen=size)
+
+    def add(self, value):
+        self._samples.append(value)
+
+    def summary(self):
+        if not self._samples:
+            return {'count': 0, 'avg': 0.0, 'p95': 0.0, 'max': 0.0}
+        ordered = sorted(self._samples)
+        return {
+            'count': len(ordered),
+            'avg': round(sum(ordered) / len(ordered), 4),
+            'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+            'max': round(ordered[-1], 4),
+        }
+
+
+class UpdateDispatcher:
+    """
+    Обработка апдейтов вебхука в фоновом пуле потоков.
+
+    У каждого чата своя очередь ("полоса"): апдейты одного чата обрабатываются
+    строго по порядку поступления, разные чаты – параллельно, не больше
+    workers одновременно. Общее число ожидающих апдейтов ограничено max_queue:
+    при переполнении submit() возвращает False, и вебхук отвечает ошибкой,
+    чтобы Telegram повторил доставку позже.
+    """
+
+    def __init__(self, handler, workers=8, max_queue=1000):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+
+        self._lanes = {}          # chat_id -> deque[(апдейт, время постановки)]
+        self._ready = deque()     # чаты, у которых есть апдейты и которые сейчас никто не обрабатывает
+        self._pending = 0
+        self._busy = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_stats = _LatencyStats()
+        self._process_stats = _LatencyStats()
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"update-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Пул обработки апдейтов запущен: {self.workers} потоков, очередь до {self.max_queue}")
+
+    def stop(self, timeout=10):
+        """Останавливает пул, давая потокам дообработать уже принятые апдейты."""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self._threads = []
+        logger.info("Пул обработки апдейтов остановлен")
+
+    def submit(self, update):
+        """Ставит апдейт в очередь его чата. Возвращает False, если очередь переполнена."""
+        chat_id = _update_chat_id(update)
+        if chat_id is None:
+            # Без чата порядок не важен – у каждого такого апдейта своя полоса
+            chat_id = ('update', update.update_id)
+        with self._cond:
+            if not self._running or self._pending >= self.max_queue:
+                self._rejected += 1
+                return False
+            lane = self._lanes.get(chat_id)
+            if lane is None:
+                lane = self._lanes[chat_id] = deque()
+                self._ready.append(chat_id)
+                self._cond.notify()
+            lane.append((update, time.monotonic()))
+            self._pending += 1
+        return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._ready:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                chat_id = self._ready.popleft()
+                update, queued_at = self._lanes[chat_id].popleft()
+                self._pending -= 1
+                self._busy += 1
+
+            started = time.monotonic()
+            self._wait_stats.add(started - queued_at)
+            failed = False
+            try:
+                self.handler(update)
+            except Exception as e:
+                failed = True
+                logger.error(f"Ошибка обработки апдейта {update.update_id}: {e}", exc_info=True)
+            finished = time.monotonic()
+
+            with self._cond:
+                self._process_stats.add(finished - started)
+                self._busy -= 1
+                self._processed += 1
+                if failed:
+                    self._failed += 1
+                # Пока обрабатывался апдейт, полоса чата была занята; теперь
+                # следующий апдейт этого чата встает в конец общей очереди
+                if self._lanes[chat_id]:
+                    self._ready.append(chat_id)
+                    self._cond.notify()
+                else:
+                    del self._lanes[chat_id]
+
+    def metrics(self):
+        """Текущее состояние пула: глубина очереди, загрузка и задержки."""
+        with self._cond:
+            return {
+                'queue_depth': self._pending,
+                'queue_limit': self.max_queue,
+                'active_chats': len(self._lanes),
+                'busy_workers': self._busy,
+                'workers': self.workers,
+                'processed': self._processed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'wait_seconds': self._wait_stats.summary(),
+                'processing_seconds': self._process_stats.summary(),
+            }